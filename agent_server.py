@@ -0,0 +1,284 @@
+import hmac
+import json
+import uuid
+import asyncio
+import logging
+import ipaddress
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def is_loopback(host: str) -> bool:
+    """Whether host only accepts connections from this machine"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # Other hostnames may resolve to public interfaces
+
+def host_name(host_header: str) -> str:
+    """Host header without its port, e.g. [::1]:8765 -> ::1"""
+    if host_header.startswith("["):
+        return host_header[1:].partition("]")[0]
+    name, _, port = host_header.rpartition(":")
+    return name if name and port.isdigit() else host_header
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    415: "Unsupported Media Type",
+    500: "Internal Server Error"
+}
+
+class AgentServer:
+    """
+    Minimal JSON-over-HTTP/1.1 server exposing a PerpetualLLM agent.
+
+    Listens on localhost TCP or a Unix socket. Binding any other address
+    requires allow_remote and a token, since the agent can run code and
+    shell commands. When a token is set, /v1/input and /v1/command need an
+    "Authorization: Bearer <token>" header.
+
+    Browsers must not be able to drive the agent: requests carrying an
+    Origin header or a Host that is neither loopback nor the served host
+    are refused (403), which blocks cross-site requests and DNS rebinding,
+    and POST bodies must be sent as application/json (415), which a page
+    cannot do cross-origin without a CORS preflight. Each connection is handled as
+    its own task on the shared event loop, so requests run concurrently.
+
+    Routes:
+      GET  /v1/health   liveness check
+      POST /v1/input    {"input": str, "session_id": str?, "stream": bool?} -> process_input
+      POST /v1/command  {"command": str} -> handle_command
+
+    Every response carries a request id: the client's X-Request-ID header if
+    sent, otherwise a generated one. Streaming input responses are NDJSON
+    over chunked encoding: {"request_id", "token"} lines, then a final
+    {"request_id", "done": true, "result"} line.
+    """
+
+    def __init__(self, agent, host: str = "127.0.0.1", port: int = 8765,
+                 unix_socket: Optional[str] = None, max_body_bytes: int = 1024 * 1024,
+                 allow_remote: bool = False, token: Optional[str] = None):
+        if not unix_socket and not is_loopback(host):
+            if not allow_remote:
+                raise ValueError(f"Refusing to serve on non-loopback address {host}; "
+                                 "use allow_remote with a token to expose the agent")
+            if not token:
+                raise ValueError(f"Serving on {host} requires a token")
+            logger.warning(f"Agent server exposed on {host}; only clients with the token are served")
+        self.agent = agent
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.max_body_bytes = max_body_bytes
+        self.token = token
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.stats = {"connections": 0, "requests": 0, "errors": 0, "active": 0}
+
+    async def start(self):
+        if self.unix_socket:
+            self.server = await asyncio.start_unix_server(self._handle_connection, path=self.unix_socket)
+            logger.info(f"Agent server listening on unix socket {self.unix_socket}")
+        else:
+            self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+            # Report the real port when an ephemeral one (0) was requested
+            self.port = self.server.sockets[0].getsockname()[1]
+            logger.info(f"Agent server listening on http://{self.host}:{self.port}")
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        """Read one request; returns None when the client closed the connection"""
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, path, _version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise ValueError("Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", 0) or 0)
+        if length > self.max_body_bytes:
+            raise OverflowError(f"Body larger than {self.max_body_bytes} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), path.split("?", 1)[0], headers, body
+
+    @staticmethod
+    def _head(status: int, request_id: str, keep_alive: bool, extra: Dict[str, str]) -> bytes:
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}",
+                 f"X-Request-ID: {request_id}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines += [f"{name}: {value}" for name, value in extra.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: Dict,
+                         request_id: str, keep_alive: bool):
+        body = json.dumps(dict(payload, request_id=request_id), default=str).encode("utf-8")
+        writer.write(self._head(status, request_id, keep_alive, {
+            "Content-Type": "application/json",
+            "Content-Length": str(len(body))
+        }) + body)
+        await writer.drain()
+
+    @staticmethod
+    async def _send_chunk(writer: asyncio.StreamWriter, payload: Dict):
+        data = (json.dumps(payload, default=str) + "\n").encode("utf-8")
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+        await writer.drain()
+
+    async def _stream_input(self, writer: asyncio.StreamWriter, text: str, session_id: Optional[str],
+                            request_id: str, keep_alive: bool):
+        """Run process_input, forwarding tokens as NDJSON lines while it runs"""
+        tokens: asyncio.Queue = asyncio.Queue()
+        task = asyncio.ensure_future(self.agent.process_input(text, on_token=tokens.put_nowait,
+                                                              session_id=session_id))
+        writer.write(self._head(200, request_id, keep_alive, {
+            "Content-Type": "application/x-ndjson",
+            "Transfer-Encoding": "chunked"
+        }))
+        try:
+            while not task.done() or not tokens.empty():
+                getter = asyncio.ensure_future(tokens.get())
+                await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    await self._send_chunk(writer, {"request_id": request_id, "token": getter.result()})
+                else:
+                    getter.cancel()
+            await self._send_chunk(writer, {"request_id": request_id, "done": True, "result": task.result()})
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            # The client went away mid-stream: stop generating for it
+            if not task.done():
+                task.cancel()
+
+    def _forbidden(self, headers: Dict[str, str]) -> Optional[str]:
+        """Why a request looks like it came from a browser page, or None"""
+        if "origin" in headers:
+            return "Cross-origin requests are not allowed"
+        host = headers.get("host")
+        if host is not None and not self.unix_socket:
+            name = host_name(host).lower()
+            if not is_loopback(name) and name != self.host.lower():
+                return f"Host {host} is not served here"
+        return None
+
+    def _authorized(self, headers: Dict[str, str]) -> bool:
+        if not self.token:
+            return True
+        scheme, _, supplied = headers.get("authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(supplied.strip().encode(), self.token.encode())
+
+    async def _dispatch(self, writer: asyncio.StreamWriter, method: str, path: str, headers: Dict[str, str],
+                        body: bytes, request_id: str, keep_alive: bool):
+        forbidden = self._forbidden(headers)
+        if forbidden:
+            return await self._send_json(writer, 403, {"error": forbidden}, request_id, keep_alive)
+
+        if path == "/v1/health":
+            if method != "GET":
+                return await self._send_json(writer, 405, {"error": "Use GET"}, request_id, keep_alive)
+            return await self._send_json(writer, 200, {"status": "ok", "server": dict(self.stats)},
+                                         request_id, keep_alive)
+
+        if path not in ("/v1/input", "/v1/command"):
+            return await self._send_json(writer, 404, {"error": f"Unknown path {path}"}, request_id, keep_alive)
+        if not self._authorized(headers):
+            return await self._send_json(writer, 401, {"error": "Missing or invalid token"}, request_id, keep_alive)
+        if method != "POST":
+            return await self._send_json(writer, 405, {"error": "Use POST"}, request_id, keep_alive)
+        if headers.get("content-type", "").partition(";")[0].strip().lower() != "application/json":
+            return await self._send_json(writer, 415, {"error": "Content-Type must be application/json"},
+                                         request_id, keep_alive)
+
+        try:
+            payload = json.loads(body or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("Body must be a JSON object")
+        except ValueError as e:
+            return await self._send_json(writer, 400, {"error": f"Invalid JSON: {e}"}, request_id, keep_alive)
+
+        if path == "/v1/command":
+            command = payload.get("command")
+            command = command.strip().lstrip("!").strip() if isinstance(command, str) else ""
+            if not command:
+                return await self._send_json(writer, 400, {"error": "'command' is required"}, request_id, keep_alive)
+            result = await self.agent.handle_command(command)
+            return await self._send_json(writer, 200, {"result": result}, request_id, keep_alive)
+
+        text = payload.get("input")
+        if not isinstance(text, str) or not text.strip():
+            return await self._send_json(writer, 400, {"error": "'input' is required"}, request_id, keep_alive)
+        session_id = payload.get("session_id")
+        if payload.get("stream"):
+            return await self._stream_input(writer, text, session_id, request_id, keep_alive)
+        result = await self.agent.process_input(text, session_id=session_id)
+        return await self._send_json(writer, 200, {"result": result}, request_id, keep_alive)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats["connections"] += 1
+        try:
+            while True:
+                request_id = uuid.uuid4().hex
+                try:
+                    request = await self._read_request(reader)
+                except OverflowError as e:
+                    await self._send_json(writer, 413, {"error": str(e)}, request_id, False)
+                    break
+                except (ValueError, asyncio.IncompleteReadError) as e:
+                    await self._send_json(writer, 400, {"error": str(e)}, request_id, False)
+                    break
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                request_id = headers.get("x-request-id") or request_id
+                keep_alive = headers.get("connection", "keep-alive").lower() != "close"
+                self.stats["requests"] += 1
+                self.stats["active"] += 1
+                try:
+                    await self._dispatch(writer, method, path, headers, body, request_id, keep_alive)
+                except (ConnectionError, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.error(f"Request {request_id} failed: {e}")
+                    await self._send_json(writer, 500, {"error": str(e)}, request_id, False)
+                    break
+                finally:
+                    self.stats["active"] -= 1
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            logger.debug("Client disconnected")
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
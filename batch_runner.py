@@ -0,0 +1,127 @@
+import sys
+import json
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, TextIO
+from monitoring.latency_histogram import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# A line containing only this waits for every earlier command before continuing
+BARRIER = "---"
+
+@dataclass
+class BatchCommand:
+    index: int
+    line_no: int
+    text: str
+
+@dataclass
+class BatchSummary:
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    duration: float = 0.0
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def to_dict(self) -> Dict:
+        return {
+            "total": self.total,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "duration": self.duration,
+            "commands_per_sec": self.total / self.duration if self.duration else 0.0,
+            "latency": self.latency.to_dict()
+        }
+
+def parse_commands(lines: Iterable[str]) -> List[List[BatchCommand]]:
+    """Split a command script into groups separated by barrier lines.
+
+    Blank lines and lines starting with '#' are ignored. Commands within a
+    group are independent and may run concurrently.
+    """
+    groups: List[List[BatchCommand]] = [[]]
+    index = 0
+    for line_no, line in enumerate(lines, 1):
+        text = line.strip()
+        if not text or text.startswith("#"):
+            continue
+        if text == BARRIER:
+            if groups[-1]:
+                groups.append([])
+            continue
+        groups[-1].append(BatchCommand(index, line_no, text))
+        index += 1
+    return [group for group in groups if group]
+
+class BatchRunner:
+    """
+    Runs a script of agent inputs without a TTY.
+
+    Each line goes through agent.process_input, so agent commands (!status,
+    !interpret ...) and free-text prompts both work. Up to `concurrency`
+    commands run at once; results are written as JSONL in input order as soon
+    as every earlier command has finished.
+    """
+
+    def __init__(self, agent, concurrency: int = 4, output: Optional[TextIO] = None):
+        self.agent = agent
+        self.concurrency = max(1, concurrency)
+        self.output = output or sys.stdout
+
+    async def _run_command(self, command: BatchCommand, semaphore: asyncio.Semaphore) -> Dict:
+        async with semaphore:
+            start = time.time()
+            try:
+                result = await self.agent.process_input(command.text)
+            except Exception as e:
+                logger.error(f"Batch command on line {command.line_no} failed: {e}")
+                result = {"status": "error", "error": str(e)}
+            latency = time.time() - start
+        return {
+            "index": command.index,
+            "line": command.line_no,
+            "input": command.text,
+            "status": result.get("status", "error"),
+            "latency": latency,
+            "result": result
+        }
+
+    def _write(self, record: Dict, summary: BatchSummary):
+        summary.total += 1
+        if record["status"] == "success":
+            summary.succeeded += 1
+        else:
+            summary.failed += 1
+        summary.latency.record(record["latency"])
+        self.output.write(json.dumps(record, default=str) + "\n")
+        self.output.flush()
+
+    async def run(self, lines: Iterable[str]) -> BatchSummary:
+        summary = BatchSummary()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.time()
+
+        for group in parse_commands(lines):
+            tasks = [asyncio.ensure_future(self._run_command(command, semaphore)) for command in group]
+            # Awaiting in order writes results in input order while later ones keep running
+            try:
+                for task in tasks:
+                    self._write(await task, summary)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        summary.duration = time.time() - start
+        return summary
+
+def format_summary(summary: BatchSummary) -> str:
+    stats = summary.to_dict()
+    latency = stats["latency"]
+    if not summary.total:
+        return "Batch complete: no commands"
+    return (f"Batch complete: {stats['total']} commands ({stats['succeeded']} ok, {stats['failed']} failed) "
+            f"in {stats['duration']:.2f}s, {stats['commands_per_sec']:.2f} cmd/s; "
+            f"latency p50 {latency['p50']:.3f}s p95 {latency['p95']:.3f}s max {latency['max']:.3f}s")
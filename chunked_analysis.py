@@ -0,0 +1,208 @@
+import asyncio
+import logging
+from typing import Callable, List, Optional, Tuple
+
+from ollama_agent import OllamaAgent, RequestPriority
+
+logger = logging.getLogger(__name__)
+
+# Rough average for English text and code; good enough for budgeting prompts
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used to size chunks"""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """Split text on line boundaries into chunks of at most max_tokens (estimated).
+
+    Lines longer than the budget on their own are split mid-line.
+    """
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    chunks = []
+    current = []
+    current_len = 0
+
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if current:
+                chunks.append("".join(current))
+                current, current_len = [], 0
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        if current_len + len(line) > max_chars and current:
+            chunks.append("".join(current))
+            current, current_len = [], 0
+        if line:
+            current.append(line)
+            current_len += len(line)
+
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+class ChunkedAnalyzer:
+    """
+    Map-reduce analysis of command output too large for a single prompt.
+
+    The output is split by token budget, each chunk is summarized
+    concurrently (bounded by the agent's LLM scheduler), and the chunk
+    summaries are reduced into one answer. The final answer can be streamed.
+    """
+
+    def __init__(self, agent: OllamaAgent, chunk_tokens: int = 2000, reduce_tokens: int = 3000,
+                 priority: RequestPriority = RequestPriority.INTERACTIVE):
+        self.agent = agent
+        self.chunk_tokens = chunk_tokens
+        self.reduce_tokens = reduce_tokens
+        self.priority = priority
+
+    @staticmethod
+    def _map_prompt(instruction: str, chunk: str, index: int, total: int) -> str:
+        return (f"{instruction}\n"
+                f"This is part {index} of {total} of a larger output. Summarize the notable facts, "
+                f"errors and anomalies in this part only, concisely.\n\n{chunk}")
+
+    @staticmethod
+    def _reduce_prompt(instruction: str, summaries: List[str]) -> str:
+        parts = "\n\n".join(f"Part {i}:\n{summary}" for i, summary in enumerate(summaries, 1))
+        return (f"{instruction}\n"
+                f"The output was too large to read at once, so it was summarized in parts. "
+                f"Combine these part summaries into a single answer.\n\n{parts}")
+
+    async def _generate(self, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+        if on_token is None:
+            return await self.agent.generate_response(prompt, use_cache=True, priority=self.priority)
+
+        chunks = []
+        async for token in self.agent.stream_response(prompt, use_cache=True, priority=self.priority):
+            chunks.append(token)
+            on_token(token)
+        return "".join(chunks)
+
+    async def _map(self, instruction: str, chunks: List[str],
+                   on_progress: Optional[Callable[[str], None]]) -> Tuple[List[str], List[int]]:
+        """Summarize every chunk, retrying failures once.
+
+        Returns the summaries of the parts that succeeded, in order, and the
+        1-based numbers of the parts that still failed. A failed call's
+        fallback text is never used as a summary.
+        """
+        total = len(chunks)
+        prompts = [self._map_prompt(instruction, chunk, i + 1, total) for i, chunk in enumerate(chunks)]
+        summaries: List[Optional[str]] = [None] * total
+        done = 0
+        async for index, result in self.agent.generate_many_as_completed(prompts, use_cache=True,
+                                                                         priority=self.priority):
+            done += 1
+            if result.ok:
+                summaries[index] = result.text
+            if on_progress:
+                state = "summarized" if result.ok else "failed to summarize"
+                on_progress(f"{state} part {index + 1} ({done}/{total} done)")
+
+        failed = [i for i, summary in enumerate(summaries) if summary is None]
+        if failed:
+            if on_progress:
+                on_progress(f"retrying {len(failed)} failed part(s)")
+            async for index, result in self.agent.generate_many_as_completed([prompts[i] for i in failed],
+                                                                             use_cache=True, priority=self.priority):
+                if result.ok:
+                    summaries[failed[index]] = result.text
+
+        failed_parts = [i + 1 for i, summary in enumerate(summaries) if summary is None]
+        if failed_parts:
+            logger.warning(f"Could not summarize parts {failed_parts} of {total}; leaving them out")
+        return [summary for summary in summaries if summary is not None], failed_parts
+
+    async def _combine(self, instruction: str, summaries: List[str]) -> Optional[str]:
+        """Reduce summaries with one LLM call, retried once; None if both attempts fail"""
+        prompt = self._reduce_prompt(instruction, summaries)
+        for _ in range(2):
+            result = await self.agent.generate(prompt, use_cache=True, priority=self.priority)
+            if result.ok:
+                return result.text
+        return None
+
+    async def _reduce_group(self, instruction: str, group: List[str]) -> Optional[str]:
+        if len(group) == 1:
+            return group[0]
+        return await self._combine(instruction, group)
+
+    @staticmethod
+    def _failed(message: str, on_token: Optional[Callable[[str], None]]) -> str:
+        if on_token:
+            on_token(message)
+        return message
+
+    async def analyze(self, output: str, instruction: str = "Please analyze the following output and provide insights:",
+                      on_progress: Optional[Callable[[str], None]] = None,
+                      on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Analyze output, chunking it first when it exceeds the chunk budget.
+
+        Parts whose summary, or whose group of summaries, could not be
+        produced are left out and listed in a note after the answer.
+        """
+        if estimate_tokens(output) <= self.chunk_tokens:
+            return await self._generate(f"{instruction}\n{output}", on_token)
+
+        chunks = split_into_chunks(output, self.chunk_tokens)
+        logger.info(f"Analyzing {estimate_tokens(output)} estimated tokens in {len(chunks)} chunks")
+        if on_progress:
+            on_progress(f"output split into {len(chunks)} parts")
+        summaries, failed_parts = await self._map(instruction, chunks, on_progress)
+        if not summaries:
+            return self._failed(f"Analysis failed: none of the {len(chunks)} parts could be summarized "
+                                f"(language model unavailable).", on_token)
+        # Part numbers each summary covers, so dropped groups can be reported
+        covers = [[part] for part in range(1, len(chunks) + 1) if part not in failed_parts]
+
+        # Reduce in groups until the summaries fit one prompt
+        while estimate_tokens("".join(summaries)) > self.reduce_tokens and len(summaries) > 1:
+            groups, group_covers = [], []
+            group, cover, group_tokens = [], [], 0
+            for summary, parts in zip(summaries, covers):
+                tokens = estimate_tokens(summary)
+                if group and group_tokens + tokens > self.reduce_tokens:
+                    groups.append(group)
+                    group_covers.append(cover)
+                    group, cover, group_tokens = [], [], 0
+                group.append(summary)
+                cover = cover + parts
+                group_tokens += tokens
+            groups.append(group)
+            group_covers.append(cover)
+            if len(groups) == len(summaries):
+                break  # Each summary alone fills the budget; reduce what we have
+            if on_progress:
+                on_progress(f"combining {len(summaries)} summaries in {len(groups)} groups")
+            reduced = await asyncio.gather(*(self._reduce_group(instruction, g) for g in groups))
+            summaries, covers = [], []
+            for summary, parts in zip(reduced, group_covers):
+                if summary is None:
+                    logger.warning(f"Could not combine the summaries of parts {parts}; leaving them out")
+                    failed_parts.extend(parts)
+                else:
+                    summaries.append(summary)
+                    covers.append(parts)
+            if not summaries:
+                return self._failed(f"Analysis failed: the summaries of the {len(chunks)} parts could not be "
+                                    f"combined (language model unavailable).", on_token)
+        failed_parts.sort()
+
+        if on_progress:
+            on_progress("combining summaries")
+        if on_token:
+            answer = await self._generate(self._reduce_prompt(instruction, summaries), on_token)
+        else:
+            answer = await self._combine(instruction, summaries)
+            if answer is None:
+                return self._failed(f"Analysis failed: the summaries of the {len(chunks)} parts could not be "
+                                    f"combined (language model unavailable).", on_token)
+        if failed_parts:
+            note = (f"\n\n[Parts {', '.join(map(str, failed_parts))} of {len(chunks)} could not be "
+                    f"summarized and are not covered by this analysis]")
+            if on_token:
+                on_token(note)
+            answer += note
+        return answer
@@ -0,0 +1,137 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class CommandCache:
+    """
+    Short-TTL cache for the results of read-mostly commands.
+
+    Each entry lists the events that make it stale (e.g. "file_change",
+    "error", "config_reload"); invalidate(event) drops those entries before
+    their TTL runs out. Concurrent calls for the same key share a single
+    computation, and a result computed while one of its events fired is
+    returned but not stored.
+
+    The cache belongs to the event loop that uses it. invalidate() may be
+    called from other threads (e.g. component builders); it is then
+    scheduled onto that loop with call_soon_threadsafe.
+    """
+
+    def __init__(self, ttl: float = 2.0, max_entries: int = 128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, events, result)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._generations: Dict[str, int] = defaultdict(int)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "expirations": 0,
+            "invalidations": 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a fresh cached result, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry[0]:
+            del self._entries[key]
+            self.stats["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[2]
+
+    def put(self, key: Hashable, result: Any, events: Iterable[str] = (), ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, frozenset(events), result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]],
+                             events: Iterable[str] = (), ttl: Optional[float] = None,
+                             store_if: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, bool]:
+        """Return (result, from_cache), running compute() only on a miss.
+
+        store_if can reject results that should not be cached (e.g. errors).
+        """
+        self._loop = asyncio.get_running_loop()
+        result = self.get(key)
+        if result is not None:
+            self.stats["hits"] += 1
+            return result, True
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending), True
+
+        self.stats["misses"] += 1
+        events = tuple(events)
+        generations = [self._generations[event] for event in events]
+        future = self._loop.create_future()
+        self._inflight[key] = future
+        try:
+            result = await compute()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # Mark retrieved when nobody else was waiting
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        stale = generations != [self._generations[event] for event in events]
+        if not stale and (store_if is None or store_if(result)):
+            self.put(key, result, events, ttl)
+        future.set_result(result)
+        return result, False
+
+    def invalidate(self, event: str) -> int:
+        """Drop entries that depend on event; returns how many were dropped.
+
+        From a thread other than the owning loop's, the invalidation is
+        scheduled on that loop and 0 is returned.
+        """
+        loop = self._loop
+        if loop is not None and loop.is_running() and not self._on_loop(loop):
+            try:
+                loop.call_soon_threadsafe(self._invalidate, event)
+                return 0
+            except RuntimeError:
+                pass  # Loop closed in the meantime
+        return self._invalidate(event)
+
+    @staticmethod
+    def _on_loop(loop: asyncio.AbstractEventLoop) -> bool:
+        try:
+            return asyncio.get_running_loop() is loop
+        except RuntimeError:
+            return False
+
+    def _invalidate(self, event: str) -> int:
+        self._generations[event] += 1
+        stale = [key for key, entry in self._entries.items() if event in entry[1]]
+        for key in stale:
+            del self._entries[key]
+        if stale:
+            self.stats["invalidations"] += len(stale)
+            logger.debug(f"Command cache: '{event}' invalidated {len(stale)} entr{'y' if len(stale) == 1 else 'ies'}")
+        return len(stale)
+
+    def clear(self):
+        self._entries.clear()
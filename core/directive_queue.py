@@ -0,0 +1,149 @@
+import random
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+class AliasTable:
+    """Vose's alias method: O(n) build, O(1) weighted sampling"""
+
+    def __init__(self, items: Sequence[str], weights: Sequence[float]):
+        self.items = list(items)
+        n = len(self.items)
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+        total = float(sum(weights))
+        if not n:
+            return
+        if total <= 0:
+            # No usable weights: always pick the first item
+            self.prob[0] = 1.0
+            return
+
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Leftovers are 1.0 up to rounding error
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def sample(self, rng: random.Random) -> Optional[str]:
+        if not self.items:
+            return None
+        i = int(rng.random() * len(self.items))
+        return self.items[i] if rng.random() < self.prob[i] else self.items[self.alias[i]]
+
+class DirectiveQueue:
+    """
+    Thread-safe weighted-fair queue of directives.
+
+    Each priority layer is a FIFO deque. get() picks a non-empty layer with
+    probability proportional to its weight using an alias table, so dispatch
+    is O(1) no matter how many directives are queued. The table is rebuilt
+    (O(number of priorities)) only when weights change or a layer becomes
+    empty or non-empty.
+    """
+
+    def __init__(self, weights: Dict[str, float], seed: Optional[int] = None):
+        self._weights = dict(weights)
+        self._layers: Dict[str, Deque[Any]] = {priority: deque() for priority in weights}
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._size = 0
+        self._table: Optional[AliasTable] = None  # Over non-empty layers; None means rebuild
+        self._all_table = AliasTable(list(self._weights), list(self._weights.values()))
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def priorities(self) -> List[str]:
+        return list(self._layers)
+
+    def _layer(self, priority: str) -> Deque[Any]:
+        try:
+            return self._layers[priority]
+        except KeyError:
+            raise ValueError(f"Unknown priority: {priority}")
+
+    def _push(self, directive: Any, priority: str, front: bool):
+        with self._lock:
+            layer = self._layer(priority)
+            if not layer:
+                self._table = None
+            if front:
+                layer.appendleft(directive)
+            else:
+                layer.append(directive)
+            self._size += 1
+
+    def put(self, directive: Any, priority: str):
+        self._push(directive, priority, front=False)
+
+    def put_front(self, directive: Any, priority: str):
+        """Queue a directive ahead of its layer, e.g. to retry it next"""
+        self._push(directive, priority, front=True)
+
+    def _pop(self, priority: str) -> Any:
+        layer = self._layers[priority]
+        directive = layer.popleft()
+        self._size -= 1
+        if not layer:
+            self._table = None
+        return directive
+
+    def get(self) -> Optional[Tuple[str, Any]]:
+        """Remove and return (priority, directive) from a weighted-random non-empty layer.
+
+        If every non-empty layer has zero weight, layers are served in priority order.
+        """
+        with self._lock:
+            if not self._size:
+                return None
+            if self._table is None:
+                active = [p for p, layer in self._layers.items() if layer]
+                self._table = AliasTable(active, [self._weights[p] for p in active])
+            priority = self._table.sample(self._rng)
+            return priority, self._pop(priority)
+
+    def get_from(self, priority: str) -> Optional[Any]:
+        """Remove and return the oldest directive of one layer, or None if it is empty"""
+        with self._lock:
+            return self._pop(priority) if self._layer(priority) else None
+
+    def peek(self, priority: str) -> Optional[Any]:
+        with self._lock:
+            layer = self._layer(priority)
+            return layer[0] if layer else None
+
+    def sample_priority(self) -> Optional[str]:
+        """Weighted-random priority over all layers, empty or not"""
+        with self._lock:
+            return self._all_table.sample(self._rng)
+
+    def set_weights(self, weights: Dict[str, float]):
+        with self._lock:
+            for priority, weight in weights.items():
+                self._layer(priority)
+                self._weights[priority] = weight
+            self._all_table = AliasTable(list(self._weights), list(self._weights.values()))
+            self._table = None
+
+    def drain(self) -> List[Tuple[str, Any]]:
+        """Remove everything, highest priority layer first"""
+        with self._lock:
+            drained = [(priority, directive) for priority, layer in self._layers.items() for directive in layer]
+            for layer in self._layers.values():
+                layer.clear()
+            self._size = 0
+            self._table = None
+            return drained
+
+    def sizes(self) -> Dict[str, int]:
+        with self._lock:
+            return {priority: len(layer) for priority, layer in self._layers.items()}
@@ -0,0 +1,147 @@
+import os
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class FileIntegrityChecker:
+    """
+    Verifies files against hashes stored by the memory manager.
+
+    Hashes are cached per file together with its (size, mtime_ns, ctime_ns,
+    inode), so files that have not changed since the last check are not read
+    again. ctime is included because, unlike mtime, it cannot be set back by
+    the file's owner, so an in-place rewrite is always re-hashed.
+    Changed files are hashed in parallel threads with chunked reads, and all
+    stored hashes are fetched in a single query when the memory manager
+    supports get_hashes.
+    """
+
+    def __init__(self, memory_manager=None, max_workers: int = 4, chunk_size: int = 1024 * 1024,
+                 read_guard=None):
+        self.memory_manager = memory_manager
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        # Optional CircuitBreaker wrapped around each file read
+        self.read_guard = read_guard
+        self._cache: Dict[str, Tuple[Tuple[int, int, int, int], str]] = {}
+        self.stats = {"checks": 0, "hashed": 0, "cache_hits": 0}
+
+    def hash_file(self, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _guarded_hash(self, path: str) -> Optional[str]:
+        if self.read_guard is None:
+            return self.hash_file(path)
+        return self.read_guard.execute(self.hash_file, path)
+
+    @staticmethod
+    def _stat_key(path: str) -> Optional[Tuple[int, int, int, int]]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_size, st.st_mtime_ns, st.st_ctime_ns, st.st_ino)
+
+    def fingerprint(self, paths: Iterable[str]) -> Tuple:
+        """(size, mtime_ns, ctime_ns, inode) per path, None for missing files; reads no file contents"""
+        return tuple(self._stat_key(path) for path in paths)
+
+    def current_hashes(self, paths: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Hash each path, reusing cached hashes of unchanged files.
+
+        Missing files map to "missing"; unreadable files map to None.
+        """
+        hashes: Dict[str, Optional[str]] = {}
+        to_hash: Dict[str, Tuple[int, int, int, int]] = {}
+        for path in paths:
+            key = self._stat_key(path)
+            if key is None:
+                self._cache.pop(path, None)
+                hashes[path] = "missing"
+                continue
+            cached = self._cache.get(path)
+            if cached and cached[0] == key:
+                hashes[path] = cached[1]
+                self.stats["cache_hits"] += 1
+            else:
+                to_hash[path] = key
+
+        if to_hash:
+            workers = max(1, min(self.max_workers, len(to_hash)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="integrity") as pool:
+                futures = {path: pool.submit(self._guarded_hash, path) for path in to_hash}
+            for path, future in futures.items():
+                try:
+                    digest = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to hash {path}: {e}")
+                    digest = None
+                hashes[path] = digest
+                if digest is not None:
+                    self._cache[path] = (to_hash[path], digest)
+                    self.stats["hashed"] += 1
+        return hashes
+
+    def _stored_hashes(self, paths) -> Dict[str, Optional[str]]:
+        if hasattr(self.memory_manager, "get_hashes"):
+            return self.memory_manager.get_hashes(paths)
+        return {path: self.memory_manager.get_hash(path) for path in paths}
+
+    def check(self, paths: Iterable[str]) -> Dict[str, Dict]:
+        """Return a result dict per path with status ok, modified, missing, read_error or not_verified.
+
+        Files with no stored hash yet are recorded as the new baseline.
+        """
+        paths = list(paths)
+        self.stats["checks"] += 1
+        current = self.current_hashes(paths)
+        results: Dict[str, Dict] = {}
+        present = []
+        for path in paths:
+            digest = current[path]
+            if digest == "missing":
+                logger.error(f"Critical file not found: {path}")
+                results[path] = {"status": "missing"}
+            elif digest is None:
+                logger.error(f"Failed to read {path} (circuit breaker may be open)")
+                results[path] = {"status": "read_error"}
+            else:
+                results[path] = {"current_hash": digest}
+                present.append(path)
+
+        if not hasattr(self.memory_manager, "get_hash") or not hasattr(self.memory_manager, "store_hash"):
+            logger.warning("Memory manager missing hash methods, skipping hash verification")
+            for path in present:
+                results[path]["status"] = "not_verified"
+            return results
+
+        stored = self._stored_hashes(present) if present else {}
+        for path in present:
+            stored_hash = stored.get(path)
+            results[path]["stored_hash"] = stored_hash
+            if stored_hash and stored_hash != current[path]:
+                logger.error(f"Integrity check failed for {path}")
+                results[path]["status"] = "modified"
+                continue
+            results[path]["status"] = "ok"
+            if not stored_hash:
+                try:
+                    self.memory_manager.store_hash(path, current[path])
+                    logger.info(f"Stored new hash for {path}")
+                except Exception as store_err:
+                    logger.warning(f"Failed to store hash for {path}: {store_err}")
+        return results
+
+    def invalidate(self, path: Optional[str] = None):
+        """Forget cached hashes (all, or one path) so they are re-read next check"""
+        if path is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(path, None)
@@ -137,6 +137,32 @@ class MemoryManager:
             logger.error(f"Error getting hash for {file_path}: {e}")
             return None
 
+    def get_hashes(self, file_paths) -> dict:
+        """Get stored hashes for many files in one query; unknown files map to None"""
+        file_paths = list(file_paths)
+        hashes = {path: None for path in file_paths}
+        if not self.conn:
+            logger.warning("Database connection not available")
+            return hashes
+        if not file_paths:
+            return hashes
+
+        try:
+            cursor = self.conn.cursor()
+            # Stay under SQLite's bound-parameter limit for very long lists
+            for start in range(0, len(file_paths), 500):
+                batch = file_paths[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                cursor.execute(
+                    f"SELECT file_path, hash_value FROM file_hashes WHERE file_path IN ({placeholders})",
+                    batch
+                )
+                hashes.update(dict(cursor.fetchall()))
+            return hashes
+        except Exception as e:
+            logger.error(f"Error getting hashes: {e}")
+            return hashes
+
     def store_hash(self, file_path: str, hash_value: str):
         """Store a hash for a file"""
         if not self.conn:
@@ -274,6 +300,28 @@ class MemoryManager:
             logger.error(f"Error retrieving key {key}: {e}")
             return None
 
+    def purge_expired(self, type_hint=None):
+        """Delete expired TTL entries, optionally only those of one type. Returns the number removed."""
+        try:
+            with self._get_connection() as conn:
+                if type_hint:
+                    cursor = conn.execute(
+                        "DELETE FROM memory WHERE expires_at IS NOT NULL AND expires_at < ? AND type = ?",
+                        (time.time(), type_hint)
+                    )
+                else:
+                    cursor = conn.execute(
+                        "DELETE FROM memory WHERE expires_at IS NOT NULL AND expires_at < ?",
+                        (time.time(),)
+                    )
+                purged = cursor.rowcount
+            if purged:
+                logger.debug(f"Purged {purged} expired entries")
+            return purged
+        except Exception as e:
+            logger.error(f"Error purging expired entries: {e}")
+            return 0
+
     def cleanup(self):
         """Cleanup database connections"""
         if hasattr(self, 'conn') and self.conn:
@@ -0,0 +1,148 @@
+import bisect
+import math
+import time
+from typing import Dict, Iterable, Optional
+
+class LatencyHistogram:
+    """Constant-memory latency histogram with log-spaced buckets.
+
+    Percentiles are accurate to within one bucket (the growth factor, ~10% by default).
+    """
+
+    def __init__(self, min_value: float = 0.001, max_value: float = 3600.0, growth: float = 1.1):
+        self.bounds = []
+        bound = min_value
+        while bound < max_value:
+            self.bounds.append(bound)
+            bound *= growth
+        self.bounds.append(max_value)
+        # One extra bucket for values above max_value
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def record(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper bound of the bucket holding the p-th percentile, or None if empty"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    def merge(self, other: "LatencyHistogram"):
+        """Add another histogram's samples (it must use the same buckets)"""
+        if not other.count:
+            return
+        for index, bucket_count in enumerate(other.counts):
+            self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max
+        }
+
+class WindowedLatencyHistogram:
+    """Latency histogram over a trailing time window.
+
+    The window is covered by a ring of per-slice histograms; slices older than
+    the window are reset when reused. Reads merge the live slices, so the
+    window edge is accurate to one slice (window / slices).
+    """
+
+    def __init__(self, window: float, slices: int = 6, **histogram_args):
+        self.window = window
+        self.width = window / slices
+        self._histogram_args = histogram_args
+        self._slices = [[-1, LatencyHistogram(**histogram_args)] for _ in range(slices)]
+
+    def record(self, value: float, now: Optional[float] = None):
+        index = int((time.time() if now is None else now) // self.width)
+        slot = self._slices[index % len(self._slices)]
+        if slot[0] != index:
+            slot[0] = index
+            slot[1].reset()
+        slot[1].record(value)
+
+    def snapshot(self, now: Optional[float] = None) -> LatencyHistogram:
+        current = int((time.time() if now is None else now) // self.width)
+        oldest = current - len(self._slices) + 1
+        merged = LatencyHistogram(**self._histogram_args)
+        for index, histogram in self._slices:
+            if oldest <= index <= current:
+                merged.merge(histogram)
+        return merged
+
+class LatencyRecorder:
+    """Lifetime and sliding-window latency histograms per key"""
+
+    def __init__(self, windows: Optional[Dict[str, float]] = None):
+        self.windows = windows if windows is not None else {"1m": 60, "5m": 300, "1h": 3600}
+        self._lifetime: Dict[str, LatencyHistogram] = {}
+        self._windowed: Dict[str, Dict[str, WindowedLatencyHistogram]] = {}
+
+    def record(self, key: str, value: float, now: Optional[float] = None):
+        if key not in self._lifetime:
+            self._lifetime[key] = LatencyHistogram()
+            self._windowed[key] = {name: WindowedLatencyHistogram(seconds) for name, seconds in self.windows.items()}
+        self._lifetime[key].record(value)
+        now = time.time() if now is None else now
+        for histogram in self._windowed[key].values():
+            histogram.record(value, now)
+
+    def keys(self) -> Iterable[str]:
+        return self._lifetime.keys()
+
+    def summary(self, key: str, now: Optional[float] = None) -> Dict:
+        """p50/p90/p99/max for key over its lifetime and each window"""
+        now = time.time() if now is None else now
+        views = {"lifetime": self._lifetime[key]}
+        views.update({name: histogram.snapshot(now) for name, histogram in self._windowed[key].items()})
+        return {
+            name: {
+                "count": histogram.count,
+                "p50": histogram.percentile(50),
+                "p90": histogram.percentile(90),
+                "p99": histogram.percentile(99),
+                "max": histogram.max
+            }
+            for name, histogram in views.items()
+        }
+
+    def to_dict(self, now: Optional[float] = None) -> Dict:
+        now = time.time() if now is None else now
+        return {key: self.summary(key, now) for key in sorted(self._lifetime)}
@@ -0,0 +1,38 @@
+import time
+from typing import Dict, Optional
+
+class SlidingWindowCounter:
+    """Event and error counts over a trailing time window in constant memory.
+
+    The window is split into a fixed ring of buckets; a bucket is reset when
+    it is reused for a newer time slice, so old events age out on their own.
+    Counts are accurate to one bucket width (window / buckets).
+    """
+
+    def __init__(self, window: float, buckets: int = 60):
+        self.window = window
+        self.width = window / buckets
+        # Each slot: [slice index, events, errors]
+        self.slots = [[-1, 0, 0] for _ in range(buckets)]
+
+    def add(self, error: bool = False, now: Optional[float] = None):
+        index = int((time.time() if now is None else now) // self.width)
+        slot = self.slots[index % len(self.slots)]
+        if slot[0] != index:
+            slot[0], slot[1], slot[2] = index, 0, 0
+        slot[1] += 1
+        slot[2] += int(error)
+
+    def totals(self, now: Optional[float] = None) -> Dict[str, int]:
+        current = int((time.time() if now is None else now) // self.width)
+        oldest = current - len(self.slots) + 1
+        events = errors = 0
+        for index, slot_events, slot_errors in self.slots:
+            if oldest <= index <= current:
+                events += slot_events
+                errors += slot_errors
+        return {"events": events, "errors": errors}
+
+    def error_rate(self, now: Optional[float] = None) -> float:
+        totals = self.totals(now)
+        return totals["errors"] / totals["events"] if totals["events"] else 0.0
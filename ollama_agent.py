@@ -1,78 +1,1669 @@
 import logging
 import requests
 import json
+import re
 import time
-from typing import Dict, Optional
-from resilience.circuit_breaker import CircuitBreaker
+import asyncio
+import threading
+import itertools
+import uuid
+from collections import deque, OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from requests.adapters import HTTPAdapter
+from resilience.circuit_breaker import CircuitBreaker, CircuitState
+from monitoring.latency_histogram import LatencyHistogram
+from response_cache import ResponseCache, make_cache_key
+from semantic_cache import SemanticCache
+
+try:
+    import aiohttp
+except ImportError:  # Optional: fall back to pooled blocking requests in worker threads
+    aiohttp = None
 
 logger = logging.getLogger(__name__)
 
+# Appended to cascade prompts for the small model to self-report confidence
+CONFIDENCE_INSTRUCTION = ("\n\nAfter your answer, add a final line rating your confidence that the "
+                          "answer is correct and complete, formatted exactly as 'Confidence: <0-100>'.")
+CONFIDENCE_PATTERN = re.compile(r"^\s*confidence\s*:\s*(\d{1,3})\s*%?\s*$", re.IGNORECASE | re.MULTILINE)
+# Prefixed to answers served from cache while the LLM is unavailable
+STALE_NOTICE = "[stale: the language model is unavailable, this is an earlier answer]\n"
+# Appended when a stream breaks after part of the answer was already sent
+TRUNCATION_MARKER = "\n[response truncated: the language model stopped responding]"
+UNCERTAIN_PHRASES = (
+    "i'm not sure", "i am not sure", "i don't know", "i do not know", "not certain",
+    "cannot determine", "can't determine", "unable to answer", "need more context", "need more information"
+)
+
+@dataclass
+class GenerationStats:
+    """Client-side latency measurements for a single generation request"""
+    model: str
+    streamed: bool
+    started_at: float = field(default_factory=time.time)
+    time_to_first_token: Optional[float] = None
+    duration: float = 0.0
+    token_count: int = 0
+    queue_wait: float = 0.0  # Time spent waiting for a scheduler slot
+    # Server-side timings reported by Ollama, converted to seconds
+    prompt_eval_count: Optional[int] = None
+    prompt_eval_duration: Optional[float] = None
+    eval_count: Optional[int] = None
+    eval_duration: Optional[float] = None
+    load_duration: Optional[float] = None
+    total_duration: Optional[float] = None
+
+    def update_from_response(self, response_json: Dict):
+        """Capture Ollama's timing fields from a final response or stream chunk"""
+        for count_field in ("prompt_eval_count", "eval_count"):
+            if count_field in response_json:
+                setattr(self, count_field, response_json[count_field])
+        for duration_field in ("prompt_eval_duration", "eval_duration", "load_duration", "total_duration"):
+            if duration_field in response_json:
+                # Ollama reports durations in nanoseconds
+                setattr(self, duration_field, response_json[duration_field] / 1e9)
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        if not self.token_count or self.duration <= 0:
+            return None
+        # Measure decode speed from the first token on, so that prompt
+        # evaluation does not get counted as generation time.
+        decode_time = self.duration - (self.time_to_first_token or 0.0)
+        if decode_time <= 0:
+            decode_time = self.duration
+        return self.token_count / decode_time
+
+    def to_dict(self) -> Dict:
+        return {
+            "model": self.model,
+            "streamed": self.streamed,
+            "time_to_first_token": self.time_to_first_token,
+            "duration": self.duration,
+            "token_count": self.token_count,
+            "tokens_per_sec": self.tokens_per_sec,
+            "queue_wait": self.queue_wait,
+            "prompt_eval_count": self.prompt_eval_count,
+            "prompt_eval_duration": self.prompt_eval_duration,
+            "eval_count": self.eval_count,
+            "eval_duration": self.eval_duration,
+            "load_duration": self.load_duration,
+            "total_duration": self.total_duration
+        }
+
+class ServerTimingAggregate:
+    """
+    Running totals of client and server timings for one model.
+
+    Separates where time goes: queue_wait is our scheduler, total_duration
+    is Ollama's compute (load + prompt eval + generation), and the rest of
+    the client-observed duration is network and server-side queueing.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.timed_requests = 0  # Requests that reported server timings
+        self.queue_wait = 0.0
+        self.client_duration = 0.0
+        self.timed_client_duration = 0.0
+        self.prompt_eval_count = 0
+        self.prompt_eval_duration = 0.0
+        self.eval_count = 0
+        self.eval_duration = 0.0
+        self.load_duration = 0.0
+        self.total_duration = 0.0
+
+    def add(self, stats: GenerationStats):
+        self.requests += 1
+        self.queue_wait += stats.queue_wait
+        self.client_duration += stats.duration
+        if stats.total_duration is None:
+            return
+        self.timed_requests += 1
+        self.timed_client_duration += stats.duration
+        self.prompt_eval_count += stats.prompt_eval_count or 0
+        self.prompt_eval_duration += stats.prompt_eval_duration or 0.0
+        self.eval_count += stats.eval_count or 0
+        self.eval_duration += stats.eval_duration or 0.0
+        self.load_duration += stats.load_duration or 0.0
+        self.total_duration += stats.total_duration
+
+    def to_dict(self) -> Dict:
+        timed = self.timed_requests
+        return {
+            "requests": self.requests,
+            "timed_requests": timed,
+            "eval_tokens_per_sec": self.eval_count / self.eval_duration if self.eval_duration else None,
+            "prompt_tokens_per_sec": (self.prompt_eval_count / self.prompt_eval_duration
+                                      if self.prompt_eval_duration else None),
+            "avg_queue_wait": self.queue_wait / self.requests if self.requests else None,
+            "avg_load_duration": self.load_duration / timed if timed else None,
+            "avg_server_duration": self.total_duration / timed if timed else None,
+            "avg_client_duration": self.client_duration / self.requests if self.requests else None,
+            # Client-observed time not spent computing on the server
+            "avg_network_overhead": (max(0.0, self.timed_client_duration - self.total_duration) / timed
+                                     if timed else None)
+        }
+
+@dataclass
+class GenerationResult:
+    """Outcome of one generation: the text plus whether it came from Ollama, the cache or a fallback"""
+    text: str
+    ok: bool = True
+    cached: bool = False
+    token_count: int = 0
+    duration: float = 0.0
+    error: Optional[str] = None
+    model: Optional[str] = None
+    cascade_path: Optional[str] = None  # "small", "escalated" or "direct" for cascade requests
+    stale: bool = False  # Served from cache while the LLM was unavailable
+
+    def to_dict(self) -> Dict:
+        return {
+            "text": self.text,
+            "model": self.model,
+            "cascade_path": self.cascade_path,
+            "stale": self.stale,
+            "ok": self.ok,
+            "cached": self.cached,
+            "token_count": self.token_count,
+            "duration": self.duration,
+            "error": self.error
+        }
+
+@dataclass
+class BatchResult:
+    """Results of generate_many in prompt order, with aggregate throughput"""
+    results: List[GenerationResult]
+    duration: float
+
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for result in self.results if result.ok)
+
+    @property
+    def failed(self) -> int:
+        return len(self.results) - self.succeeded
+
+    @property
+    def token_count(self) -> int:
+        return sum(result.token_count for result in self.results if not result.cached)
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        if not self.token_count or self.duration <= 0:
+            return None
+        return self.token_count / self.duration
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": len(self.results),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "duration": self.duration,
+            "token_count": self.token_count,
+            "tokens_per_sec": self.tokens_per_sec
+        }
+
+class OllamaTransport:
+    """
+    Keep-alive, connection-pooled HTTP transport for the Ollama API.
+
+    Uses aiohttp when it is installed so requests never block the event loop.
+    Otherwise a pooled requests.Session is driven from worker threads, which
+    still keeps the loop responsive and reuses TCP connections.
+    """
+
+    def __init__(self, pool_size: int = 10, timeout: float = 30, connect_timeout: float = 5,
+                 keepalive_timeout: float = 60, use_async: bool = True):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.use_async = use_async and aiohttp is not None
+        if use_async and aiohttp is None:
+            logger.warning("aiohttp not installed, using blocking requests transport in worker threads")
+
+        # One aiohttp session per event loop; each is closed when its loop shuts down
+        self._sessions: Dict[asyncio.AbstractEventLoop, Any] = {}
+        self._session_guards: Dict[asyncio.AbstractEventLoop, AsyncIterator[None]] = {}
+
+        # Blocking fallback path, also used by synchronous callers
+        self._blocking_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._blocking_session.mount("http://", adapter)
+        self._blocking_session.mount("https://", adapter)
+
+    def _get_session(self):
+        """Return the aiohttp session for the running loop, creating it on first use.
+
+        A session is bound to the loop it was created on, so each loop gets
+        its own, and it is closed when that loop shuts down: asyncio.run()
+        finalizes pending async generators before closing the loop, which
+        runs the cleanup in _session_guard.
+        """
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            # Forget sessions of loops that were closed without finalizing them
+            for closed_loop in [other for other in self._sessions if other.is_closed()]:
+                del self._sessions[closed_loop]
+                self._session_guards.pop(closed_loop, None)
+            connector = aiohttp.TCPConnector(limit=self.pool_size,
+                                             keepalive_timeout=self.keepalive_timeout)
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[loop] = session
+            guard = self._session_guard(loop, session)
+            # The loop only holds a weak reference to the generator
+            self._session_guards[loop] = guard
+            asyncio.ensure_future(guard.__anext__())
+        return session
+
+    async def _session_guard(self, loop: asyncio.AbstractEventLoop, session) -> AsyncIterator[None]:
+        try:
+            yield
+        finally:
+            if self._sessions.get(loop) is session:
+                del self._sessions[loop]
+                self._session_guards.pop(loop, None)
+            if not session.closed:
+                await session.close()
+
+    def _client_timeout(self, timeout: Optional[float]):
+        return aiohttp.ClientTimeout(total=None, connect=self.connect_timeout,
+                                     sock_read=timeout or self.timeout)
+
+    def _blocking_timeout(self, timeout: Optional[float]):
+        return (self.connect_timeout, timeout or self.timeout)
+
+    def post_json_blocking(self, url: str, payload: Dict, timeout: Optional[float] = None) -> Dict:
+        """POST a JSON payload and return the decoded JSON response (blocking)"""
+        response = self._blocking_session.post(url, json=payload, timeout=self._blocking_timeout(timeout))
+        response.raise_for_status()
+        return response.json()
+
+    def get_json_blocking(self, url: str, timeout: Optional[float] = None) -> Dict:
+        """GET a URL and return the decoded JSON response (blocking)"""
+        response = self._blocking_session.get(url, timeout=self._blocking_timeout(timeout))
+        response.raise_for_status()
+        return response.json()
+
+    def stream_json_blocking(self, url: str, payload: Dict, stop_event: threading.Event,
+                             timeout: Optional[float] = None) -> Iterator[Dict]:
+        """POST a JSON payload and yield each line of the NDJSON response (blocking)"""
+        with self._blocking_session.post(url, json=payload, stream=True,
+                                         timeout=self._blocking_timeout(timeout)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if stop_event.is_set():
+                    break
+                if line:
+                    yield json.loads(line)
+
+    async def post_json(self, url: str, payload: Dict, timeout: Optional[float] = None) -> Dict:
+        """POST a JSON payload and return the decoded JSON response"""
+        if not self.use_async:
+            return await asyncio.to_thread(self.post_json_blocking, url, payload, timeout)
+
+        session = self._get_session()
+        async with session.post(url, json=payload, timeout=self._client_timeout(timeout)) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def get_json(self, url: str, timeout: Optional[float] = None) -> Dict:
+        """GET a URL and return the decoded JSON response"""
+        if not self.use_async:
+            return await asyncio.to_thread(self.get_json_blocking, url, timeout)
+
+        session = self._get_session()
+        async with session.get(url, timeout=self._client_timeout(timeout)) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def stream_json(self, url: str, payload: Dict, timeout: Optional[float] = None) -> AsyncIterator[Dict]:
+        """POST a JSON payload and yield each line of the NDJSON response as it arrives"""
+        if self.use_async:
+            session = self._get_session()
+            async with session.post(url, json=payload, timeout=self._client_timeout(timeout)) as response:
+                response.raise_for_status()
+                async for line in response.content:
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+            return
+
+        async for chunk in self._stream_in_thread(url, payload, timeout):
+            yield chunk
+
+    async def _stream_in_thread(self, url: str, payload: Dict, timeout: Optional[float]) -> AsyncIterator[Dict]:
+        """Bridge the blocking NDJSON stream from a worker thread onto the event loop"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop_event = threading.Event()
+
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # Event loop already closed; the consumer is gone
+                stop_event.set()
+
+        def producer():
+            try:
+                for chunk in self.stream_json_blocking(url, payload, stop_event, timeout):
+                    put(("chunk", chunk))
+                put(("done", None))
+            except Exception as e:
+                put(("error", e))
+
+        loop.run_in_executor(None, producer)
+        try:
+            while True:
+                kind, item = await queue.get()
+                if kind == "done":
+                    return
+                if kind == "error":
+                    raise item
+                yield item
+        finally:
+            stop_event.set()
+
+    async def close(self):
+        """Close pooled connections on every loop"""
+        current = asyncio.get_running_loop()
+        sessions, self._sessions = self._sessions, {}
+        self._session_guards.clear()
+        for loop, session in sessions.items():
+            if session.closed:
+                continue
+            try:
+                if loop is current:
+                    await session.close()
+                elif loop.is_running():
+                    # Sessions must be closed on their own loop
+                    await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), loop))
+            except Exception as e:
+                logger.warning(f"Error closing HTTP session: {e}")
+        self._blocking_session.close()
+
+class RequestPriority(Enum):
+    """Scheduling class of an LLM request; lower values are served first"""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+    BATCH = 2
+
+class _Ticket:
+    """A request's place in the LLM scheduler queue"""
+
+    def __init__(self, priority: RequestPriority, seq: int):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = time.time()
+        self.future: Optional[asyncio.Future] = None
+
+class LLMScheduler:
+    """
+    Admission control for LLM calls.
+
+    At most max_concurrency requests run upstream at once. Waiting requests
+    are admitted by priority class; a request's effective priority improves
+    by one class for every aging_interval seconds it has waited, so batch
+    work is delayed but never starved.
+    """
+
+    def __init__(self, max_concurrency: int = 2, aging_interval: float = 10.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.aging_interval = aging_interval
+        self._active = 0
+        self._waiters: List[_Ticket] = []
+        self._seq = itertools.count()
+        self.stats = {
+            priority.name.lower(): {"admitted": 0, "total_wait": 0.0, "max_wait": 0.0}
+            for priority in RequestPriority
+        }
+
+    def ticket(self, priority: RequestPriority) -> _Ticket:
+        return _Ticket(priority, next(self._seq))
+
+    def _effective_priority(self, ticket: _Ticket, now: float):
+        aged = (now - ticket.enqueued_at) / self.aging_interval if self.aging_interval > 0 else 0.0
+        return (ticket.priority.value - aged, ticket.seq)
+
+    def _admit(self, ticket: _Ticket):
+        self._active += 1
+        wait = time.time() - ticket.enqueued_at
+        stats = self.stats[ticket.priority.name.lower()]
+        stats["admitted"] += 1
+        stats["total_wait"] += wait
+        stats["max_wait"] = max(stats["max_wait"], wait)
+
+    def _dispatch(self):
+        """Hand free slots to the best waiting tickets"""
+        while self._active < self.max_concurrency and self._waiters:
+            now = time.time()
+            ticket = min(self._waiters, key=lambda t: self._effective_priority(t, now))
+            self._waiters.remove(ticket)
+            if ticket.future.done():
+                continue  # Cancelled while queued
+            self._admit(ticket)
+            ticket.future.set_result(None)
+
+    def promote(self, ticket: _Ticket, priority: RequestPriority):
+        """Raise a queued ticket's priority, e.g. when an interactive caller joins its request"""
+        if priority.value < ticket.priority.value:
+            ticket.priority = priority
+
+    async def acquire(self, ticket: _Ticket):
+        if self._active < self.max_concurrency and not self._waiters:
+            self._admit(ticket)
+            return
+
+        ticket.future = asyncio.get_running_loop().create_future()
+        self._waiters.append(ticket)
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket in self._waiters:
+                self._waiters.remove(ticket)
+            elif ticket.future.done() and not ticket.future.cancelled():
+                # The slot was handed over just before cancellation; pass it on
+                self.release()
+            raise
+
+    def release(self):
+        self._active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, ticket: _Ticket):
+        """Hold a concurrency slot for the duration of the block"""
+        await self.acquire(ticket)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict:
+        """Queue depth and wait-time metrics per priority class"""
+        now = time.time()
+        classes = {}
+        for priority in RequestPriority:
+            name = priority.name.lower()
+            stats = self.stats[name]
+            queued = [t for t in self._waiters if t.priority is priority]
+            classes[name] = {
+                "queued": len(queued),
+                "admitted": stats["admitted"],
+                "avg_wait": stats["total_wait"] / stats["admitted"] if stats["admitted"] else 0.0,
+                "max_wait": stats["max_wait"],
+                "oldest_wait": max((now - t.enqueued_at for t in queued), default=0.0)
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "queue_depth": len(self._waiters),
+            "classes": classes
+        }
+
+class NoHealthyEndpointError(RuntimeError):
+    """Raised when every Ollama endpoint is unavailable or failed"""
+    pass
+
+class StreamInterruptedError(RuntimeError):
+    """Raised by stream_response after the partial answer when the stream failed midway"""
+    pass
+
+class OllamaEndpoint:
+    """One Ollama host with its own circuit breaker, load and latency tracking"""
+
+    def __init__(self, base_url: str, failure_threshold: int = 3, recovery_timeout: int = 60,
+                 ewma_alpha: float = 0.3):
+        self.base_url = base_url.rstrip('/')
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=failure_threshold,
+            recovery_timeout=recovery_timeout
+        )
+        self.ewma_alpha = ewma_alpha
+        self.ewma_latency: Optional[float] = None
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+
+    def is_available(self) -> bool:
+        """Whether the circuit would let a request through (without changing its state)"""
+        breaker = self.circuit_breaker
+        return (breaker.state != CircuitState.OPEN or
+                time.time() - breaker.last_failure_time > breaker.recovery_timeout)
+
+    def load_score(self, default_latency: float) -> float:
+        """Expected wait if routed here: outstanding requests times smoothed latency"""
+        latency = self.ewma_latency if self.ewma_latency is not None else default_latency
+        return (self.outstanding + 1) * latency
+
+    def record_success(self, latency: float):
+        self.requests += 1
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * self.ewma_latency
+        self.circuit_breaker.record_success()
+
+    def record_failure(self, error: Exception):
+        self.requests += 1
+        self.failures += 1
+        self.circuit_breaker.record_failure(error)
+
+    def to_dict(self) -> Dict:
+        return {
+            "base_url": self.base_url,
+            "state": self.circuit_breaker.state.value,
+            "outstanding": self.outstanding,
+            "ewma_latency": self.ewma_latency,
+            "requests": self.requests,
+            "failures": self.failures
+        }
+
+class EndpointRouter:
+    """Orders endpoints by least outstanding requests weighted by EWMA latency"""
+
+    def __init__(self, endpoints: List[OllamaEndpoint]):
+        if not endpoints:
+            raise ValueError("At least one Ollama endpoint is required")
+        self.endpoints = endpoints
+
+    def candidates(self) -> List[OllamaEndpoint]:
+        """Available endpoints, best first"""
+        measured = [e.ewma_latency for e in self.endpoints if e.ewma_latency is not None]
+        # Unmeasured hosts are assumed as fast as the best one so they get tried
+        default_latency = min(measured) if measured else 1.0
+        available = [e for e in self.endpoints if e.is_available()]
+        return sorted(available, key=lambda e: e.load_score(default_latency))
+
+    def has_available(self) -> bool:
+        return any(e.is_available() for e in self.endpoints)
+
+class AdaptiveTimeout:
+    """Per-key read timeouts derived from observed latency: p99 x factor, scaled by prompt size.
+
+    Until min_samples latencies are recorded for a key the default timeout is used.
+    """
+
+    def __init__(self, default: float, factor: float = 3.0, min_timeout: float = 5.0,
+                 max_timeout: float = 300.0, min_samples: int = 20, enabled: bool = True):
+        self.default = default
+        self.factor = factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_samples = min_samples
+        self.enabled = enabled
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._prompt_size: Dict[str, float] = {}  # EWMA of prompt size per key
+
+    def record(self, key: str, latency: float, prompt_size: int = 0):
+        self.histograms.setdefault(key, LatencyHistogram()).record(latency)
+        average = self._prompt_size.get(key)
+        self._prompt_size[key] = prompt_size if average is None else 0.1 * prompt_size + 0.9 * average
+
+    def percentile(self, key: str, p: float) -> Optional[float]:
+        """Latency percentile for key, or None until enough samples exist"""
+        histogram = self.histograms.get(key)
+        if histogram is None or histogram.count < self.min_samples:
+            return None
+        return histogram.percentile(p)
+
+    def timeout_for(self, key: str, prompt_size: int = 0) -> float:
+        if not self.enabled:
+            return self.default
+        p99 = self.percentile(key, 99)
+        if p99 is None:
+            return self.default
+        # Prompts larger than usual take proportionally longer to evaluate
+        average = self._prompt_size.get(key) or 0
+        scale = max(1.0, prompt_size / average) if average else 1.0
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.factor * scale))
+
+    def get_stats(self) -> Dict:
+        return {
+            key: {**histogram.to_dict(), "timeout": self.timeout_for(key)}
+            for key, histogram in self.histograms.items()
+        }
+
+class _InFlightRequest:
+    """
+    One upstream generation shared by every caller asking for the same prompt.
+
+    Tokens are buffered so a caller joining late first replays what has been
+    generated so far. When every subscriber has gone away before the
+    generation finished, the upstream call is cancelled.
+    """
+
+    def __init__(self, streamed: bool, ticket: _Ticket):
+        self.streamed = streamed
+        self.ticket = ticket
+        self.tokens = []
+        self.done = False
+        self.succeeded = False
+        self.cached = False
+        self.token_count = 0
+        self.error: Optional[str] = None
+        self.stale = False
+        self.truncated = False
+        self.subscribers = 0
+        self.abandoned = False
+        self.task = None
+        self._updated = asyncio.Event()
+
+    @property
+    def joinable(self) -> bool:
+        return not self.done and not self.abandoned
+
+    @property
+    def text(self) -> str:
+        return "".join(self.tokens)
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def publish(self, token: str):
+        self.tokens.append(token)
+        self._notify()
+
+    def finish(self, succeeded: bool):
+        self.done = True
+        self.succeeded = succeeded
+        self._notify()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        """Yield every token of the flight, waiting for new ones until it finishes"""
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(self.tokens):
+                    index += 1
+                    yield self.tokens[index - 1]
+                if self.done:
+                    return
+                await self._updated.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done and self.task is not None:
+                self.abandoned = True
+                self.task.cancel()
+
+    async def result(self) -> str:
+        """Wait for the flight to finish and return the full text"""
+        async for _ in self.subscribe():
+            pass
+        return self.text
+
+@dataclass
+class ChatSession:
+    """Conversation state for one /api/chat session"""
+    session_id: str
+    messages: List[Dict] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    turns: int = 0
+    last_prompt_eval_count: int = 0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    def to_dict(self) -> Dict:
+        return {
+            "session_id": self.session_id,
+            "messages": len(self.messages),
+            "turns": self.turns,
+            "idle": time.time() - self.last_used,
+            "last_prompt_eval_count": self.last_prompt_eval_count
+        }
+
+class ChatSessionStore:
+    """
+    Holds chat sessions with idle-time and size based eviction.
+
+    History is trimmed in large steps rather than one message at a time:
+    Ollama reuses its cached evaluation of an unchanged message prefix, and
+    every trim changes the prefix, forcing a full re-evaluation.
+    """
+
+    def __init__(self, max_sessions: int = 32, idle_timeout: float = 1800, max_messages: int = 40):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_messages = max(2, max_messages)
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self.stats = {"created": 0, "evicted_idle": 0, "evicted_size": 0, "trimmed": 0}
+
+    def _evict(self):
+        now = time.time()
+        for session_id in [sid for sid, session in self._sessions.items()
+                           if now - session.last_used > self.idle_timeout and not session.lock.locked()]:
+            del self._sessions[session_id]
+            self.stats["evicted_idle"] += 1
+        excess = len(self._sessions) - self.max_sessions
+        if excess > 0:
+            # Sessions in the middle of a turn are skipped; they can go once their lock is released
+            for session_id in [sid for sid, session in self._sessions.items() if not session.lock.locked()][:excess]:
+                del self._sessions[session_id]
+                self.stats["evicted_size"] += 1
+
+    def create(self, session_id: Optional[str] = None, system_prompt: Optional[str] = None) -> ChatSession:
+        session = ChatSession(session_id=session_id or uuid.uuid4().hex)
+        if system_prompt:
+            session.messages.append({"role": "system", "content": system_prompt})
+        self._sessions[session.session_id] = session
+        self.stats["created"] += 1
+        self._evict()
+        return session
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        self._evict()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_used = time.time()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def get_or_create(self, session_id: str) -> ChatSession:
+        return self.get(session_id) or self.create(session_id)
+
+    def remove(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def record_turn(self, session: ChatSession, user_message: Dict, reply: str):
+        """Append a completed turn and trim the history if it grew too long"""
+        session.messages.append(user_message)
+        session.messages.append({"role": "assistant", "content": reply})
+        session.turns += 1
+        session.last_used = time.time()
+
+        if len(session.messages) > self.max_messages:
+            system = [m for m in session.messages[:1] if m["role"] == "system"]
+            history = session.messages[len(system):]
+            keep = (self.max_messages // 2) - len(system)
+            # Keep whole user/assistant pairs, and always the turn just completed
+            keep = max(2, keep - keep % 2)
+            session.messages = system + history[-keep:]
+            self.stats["trimmed"] += 1
+
+    def get_stats(self) -> Dict:
+        self._evict()
+        return dict(self.stats, active=len(self._sessions))
+
 class OllamaAgent:
     def __init__(self, model: str = "gemma3:12b", base_url: str = "http://localhost:11434",
-                 failure_threshold: int = 3, recovery_timeout: int = 60):
-        """Initialize Ollama agent"""
+                 failure_threshold: int = 3, recovery_timeout: int = 60,
+                 stats_history: int = 100, timeout: float = 30, connect_timeout: float = 5,
+                 pool_size: int = 10, use_async_transport: bool = True,
+                 memory_manager=None, cache_max_entries: int = 256, cache_ttl: int = 3600,
+                 coalesce_requests: bool = True, max_concurrency: int = 2,
+                 aging_interval: float = 10.0, max_sessions: int = 32,
+                 session_idle_timeout: float = 1800, session_max_messages: int = 40,
+                 endpoints: Optional[List[str]] = None, adaptive_timeout: bool = True,
+                 timeout_factor: float = 3.0, min_timeout: float = 5.0, max_timeout: float = 300.0,
+                 hedge_requests: bool = False, embedding_model: str = "nomic-embed-text",
+                 semantic_cache: bool = False, semantic_threshold: float = 0.95,
+                 semantic_max_entries: int = 1024, semantic_cache_path: Optional[str] = None,
+                 keep_alive: Optional[str] = None, cascade_model: Optional[str] = None,
+                 cascade_min_confidence: int = 70, cascade_max_prompt_chars: int = 4000):
+        """Initialize Ollama agent
+
+        endpoints lists several Ollama hosts to route between; when omitted
+        base_url is the only host. max_concurrency applies per host.
+        timeout is the read timeout until enough latency samples exist to
+        derive one per model; hedge_requests sends a duplicate non-streaming
+        request to a second host once the first exceeds the model's p95.
+        semantic_cache also answers cached requests from near-duplicate
+        prompts, compared by embeddings from embedding_model.
+        keep_alive (e.g. "30m", or -1 for indefinitely) is sent with every
+        request so Ollama keeps the model loaded between calls.
+        cascade_model names a small, fast model that generate_cascade tries
+        before escalating to model.
+        """
         self.model = model
-        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.keep_alive = keep_alive
 
-        # Initialize circuit breaker for API calls
-        self.circuit_breaker = CircuitBreaker(
-            failure_threshold=failure_threshold,
-            recovery_timeout=recovery_timeout,
-            fallback=self._api_fallback
+        # Read timeouts derived from per-model latency histograms
+        self.timeouts = AdaptiveTimeout(
+            default=timeout,
+            factor=timeout_factor,
+            min_timeout=min_timeout,
+            max_timeout=max_timeout,
+            enabled=adaptive_timeout
         )
+        self.hedge_requests = hedge_requests
+        self.hedging_stats = {"hedged": 0, "hedge_wins": 0, "hedge_skipped": 0}
+
+        # Small-model-first cascade
+        self.cascade_model = cascade_model
+        self.cascade_min_confidence = cascade_min_confidence
+        self.cascade_max_prompt_chars = cascade_max_prompt_chars
+        self.cascade_stats = {"small": 0, "escalated": 0, "direct": 0, "latency_saved": 0.0}
+        self.cascade_history = deque(maxlen=stats_history)
 
-        logger.info(f"Initialized Ollama agent with model: {model}")
+        # Degraded mode: answer from caches and registered sources while the LLM is down
+        self.degraded_sources: List[Callable[[str], Optional[str]]] = []
+        self.degraded_stats = {"stale_served": 0, "unanswered": 0}
+        # The backend is already failing then, so the semantic lookup may only wait briefly
+        self.degraded_embed_timeout = min(2.0, timeout)
+
+        # One circuit breaker per host; requests fail over to healthy hosts
+        self.router = EndpointRouter([
+            OllamaEndpoint(url, failure_threshold=failure_threshold, recovery_timeout=recovery_timeout)
+            for url in (endpoints or [base_url])
+        ])
+        self.base_url = self.router.endpoints[0].base_url
+        # Primary host's breaker, kept for callers that inspect a single circuit
+        self.circuit_breaker = self.router.endpoints[0].circuit_breaker
+
+        # Shared keep-alive connection pool for all requests
+        self.transport = OllamaTransport(
+            pool_size=pool_size,
+            timeout=timeout,
+            connect_timeout=connect_timeout,
+            use_async=use_async_transport
+        )
+
+        # Opt-in response cache; the persistent tier lives in the MemoryManager DB
+        self.cache = ResponseCache(
+            memory_manager=memory_manager,
+            max_entries=cache_max_entries,
+            ttl=cache_ttl
+        )
+
+        # Optional near-duplicate lookup behind the exact-match cache
+        self.embedding_model = embedding_model
+        self.semantic_cache = None
+        if semantic_cache:
+            try:
+                self.semantic_cache = SemanticCache(
+                    max_entries=semantic_max_entries,
+                    threshold=semantic_threshold,
+                    ttl=cache_ttl,
+                    path=semantic_cache_path
+                )
+            except ImportError as e:
+                logger.warning(f"Semantic cache disabled: {e}")
+
+        # Bounded history of per-request latency stats, plus per-model totals
+        self.generation_stats = deque(maxlen=stats_history)
+        self.server_timings: Dict[str, ServerTimingAggregate] = {}
+
+        # Bounded-concurrency, priority-aware admission for upstream calls
+        self.endpoint_concurrency = max(1, max_concurrency)
+        self.scheduler = LLMScheduler(max_concurrency=self.endpoint_concurrency * len(self.router.endpoints),
+                                      aging_interval=aging_interval)
+
+        # Stateful chat sessions built on /api/chat
+        self.sessions = ChatSessionStore(
+            max_sessions=max_sessions,
+            idle_timeout=session_idle_timeout,
+            max_messages=session_max_messages
+        )
+
+        # Single-flight: identical concurrent requests share one upstream call
+        self.coalesce = coalesce_requests
+        self._inflight: Dict[str, _InFlightRequest] = {}
+        self.coalescing_stats = {"upstream_requests": 0, "coalesced_requests": 0}
+
+        logger.info(f"Initialized Ollama agent with model: {model} "
+                    f"({len(self.router.endpoints)} endpoint(s))")
 
     def _api_fallback(self) -> str:
         """Fallback response when circuit breaker is open"""
         logger.warning("Circuit breaker is open, using fallback response")
         return "I'm currently experiencing technical difficulties. Please try again later."
 
+    def add_degraded_source(self, source: Callable[[str], Optional[str]]):
+        """Register a callable that may answer a prompt from local data while the LLM is unavailable"""
+        self.degraded_sources.append(source)
+
+    async def _degraded_answer(self, prompt: str, options: Optional[Dict] = None,
+                               model: Optional[str] = None) -> Optional[str]:
+        """Find an earlier answer for prompt without generating: exact cache, semantic cache, then sources"""
+        model = model or self.model
+        answer = self.cache.get_stale(make_cache_key(model, prompt, options))
+        if answer is None and self.semantic_cache is not None:
+            try:
+                # Only possible while some endpoint still accepts requests
+                embedding = await self.embed(prompt, timeout=self.degraded_embed_timeout)
+            except Exception:
+                embedding = None
+            if embedding is not None:
+                answer = self.semantic_cache.lookup(embedding, make_cache_key(model, "", options),
+                                                    include_expired=True)
+        for source in self.degraded_sources:
+            if answer is not None:
+                break
+            try:
+                answer = source(prompt)
+            except Exception as e:
+                logger.warning(f"Degraded-mode source failed: {e}")
+        return answer
+
+    async def _fallback_text(self, prompt: str, options: Optional[Dict] = None,
+                             model: Optional[str] = None) -> Tuple[str, bool]:
+        """Return (text, stale): an earlier answer marked as stale, or the fallback message"""
+        answer = await self._degraded_answer(prompt, options, model)
+        if answer is None:
+            self.degraded_stats["unanswered"] += 1
+            return self._api_fallback(), False
+        self.degraded_stats["stale_served"] += 1
+        logger.warning("LLM unavailable, serving a stale answer from cache")
+        return STALE_NOTICE + answer, True
+
+    async def _publish_fallback(self, flight: "_InFlightRequest", prompt: str, options: Optional[Dict],
+                                model: Optional[str]):
+        """Publish the fallback message or a stale answer as the flight's whole output.
+
+        Only called before any token went out (see _fail_flight), so a stale
+        answer is never spliced onto part of a live one.
+        """
+        text, flight.stale = await self._fallback_text(prompt, options, model)
+        flight.publish(text)
+
+    async def _fail_flight(self, flight: "_InFlightRequest", prompt: str, options: Optional[Dict],
+                           model: Optional[str]):
+        """End a failed flight: fallback text if nothing was sent yet, otherwise mark the answer truncated"""
+        if not flight.tokens:
+            await self._publish_fallback(flight, prompt, options, model)
+            return
+        logger.warning(f"Stream failed after {flight.token_count} tokens, answer truncated: {flight.error}")
+        flight.truncated = True
+        flight.publish(TRUNCATION_MARKER)
+
+    def _generate_payload(self, prompt: str, stream: bool, options: Optional[Dict] = None,
+                          model: Optional[str] = None) -> Dict:
+        payload = {
+            "model": model or self.model,
+            "prompt": prompt,
+            "stream": stream
+        }
+        if options:
+            payload["options"] = options
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    @property
+    def _first_token_key(self) -> str:
+        return f"{self.model}:first_token"
+
+    @property
+    def _model_info_key(self) -> str:
+        return f"{self.model}:show"
+
     def _make_api_call(self, prompt: str) -> str:
-        """Make the actual API call to Ollama"""
-        response = requests.post(
+        """Make a blocking API call to Ollama (for synchronous callers)"""
+        stats = GenerationStats(model=self.model, streamed=False)
+        response_json = self.transport.post_json_blocking(
             f"{self.base_url}/api/generate",
-            json={
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False  # Disable streaming for simpler handling
-            },
-            stream=False,
-            timeout=30  # Add timeout to prevent hanging
+            self._generate_payload(prompt, stream=False),
+            timeout=self.timeouts.timeout_for(self.model, len(prompt))
         )
-        response.raise_for_status()
-
-        # Parse the response and extract the generated text
-        response_json = response.json()
+        stats.duration = stats.time_to_first_token = time.time() - stats.started_at
+        stats.token_count = response_json.get("eval_count", 0)
+        stats.update_from_response(response_json)
+        self._record_stats(stats)
         return response_json.get('response', '')
 
-    async def generate_response(self, prompt: str) -> str:
-        """Generate response using Ollama API with circuit breaker protection"""
+    async def _make_async_api_call(self, prompt: str, options: Optional[Dict] = None,
+                                   endpoint: Optional[OllamaEndpoint] = None,
+                                   model: Optional[str] = None) -> Dict:
+        """Make the actual API call to Ollama without blocking the event loop"""
+        base_url = endpoint.base_url if endpoint else self.base_url
+        model = model or self.model
+        return await self.transport.post_json(
+            f"{base_url}/api/generate",
+            self._generate_payload(prompt, stream=False, options=options, model=model),
+            timeout=self.timeouts.timeout_for(model, len(prompt))
+        )
+
+    async def _stream_api_call(self, prompt: str, options: Optional[Dict] = None,
+                               endpoint: Optional[OllamaEndpoint] = None) -> AsyncIterator[Dict]:
+        """Make a streaming API call to Ollama, yielding each decoded JSON chunk"""
+        base_url = endpoint.base_url if endpoint else self.base_url
+        async for chunk in self.transport.stream_json(
+            f"{base_url}/api/generate",
+            self._generate_payload(prompt, stream=True, options=options),
+            # Applies to each read between chunks, so the first token bounds it
+            timeout=self.timeouts.timeout_for(self._first_token_key, len(prompt))
+        ):
+            if chunk.get("error"):
+                raise RuntimeError(chunk["error"])
+            yield chunk
+            if chunk.get("done"):
+                break
+
+    def _record_stats(self, stats: GenerationStats):
+        """Store stats for a finished request and log them"""
+        self.generation_stats.append(stats)
+        self.server_timings.setdefault(stats.model, ServerTimingAggregate()).add(stats)
+        tps = stats.tokens_per_sec
+        logger.info(
+            f"Generation finished: model={stats.model} streamed={stats.streamed} "
+            f"ttft={stats.time_to_first_token if stats.time_to_first_token is not None else -1:.2f}s "
+            f"duration={stats.duration:.2f}s tokens={stats.token_count} "
+            f"tokens/sec={tps if tps is not None else 0:.1f} queue_wait={stats.queue_wait:.2f}s "
+            f"server={stats.total_duration if stats.total_duration is not None else -1:.2f}s"
+        )
+
+    def _log_api_error(self, error: Exception):
+        if isinstance(error, (requests.exceptions.RequestException, asyncio.TimeoutError)) or (
+                aiohttp is not None and isinstance(error, aiohttp.ClientError)):
+            logger.error(f"Ollama API error: {error}")
+        elif isinstance(error, json.JSONDecodeError):
+            logger.error(f"JSON parsing error: {error}")
+        else:
+            logger.error(f"Unexpected error: {error}")
+
+    async def _call_endpoint(self, endpoint: OllamaEndpoint, call: Callable[[OllamaEndpoint], Awaitable]):
+        """Run call(endpoint) once, recording load, latency and failures on the endpoint"""
+        endpoint.outstanding += 1
+        started = time.time()
         try:
-            # Use circuit breaker to protect against API failures
-            return self.circuit_breaker.execute(
-                self._make_api_call,
-                prompt
-            )
-
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ollama API error: {e}")
-            return f"Error generating response: {str(e)}"
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}")
-            return f"Error parsing response: {str(e)}"
+            result = await call(endpoint)
         except Exception as e:
-            logger.error(f"Unexpected error: {e}")
-            return f"Unexpected error: {str(e)}"
+            endpoint.record_failure(e)
+            raise
+        finally:
+            endpoint.outstanding -= 1
+        endpoint.record_success(time.time() - started)
+        return result
 
-    def _get_model_info_call(self) -> Dict:
-        """Make the actual API call to get model info"""
-        response = requests.get(
-            f"{self.base_url}/api/show/{self.model}",
-            timeout=30  # Add timeout to prevent hanging
+    async def _call_with_failover(self, call: Callable[[OllamaEndpoint], Awaitable],
+                                  hedge_after: Optional[float] = None):
+        """Run call(endpoint) on the best available endpoint, failing over to the next on error.
+
+        With hedge_after set, a duplicate goes to the next endpoint if the first
+        has not answered in that many seconds; the first success wins and the
+        other attempt is cancelled. The duplicate is not admitted by the
+        scheduler, so it is skipped when the next endpoint already runs
+        endpoint_concurrency requests.
+        """
+        remaining = self.router.candidates()
+        pending: Dict[asyncio.Task, OllamaEndpoint] = {}
+
+        def launch(hedge: bool = False) -> bool:
+            for endpoint in list(remaining):
+                if hedge and endpoint.outstanding >= self.endpoint_concurrency:
+                    continue  # Still available for failover once its requests finish
+                remaining.remove(endpoint)
+                if endpoint.circuit_breaker.allow_request():
+                    pending[asyncio.ensure_future(self._call_endpoint(endpoint, call))] = endpoint
+                    return True
+            return False
+
+        last_error = None
+        hedged = False
+        launch()
+        primary = next(iter(pending), None)
+        try:
+            while pending:
+                wait = hedge_after if hedge_after is not None and not hedged else None
+                done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    if launch(hedge=True):
+                        self.hedging_stats["hedged"] += 1
+                    elif remaining:
+                        self.hedging_stats["hedge_skipped"] += 1
+                    continue
+                for task in done:
+                    pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        self._log_api_error(e)
+                        last_error = e
+                        continue
+                    if hedged and task is not primary:
+                        self.hedging_stats["hedge_wins"] += 1
+                    return result
+                if not pending:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise NoHealthyEndpointError("No healthy Ollama endpoint available") from last_error
+
+    async def _stream_with_failover(self, open_stream: Callable[[OllamaEndpoint], AsyncIterator[Dict]]) -> AsyncIterator[Dict]:
+        """Stream chunks from the best available endpoint.
+
+        Fails over to the next endpoint only if nothing has been yielded yet;
+        a stream that breaks midway raises. Latency is measured to the first chunk.
+        """
+        last_error = None
+        for endpoint in self.router.candidates():
+            if not endpoint.circuit_breaker.allow_request():
+                continue
+            endpoint.outstanding += 1
+            started = time.time()
+            first_chunk_latency = None
+            try:
+                async for chunk in open_stream(endpoint):
+                    if first_chunk_latency is None:
+                        first_chunk_latency = time.time() - started
+                    yield chunk
+            except Exception as e:
+                endpoint.record_failure(e)
+                if first_chunk_latency is not None:
+                    raise
+                self._log_api_error(e)
+                last_error = e
+                continue
+            finally:
+                endpoint.outstanding -= 1
+            endpoint.record_success(first_chunk_latency if first_chunk_latency is not None else time.time() - started)
+            return
+        raise NoHealthyEndpointError("No healthy Ollama endpoint available") from last_error
+
+    async def _generate_upstream(self, prompt: str, options: Optional[Dict], queue_wait: float = 0.0,
+                                 model: Optional[str] = None) -> Tuple[str, int]:
+        """Run one non-streaming generation against Ollama, returning (text, token count) and raising on failure"""
+        model = model or self.model
+        stats = GenerationStats(model=model, streamed=False, queue_wait=queue_wait)
+        hedge_after = self.timeouts.percentile(model, 95) if self.hedge_requests else None
+        response_json = await self._call_with_failover(
+            lambda endpoint: self._make_async_api_call(prompt, options, endpoint=endpoint, model=model),
+            hedge_after=hedge_after)
+        stats.duration = time.time() - stats.started_at
+        self.timeouts.record(model, stats.duration, len(prompt))
+        # Without streaming the first token arrives with the full response
+        stats.time_to_first_token = stats.duration
+        stats.token_count = response_json.get("eval_count", 0)
+        stats.update_from_response(response_json)
+        self._record_stats(stats)
+        return response_json.get('response', ''), stats.token_count
+
+    async def _stream_upstream(self, prompt: str, options: Optional[Dict],
+                               queue_wait: float = 0.0) -> AsyncIterator[str]:
+        """Run one streaming generation against Ollama, yielding tokens and raising on failure"""
+        stats = GenerationStats(model=self.model, streamed=True, queue_wait=queue_wait)
+        try:
+            async for chunk in self._stream_with_failover(
+                    lambda endpoint: self._stream_api_call(prompt, options, endpoint=endpoint)):
+                token = chunk.get("response", "")
+                if token:
+                    if stats.time_to_first_token is None:
+                        stats.time_to_first_token = time.time() - stats.started_at
+                        self.timeouts.record(self._first_token_key, stats.time_to_first_token, len(prompt))
+                    stats.token_count += 1
+                    yield token
+                if chunk.get("done"):
+                    stats.update_from_response(chunk)
+                    if chunk.get("eval_count"):
+                        # Prefer the server's exact token count when available
+                        stats.token_count = chunk["eval_count"]
+        finally:
+            stats.duration = time.time() - stats.started_at
+            self._record_stats(stats)
+
+    async def _run_flight(self, flight: "_InFlightRequest", prompt: str, options: Optional[Dict],
+                          model: Optional[str] = None):
+        """Produce a flight's tokens from a single upstream call with circuit breaker protection"""
+        succeeded = False
+        try:
+            if not self.router.has_available():
+                flight.error = "No healthy Ollama endpoint available"
+                await self._publish_fallback(flight, prompt, options, model)
+                return
+
+            try:
+                async with self.scheduler.slot(flight.ticket):
+                    queue_wait = time.time() - flight.ticket.enqueued_at
+                    if flight.streamed:
+                        async for token in self._stream_upstream(prompt, options, queue_wait):
+                            flight.token_count += 1
+                            flight.publish(token)
+                    else:
+                        text, flight.token_count = await self._generate_upstream(prompt, options, queue_wait, model)
+                        flight.publish(text)
+            except NoHealthyEndpointError as e:
+                flight.error = f"{e}: {e.__cause__}" if e.__cause__ else str(e)
+                logger.error(flight.error)
+                await self._fail_flight(flight, prompt, options, model)
+                return
+            except Exception as e:
+                # Endpoint failures are recorded by the failover helpers
+                self._log_api_error(e)
+                flight.error = str(e)
+                await self._fail_flight(flight, prompt, options, model)
+                return
+
+            succeeded = True
+        finally:
+            flight.finish(succeeded)
+
+    def _start_flight(self, key: str, prompt: str, options: Optional[Dict], streamed: bool,
+                      priority: RequestPriority, model: Optional[str] = None) -> "_InFlightRequest":
+        """Join an identical in-flight request, or start a new upstream call"""
+        if self.coalesce:
+            flight = self._inflight.get(key)
+            if flight is not None and flight.joinable:
+                self.coalescing_stats["coalesced_requests"] += 1
+                # Never leave a more urgent caller waiting behind a background request
+                self.scheduler.promote(flight.ticket, priority)
+                return flight
+
+        flight = _InFlightRequest(streamed, self.scheduler.ticket(priority))
+        self.coalescing_stats["upstream_requests"] += 1
+        flight.task = asyncio.ensure_future(self._run_flight(flight, prompt, options, model))
+        if self.coalesce:
+            self._inflight[key] = flight
+            flight.task.add_done_callback(lambda _: self._inflight.pop(key, None)
+                                          if self._inflight.get(key) is flight else None)
+        return flight
+
+    async def _load_model(self, endpoint: OllamaEndpoint, model: str) -> Dict:
+        """Load one model on one endpoint and report how long the load took"""
+        # An empty prompt makes Ollama load the model without generating
+        payload = {"model": model, "prompt": "", "stream": False}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        started = time.time()
+        try:
+            # Blocking transport in a worker thread, so warm-up is safe from any thread or loop
+            response_json = await self._call_endpoint(
+                endpoint, lambda e: asyncio.to_thread(self.transport.post_json_blocking,
+                                                      f"{e.base_url}/api/generate", payload,
+                                                      self.timeouts.max_timeout))
+        except Exception as e:
+            logger.warning(f"Warm-up of {model} on {endpoint.base_url} failed: {e}")
+            return {"model": model, "endpoint": endpoint.base_url, "status": "error", "error": str(e)}
+        # Ollama reports durations in nanoseconds
+        load_duration = response_json.get("load_duration", 0) / 1e9
+        logger.info(f"Warmed up {model} on {endpoint.base_url}: load_duration={load_duration:.2f}s")
+        return {
+            "model": model,
+            "endpoint": endpoint.base_url,
+            "status": "ok",
+            "load_duration": load_duration,
+            "elapsed": time.time() - started
+        }
+
+    async def warm_up(self, models: Optional[List[str]] = None) -> List[Dict]:
+        """Load models on every endpoint concurrently so the first real request is not a cold start"""
+        models = models or [self.model]
+        return list(await asyncio.gather(*(
+            self._load_model(endpoint, model)
+            for endpoint in self.router.endpoints
+            for model in models
+        )))
+
+    async def embed(self, text: str, model: Optional[str] = None, timeout: Optional[float] = None) -> List[float]:
+        """Return the embedding of text from /api/embeddings, raising on failure.
+
+        timeout defaults to the agent's read timeout.
+        """
+        endpoints = self.router.candidates()
+        if not endpoints:
+            raise NoHealthyEndpointError("No healthy Ollama endpoint available")
+        payload = {"model": model or self.embedding_model, "prompt": text}
+        # Not counted against the endpoint's breaker: a missing embedding
+        # model must not take generation offline
+        response_json = await self.transport.post_json(f"{endpoints[0].base_url}/api/embeddings", payload,
+                                                       timeout=timeout or self.timeout)
+        embedding = response_json.get("embedding")
+        if not embedding:
+            raise RuntimeError(f"No embedding returned by {payload['model']}")
+        return embedding
+
+    async def _lookup_cache(self, key: str, prompt: str, options: Optional[Dict], model: Optional[str] = None):
+        """Check the exact cache, then the semantic cache.
+
+        Returns (response, embedding); the embedding is reused when storing
+        the eventual result so the prompt is only embedded once.
+        """
+        cached = await self.cache.get(key)
+        if cached is not None or self.semantic_cache is None:
+            return cached, None
+        try:
+            embedding = await self.embed(prompt)
+        except Exception as e:
+            logger.warning(f"Embedding failed, skipping semantic cache: {e}")
+            return None, None
+        cached = self.semantic_cache.lookup(embedding, make_cache_key(model or self.model, "", options))
+        if cached is not None:
+            # Promote to the exact tier so repeats of this prompt skip embedding
+            await self.cache.put(key, cached)
+        return cached, embedding
+
+    async def _store_flight_result(self, flight: "_InFlightRequest", cache_key: str,
+                                   options: Optional[Dict] = None, embedding: Optional[List[float]] = None,
+                                   model: Optional[str] = None):
+        """Cache a successful flight result once, whichever caller asked for caching first"""
+        if flight.succeeded and not flight.cached:
+            flight.cached = True
+            await self.cache.put(cache_key, flight.text)
+            if self.semantic_cache is not None and embedding is not None:
+                self.semantic_cache.put(embedding, make_cache_key(model or self.model, "", options), flight.text)
+
+    async def generate_response(self, prompt: str, use_cache: bool = False,
+                                options: Optional[Dict] = None,
+                                priority: RequestPriority = RequestPriority.BACKGROUND) -> str:
+        """Generate response using Ollama API with circuit breaker protection
+
+        Set use_cache for prompts whose answer may be reused; leave it off
+        where fresh sampling matters. options are passed through to Ollama.
+        Concurrent identical requests share a single upstream call. Requests
+        wait for a scheduler slot; pass RequestPriority.INTERACTIVE for
+        prompts a user is waiting on.
+        """
+        return (await self.generate(prompt, use_cache, options, priority)).text
+
+    async def generate(self, prompt: str, use_cache: bool = False, options: Optional[Dict] = None,
+                       priority: RequestPriority = RequestPriority.BACKGROUND,
+                       model: Optional[str] = None) -> GenerationResult:
+        """Like generate_response, but report whether the text is a real answer or the fallback.
+
+        model overrides the agent's model for this request.
+        """
+        started = time.time()
+        model = model or self.model
+        key = make_cache_key(model, prompt, options)
+        embedding = None
+        if use_cache:
+            cached, embedding = await self._lookup_cache(key, prompt, options, model)
+            if cached is not None:
+                return GenerationResult(text=cached, cached=True, duration=time.time() - started, model=model)
+
+        flight = self._start_flight(key, prompt, options, streamed=False, priority=priority, model=model)
+        response = await flight.result()
+        if use_cache:
+            await self._store_flight_result(flight, key, options, embedding, model)
+        return GenerationResult(
+            text=response,
+            model=model,
+            ok=flight.succeeded,
+            stale=flight.stale,
+            token_count=flight.token_count,
+            duration=time.time() - started,
+            error=flight.error
         )
-        response.raise_for_status()
-        return response.json()
+
+    def _judge_small_answer(self, text: str) -> Tuple[str, Optional[int], Optional[str]]:
+        """Split off the self-reported confidence and decide whether the answer needs escalation.
+
+        Returns (answer, confidence, reason); reason is None when the answer is accepted.
+        """
+        matches = list(CONFIDENCE_PATTERN.finditer(text))
+        confidence = min(100, int(matches[-1].group(1))) if matches else None
+        answer = CONFIDENCE_PATTERN.sub("", text).strip()
+
+        if len(answer) < 2:
+            return answer, confidence, "empty answer"
+        lowered = answer.lower()
+        for phrase in UNCERTAIN_PHRASES:
+            if phrase in lowered:
+                return answer, confidence, f"uncertain ('{phrase}')"
+        if confidence is not None and confidence < self.cascade_min_confidence:
+            return answer, confidence, f"confidence {confidence} < {self.cascade_min_confidence}"
+        return answer, confidence, None
+
+    def _record_cascade(self, result: GenerationResult, path: str, started: float,
+                        confidence: Optional[int] = None, reason: Optional[str] = None) -> GenerationResult:
+        """Tag a cascade result with its path and track the latency saved versus the large model"""
+        elapsed = time.time() - started
+        large_histogram = self.timeouts.histograms.get(self.model)
+        expected_large = large_histogram.mean if large_histogram else None
+        if path == "small":
+            # Only measurable once the large model has latency history
+            saved = expected_large - elapsed if expected_large is not None else 0.0
+        elif path == "escalated":
+            saved = result.duration - elapsed  # Time lost on the small model first
+        else:
+            saved = 0.0
+
+        result.cascade_path = path
+        result.duration = elapsed
+        self.cascade_stats[path] += 1
+        self.cascade_stats["latency_saved"] += saved
+        self.cascade_history.append({
+            "path": path,
+            "model": result.model,
+            "confidence": confidence,
+            "reason": reason,
+            "duration": elapsed,
+            "latency_saved": saved
+        })
+        logger.info(f"Cascade: path={path} model={result.model} confidence={confidence} "
+                    f"reason={reason} duration={elapsed:.2f}s saved={saved:.2f}s")
+        return result
+
+    async def generate_cascade(self, prompt: str, use_cache: bool = False, options: Optional[Dict] = None,
+                               priority: RequestPriority = RequestPriority.BACKGROUND) -> GenerationResult:
+        """Answer with the small cascade model, escalating to the main model when the answer looks weak.
+
+        An answer is escalated when it is empty, hedges, or the small model's
+        self-reported confidence is below cascade_min_confidence. Prompts
+        longer than cascade_max_prompt_chars go straight to the main model.
+        Without a cascade_model this is the same as generate().
+        """
+        if not self.cascade_model:
+            return await self.generate(prompt, use_cache, options, priority)
+
+        started = time.time()
+        if len(prompt) > self.cascade_max_prompt_chars:
+            result = await self.generate(prompt, use_cache, options, priority)
+            return self._record_cascade(result, "direct", started, reason="long prompt")
+
+        small = await self.generate(prompt + CONFIDENCE_INSTRUCTION, use_cache, options, priority,
+                                    model=self.cascade_model)
+        confidence = None
+        if small.ok:
+            answer, confidence, reason = self._judge_small_answer(small.text)
+            if reason is None:
+                small.text = answer
+                return self._record_cascade(small, "small", started, confidence)
+        else:
+            reason = "small model failed"
+
+        large = await self.generate(prompt, use_cache, options, priority)
+        return self._record_cascade(large, "escalated", started, confidence, reason)
+
+    async def generate_many_as_completed(self, prompts: List[str], concurrency: Optional[int] = None,
+                                         use_cache: bool = False, options: Optional[Dict] = None,
+                                         priority: RequestPriority = RequestPriority.BATCH
+                                         ) -> AsyncIterator[Tuple[int, GenerationResult]]:
+        """Generate independent prompts in parallel, yielding (index, result) as each finishes.
+
+        All prompts share the agent's scheduler limit; concurrency additionally
+        caps how many of this batch are queued at once. A failed prompt yields
+        a result with ok=False instead of stopping the batch.
+        """
+        limit = asyncio.Semaphore(concurrency or len(prompts) or 1)
+
+        async def run(index: int, prompt: str) -> Tuple[int, GenerationResult]:
+            async with limit:
+                try:
+                    return index, await self.generate(prompt, use_cache, options, priority)
+                except Exception as e:
+                    logger.error(f"Batch prompt {index} failed: {e}")
+                    return index, GenerationResult(text="", ok=False, error=str(e))
+
+        tasks = [asyncio.ensure_future(run(i, prompt)) for i, prompt in enumerate(prompts)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def generate_many(self, prompts: List[str], concurrency: Optional[int] = None,
+                            use_cache: bool = False, options: Optional[Dict] = None,
+                            priority: RequestPriority = RequestPriority.BATCH) -> BatchResult:
+        """Generate independent prompts in parallel and return their results in prompt order"""
+        started = time.time()
+        results: List[Optional[GenerationResult]] = [None] * len(prompts)
+        async for index, result in self.generate_many_as_completed(prompts, concurrency, use_cache,
+                                                                   options, priority):
+            results[index] = result
+        batch = BatchResult(results=results, duration=time.time() - started)
+        tps = batch.tokens_per_sec
+        logger.info(f"Batch finished: {batch.succeeded}/{len(prompts)} succeeded in {batch.duration:.2f}s, "
+                    f"tokens/sec={tps if tps is not None else 0:.1f}")
+        return batch
+
+    async def stream_response(self, prompt: str, use_cache: bool = False,
+                              options: Optional[Dict] = None,
+                              priority: RequestPriority = RequestPriority.BACKGROUND) -> AsyncIterator[str]:
+        """Stream response tokens from the Ollama API as they are generated.
+
+        Yields text fragments in order. If the call fails before the first
+        token, the circuit breaker fallback text is yielded instead. If it
+        fails midway, TRUNCATION_MARKER is yielded after the partial answer
+        and StreamInterruptedError is raised. A cache hit is yielded as a
+        single fragment. A caller joining an identical stream already in
+        flight first receives the tokens generated so far.
+        """
+        key = make_cache_key(self.model, prompt, options)
+        embedding = None
+        if use_cache:
+            cached, embedding = await self._lookup_cache(key, prompt, options)
+            if cached is not None:
+                yield cached
+                return
+
+        flight = self._start_flight(key, prompt, options, streamed=True, priority=priority)
+        async for token in flight.subscribe():
+            yield token
+        if flight.truncated:
+            raise StreamInterruptedError(f"Response truncated: {flight.error}")
+        if use_cache:
+            await self._store_flight_result(flight, key, options, embedding)
+
+    async def _chat_stream_api_call(self, messages: List[Dict], options: Optional[Dict] = None,
+                                    endpoint: Optional[OllamaEndpoint] = None) -> AsyncIterator[Dict]:
+        """Make a streaming /api/chat call, yielding each decoded JSON chunk"""
+        base_url = endpoint.base_url if endpoint else self.base_url
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": True
+        }
+        if options:
+            payload["options"] = options
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        prompt_size = sum(len(message.get("content", "")) for message in messages)
+        timeout = self.timeouts.timeout_for(self._first_token_key, prompt_size)
+        async for chunk in self.transport.stream_json(f"{base_url}/api/chat", payload, timeout=timeout):
+            if chunk.get("error"):
+                raise RuntimeError(chunk["error"])
+            yield chunk
+            if chunk.get("done"):
+                break
+
+    def create_session(self, session_id: Optional[str] = None, system_prompt: Optional[str] = None) -> str:
+        """Start a chat session and return its id"""
+        return self.sessions.create(session_id, system_prompt).session_id
+
+    def end_session(self, session_id: str) -> bool:
+        """Forget a chat session"""
+        return self.sessions.remove(session_id)
+
+    async def stream_chat(self, session_id: str, message: str, options: Optional[Dict] = None,
+                          priority: RequestPriority = RequestPriority.BACKGROUND) -> AsyncIterator[str]:
+        """Send one user turn in a chat session and stream the reply.
+
+        Unknown session ids are created on first use. Turns within a session
+        are serialized; the turn is only added to the history if the reply
+        completes, so a failed call can simply be retried.
+        """
+        session = self.sessions.get_or_create(session_id)
+        async with session.lock:
+            if not self.router.has_available():
+                yield (await self._fallback_text(message, options))[0]
+                return
+
+            user_message = {"role": "user", "content": message}
+            stats = GenerationStats(model=self.model, streamed=True)
+            reply = []
+            failure = None
+            try:
+                messages = session.messages + [user_message]
+                async with self.scheduler.slot(self.scheduler.ticket(priority)):
+                    # Time the generation from admission, as for other requests
+                    stats.queue_wait = time.time() - stats.started_at
+                    stats.started_at = time.time()
+                    async for chunk in self._stream_with_failover(
+                            lambda endpoint: self._chat_stream_api_call(messages, options, endpoint=endpoint)):
+                        token = chunk.get("message", {}).get("content", "")
+                        if token:
+                            if stats.time_to_first_token is None:
+                                stats.time_to_first_token = time.time() - stats.started_at
+                                prompt_size = sum(len(m.get("content", "")) for m in messages)
+                                self.timeouts.record(self._first_token_key, stats.time_to_first_token, prompt_size)
+                            stats.token_count += 1
+                            reply.append(token)
+                            yield token
+                        if chunk.get("done"):
+                            stats.update_from_response(chunk)
+                            stats.token_count = chunk.get("eval_count", stats.token_count)
+                            session.last_prompt_eval_count = chunk.get("prompt_eval_count", 0)
+            except Exception as e:
+                failure = e
+            finally:
+                stats.duration = time.time() - stats.started_at
+                self._record_stats(stats)
+
+            if failure is not None:
+                self._log_api_error(failure)
+                if reply:
+                    # Part of the reply already went out; do not append fallback text to it
+                    yield TRUNCATION_MARKER
+                    raise StreamInterruptedError(f"Response truncated: {failure}")
+                yield (await self._fallback_text(message, options))[0]
+                return
+
+            self.sessions.record_turn(session, user_message, "".join(reply))
+
+    async def chat(self, session_id: str, message: str, options: Optional[Dict] = None,
+                   priority: RequestPriority = RequestPriority.BACKGROUND) -> str:
+        """Send one user turn in a chat session and return the full reply"""
+        return "".join([token async for token in self.stream_chat(session_id, message, options, priority)])
+
+    def get_generation_stats(self) -> Dict:
+        """Summarize recent per-request latency stats"""
+        history = list(self.generation_stats)
+        if not history:
+            return {"requests": 0}
+
+        ttfts = [s.time_to_first_token for s in history if s.time_to_first_token is not None]
+        rates = [s.tokens_per_sec for s in history if s.tokens_per_sec is not None]
+        return {
+            "requests": len(history),
+            "avg_time_to_first_token": sum(ttfts) / len(ttfts) if ttfts else None,
+            "avg_tokens_per_sec": sum(rates) / len(rates) if rates else None,
+            "last": history[-1].to_dict()
+        }
+
+    def get_metrics(self) -> Dict:
+        """Collect all LLM client metrics for status reporting"""
+        return {
+            "generation": self.get_generation_stats(),
+            "cache": self.cache.get_stats(),
+            "semantic_cache": self.semantic_cache.get_stats() if self.semantic_cache else None,
+            "coalescing": dict(self.coalescing_stats, in_flight=len(self._inflight)),
+            "scheduler": self.scheduler.get_stats(),
+            "sessions": self.sessions.get_stats(),
+            "endpoints": [endpoint.to_dict() for endpoint in self.router.endpoints],
+            "server_timings": {model: aggregate.to_dict() for model, aggregate in self.server_timings.items()},
+            "latency": self.timeouts.get_stats(),
+            "hedging": dict(self.hedging_stats),
+            "cascade": dict(self.cascade_stats, model=self.cascade_model),
+            "degraded": dict(self.degraded_stats)
+        }
+
+    def _get_model_info_call(self) -> Dict:
+        """Make a blocking API call to get model info (for synchronous callers)"""
+        return self.transport.get_json_blocking(f"{self.base_url}/api/show/{self.model}",
+                                                timeout=self.timeouts.timeout_for(self._model_info_key))
 
     def _model_info_fallback(self) -> Dict:
         """Fallback when circuit breaker is open for model info"""
@@ -81,9 +1672,22 @@ class OllamaAgent:
 
     async def get_model_info(self) -> Dict:
         """Get information about the current model with circuit breaker protection"""
+        if not self.router.has_available():
+            return self._model_info_fallback()
+        timeout = self.timeouts.timeout_for(self._model_info_key)
+        started = time.time()
         try:
-            # Use circuit breaker to protect against API failures
-            return self.circuit_breaker.execute(self._get_model_info_call)
+            info = await self._call_with_failover(
+                lambda endpoint: self.transport.get_json(f"{endpoint.base_url}/api/show/{self.model}",
+                                                         timeout=timeout))
+            self.timeouts.record(self._model_info_key, time.time() - started)
+            return info
         except Exception as e:
             logger.error(f"Failed to get model info: {e}")
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
+
+    async def close(self):
+        """Release pooled HTTP connections and persist the semantic cache"""
+        if self.semantic_cache is not None:
+            self.semantic_cache.flush()
+        await self.transport.close()
@@ -7,10 +7,11 @@ import threading
 import time
 import logging.handlers  # ✅ This stays because it's a submodule
 import os
-import random
 from collections import defaultdict
 from typing import Dict, List, Optional
 
+from core.directive_queue import DirectiveQueue
+
 
 
 class PerpetualLLM:
@@ -30,41 +31,24 @@ class PerpetualLLM:
             "execution_time": 0.0,
             "variant_performance": {"aggressive": 0, "passive": 0, "dangerous": 0},
         }
-        self.priority_layers = {
-            "Critical": [],
-            "High": [],
-            "Moderate": [],
-            "Peripheral": [],
-        }
         self.priority_weights = {
             "Critical": 0.5,
             "High": 0.3,
             "Moderate": 0.15,
             "Peripheral": 0.05,
         }
+        self.priority_layers = DirectiveQueue(self.priority_weights)
         self.lock = threading.Lock()
 
     def execute_directive(self):
         """Executes directives based on weighted priority."""
-        while any(self.priority_layers.values()):  # Only run if directives exist
+        while self.priority_layers:  # Only run if directives exist
             start_time = time.time()
-            total_weight = sum(self.priority_weights.values())
-            rand_choice = random.uniform(0, total_weight)
-            cumulative_weight = 0
-
-            # Determine which priority layer to execute based on weights
-            selected_priority = None
-            for priority, weight in self.priority_weights.items():
-                cumulative_weight += weight
-                if rand_choice <= cumulative_weight:
-                    selected_priority = priority
-                    break
-
-            with self.lock:
-                if self.priority_layers[selected_priority]:
-                    directive = self.priority_layers[selected_priority].pop(0)
-                else:
-                    directive = None
+            # Weighted choice among non-empty priority layers
+            selected = self.priority_layers.get()
+            if selected is None:
+                break
+            selected_priority, directive = selected
 
             if directive:
                 logging.info(
@@ -146,6 +130,7 @@ class PerpetualLLM:
                     self.priority_weights[layer] = max(
                         0.01, self.priority_weights[layer] + adjustment
                     )
+            self.priority_layers.set_weights(self.priority_weights)
         logging.info(f"Adjusted weights: {self.priority_weights}")
 
     def simulate_variants(self, aggressive, passive, dangerous):
@@ -157,21 +142,17 @@ class PerpetualLLM:
 
     def redundancy_check(self):
         """Adds a fallback mechanism to handle empty priority layers."""
-        with self.lock:
-            for priority, directives in self.priority_layers.items():
-                if not directives:
-                    logging.warning(f"Fallback activated for empty {priority} layer.")
+        for priority, size in self.priority_layers.sizes().items():
+            if not size:
+                logging.warning(f"Fallback activated for empty {priority} layer.")
 
     def get_prioritized_directives(self):
         """Return prioritized directives from available priority layers as a list of directive dicts."""
         logging.info("Fetching prioritized directives.")
-        directives = []
-        with self.lock:
-            for priority in ["Critical", "High", "Moderate", "Peripheral"]:
-                while self.priority_layers.get(priority):
-                    directive = self.priority_layers[priority].pop(0)
-                    directives.append({"code": directive, "priority": priority})
-        return directives
+        return [
+            {"code": directive, "priority": priority}
+            for priority, directive in self.priority_layers.drain()
+        ]
 
     def process_execution_result(self, directive, result):
         """Process the result of executing a directive; if not successful, requeue directive."""
@@ -180,10 +161,9 @@ class PerpetualLLM:
         )
         if not result.get("success"):
             logging.warning("Directive execution failed, requeuing directive.")
-            with self.lock:
-                self.priority_layers[directive.get("priority")].insert(
-                    0, directive.get("code")
-                )
+            self.priority_layers.put_front(
+                directive.get("code"), directive.get("priority")
+            )
 
     def create_snapshot(self):
         """Creates a snapshot for rollback in case of critical errors."""
@@ -196,17 +176,11 @@ class AggressiveLLM(PerpetualLLM):
 
     def execute_directive(self):
         """Executes directives aggressively, prioritizing Critical tasks."""
-        while any(
-            self.priority_layers.values()
-        ):  # ✅ Stops when there are no directives
+        while self.priority_layers:  # ✅ Stops when there are no directives
             start_time = time.time()
             selected_priority = "Critical"
 
-            with self.lock:
-                if self.priority_layers[selected_priority]:
-                    directive = self.priority_layers[selected_priority].pop(0)
-                else:
-                    directive = None
+            directive = self.priority_layers.get_from(selected_priority)
 
             if directive:
                 logging.info(
@@ -232,11 +206,7 @@ class PassiveLLM(PerpetualLLM):
             start_time = time.time()
             selected_priority = "Peripheral"
 
-            with self.lock:
-                if self.priority_layers[selected_priority]:
-                    directive = self.priority_layers[selected_priority].pop(0)
-                else:
-                    directive = None
+            directive = self.priority_layers.get_from(selected_priority)
 
             if directive:
                 logging.info(
@@ -257,22 +227,9 @@ class DangerousLLM(PerpetualLLM):
         """Executes directives dangerously, prioritizing random high-weighted tasks."""
         while True:
             start_time = time.time()
-            total_weight = sum(self.priority_weights.values())
-            rand_choice = random.uniform(0, total_weight)
-            cumulative_weight = 0
-
-            selected_priority = None
-            for priority, weight in self.priority_weights.items():
-                cumulative_weight += weight
-                if rand_choice <= cumulative_weight:
-                    selected_priority = priority
-                    break
+            selected_priority = self.priority_layers.sample_priority()
 
-            with self.lock:
-                if self.priority_layers[selected_priority]:
-                    directive = self.priority_layers[selected_priority].pop(0)
-                else:
-                    directive = None
+            directive = self.priority_layers.get_from(selected_priority)
 
             if directive:
                 logging.info(
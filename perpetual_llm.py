@@ -1,23 +1,34 @@
 import logging
 import time
 import os
+import sys
 import io
 import contextlib
 import multiprocessing
-from typing import Dict, Union, List, Tuple, Any, Optional
-from threading import Event, Lock
+from typing import Dict, Union, List, Tuple, Any, Optional, Callable
+from threading import Event, Lock, Thread
 from datetime import datetime
-import hashlib
 import asyncio
+import argparse
 import yaml
 from dataclasses import dataclass
+from collections import deque
 from resilience.circuit_breaker import CircuitBreaker
+from core.directive_queue import DirectiveQueue
+from monitoring.sliding_window import SlidingWindowCounter
+from monitoring.latency_histogram import LatencyRecorder
 
 from rsi_module import RSIModule
-from ollama_agent import OllamaAgent
+from ollama_agent import OllamaAgent, RequestPriority
+from chunked_analysis import ChunkedAnalyzer
 from memory_manager import MemoryManager
 from sandbox_executor import SandboxExecutor
 from hitl_interface import HITLInterface
+from agent_server import AgentServer
+from batch_runner import BatchRunner, BatchSummary, format_summary
+from shell_jobs import ShellJob, ShellJobManager
+from file_integrity import FileIntegrityChecker
+from command_cache import CommandCache
 
 logger = logging.getLogger(__name__)
 
@@ -169,33 +180,178 @@ class CommandValidator:
             sandbox_enabled=sandbox_enabled
         )
 
+@dataclass
+class CommandRecord:
+    """Metadata about one processed input (the text itself is not kept)"""
+    timestamp: float
+    kind: str  # "command" for !commands, "prompt" for free text
+    name: str  # Command name, empty for prompts
+    length: int
+    latency: float
+    ok: bool
+
 class SystemMonitor:
-    """Monitors system health and performance"""
-    def __init__(self):
+    """Monitors system health and performance in constant memory.
+
+    Keeps the last history_size command records in a ring buffer, lifetime
+    counters, and error rates over trailing 1 minute, 5 minute and 1 hour
+    windows. Health is judged on the 5 minute window, so old errors age out.
+    Latency histograms are kept per input category (command or prompt) and
+    per command handler, over the lifetime and the same windows.
+    """
+    WINDOWS = {"1m": 60, "5m": 300, "1h": 3600}
+    HEALTH_WINDOW = "5m"
+
+    def __init__(self, history_size: int = 1000, error_threshold: float = 0.1):
         self.start_time = datetime.now()
-        self.command_history = []
+        self.command_history: deque = deque(maxlen=history_size)
+        self.commands_processed = 0
         self.error_count = 0
+        self.total_latency = 0.0
+        self.error_threshold = error_threshold
+        self.windows = {name: SlidingWindowCounter(seconds) for name, seconds in self.WINDOWS.items()}
+        self.category_latency = LatencyRecorder(self.WINDOWS)
+        self.handler_latency = LatencyRecorder(self.WINDOWS)
         self.last_health_check = None
 
+    def record_command(self, user_input: str, latency: float, ok: bool):
+        now = time.time()
+        is_command = user_input.startswith("!")
+        words = user_input[1:].split() if is_command else []
+        name = words[0].lower() if words else ""
+        self.command_history.append(CommandRecord(
+            timestamp=now,
+            kind="command" if is_command else "prompt",
+            name=name,
+            length=len(user_input),
+            latency=latency,
+            ok=ok
+        ))
+        self.commands_processed += 1
+        self.total_latency += latency
+        if not ok:
+            self.error_count += 1
+        for window in self.windows.values():
+            window.add(error=not ok, now=now)
+        self.category_latency.record("command" if is_command else "prompt", latency, now)
+
+    def record_handler(self, name: str, latency: float):
+        self.handler_latency.record(name, latency)
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.commands_processed if self.commands_processed else 0.0
+
+    def latency_report(self) -> Dict[str, Dict]:
+        """p50/p90/p99/max per category and per handler, lifetime and windowed"""
+        now = time.time()
+        return {
+            "categories": self.category_latency.to_dict(now),
+            "handlers": self.handler_latency.to_dict(now)
+        }
+
+    def error_rates(self) -> Dict[str, float]:
+        now = time.time()
+        return {name: window.error_rate(now) for name, window in self.windows.items()}
+
     def health_check(self) -> Dict[str, Union[str, int, float]]:
         """Perform system health check"""
         uptime = (datetime.now() - self.start_time).total_seconds()
-        error_rate = self.error_count / len(self.command_history) if self.command_history else 0
+        error_rates = self.error_rates()
+        error_rate = error_rates[self.HEALTH_WINDOW]
 
         self.last_health_check = datetime.now()
 
         return {
-            "status": "healthy" if error_rate < 0.1 else "degraded",
+            "status": "healthy" if error_rate < self.error_threshold else "degraded",
             "uptime": uptime,
             "error_rate": error_rate,
-            "commands_processed": len(self.command_history),
+            "error_rates": error_rates,
+            "lifetime_error_rate": self.error_count / self.commands_processed if self.commands_processed else 0,
+            "commands_processed": self.commands_processed,
             "last_check": self.last_health_check.isoformat()
         }
 
+async def async_input(prompt: str = "") -> str:
+    """Read a line from stdin without blocking the event loop.
+
+    Reads in a daemon thread rather than the default executor, so a pending
+    read never holds up interpreter shutdown.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def deliver(setter, value):
+        if not future.done():
+            setter(value)
+
+    def read():
+        try:
+            line = input(prompt)
+        except Exception as e:  # EOFError when stdin closes
+            callback = (deliver, future.set_exception, e)
+        else:
+            callback = (deliver, future.set_result, line)
+        try:
+            loop.call_soon_threadsafe(*callback)
+        except RuntimeError:
+            pass  # Loop already closed
+
+    Thread(target=read, name="stdin-reader", daemon=True).start()
+    return await future
+
+class LazyComponent:
+    """Agent attribute built by the owner's _build_<name>() on first access.
+
+    Construction is thread-safe and timed; assigning the attribute replaces
+    the component without building it.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return instance._component(self.name)
+
+    def __set__(self, instance, value):
+        instance._components[self.name] = value
+
 class PerpetualLLM:
+    # Heavy subsystems are only constructed when first used (or pre-warmed)
+    sandbox = LazyComponent()
+    hitl = LazyComponent()
+    rsi_module = LazyComponent()
+    ollama = LazyComponent()
+    analyzer = LazyComponent()
+
+    CRITICAL_FILES = [
+        "perpetual_llm.py",
+        "rsi_module.py",
+        "sandbox_executor.py",
+        "hitl_interface.py",
+        "ollama_agent.py"
+    ]
+
+    # Read-mostly commands served from command_cache, and the events that make them stale.
+    # "<command> <action>" entries only cache that action.
+    CACHED_COMMANDS = {
+        "status": ("error", "config_reload"),
+        "help": ("config_reload",),
+        "analyze health": ("error", "config_reload"),
+        "consider_self": ("file_change", "error", "config_reload")
+    }
+
     def __init__(self, config_path: str, memory_manager: MemoryManager, model: str = "llama2"):
         """Initialize the Perpetual LLM agent"""
+        init_start = time.perf_counter()
         self.config_path = config_path
+        self.default_model = model
+        self.startup_timings: Dict[str, float] = {}
+        self.component_errors: Dict[str, str] = {}
+        self._components: Dict[str, Any] = {}
+        self._component_locks = {name: Lock() for name in ("sandbox", "hitl", "rsi_module", "ollama", "analyzer")}
 
         # Verify config file exists
         if not os.path.exists(config_path):
@@ -207,10 +363,15 @@ class PerpetualLLM:
         # Load config
         with open(config_path) as f:
             self.config = yaml.safe_load(f)
+        self.startup_timings["config"] = time.perf_counter() - init_start
 
         # Initialize security and monitoring
         self.validator = CommandValidator(self.config)
-        self.monitor = SystemMonitor()
+        monitor_config = self.config.get("monitor", {})
+        self.monitor = SystemMonitor(
+            history_size=monitor_config.get("history_size", 1000),
+            error_threshold=self.config.get("error_threshold", 0.1)
+        )
 
         # Initialize circuit breakers for critical operations
         self.file_io_circuit_breaker = CircuitBreaker(
@@ -221,27 +382,56 @@ class PerpetualLLM:
 
         # Initialize components with enhanced security
         self.memory_manager = memory_manager
-        self.sandbox = SandboxExecutor(self.config)
-        self.hitl = HITLInterface(self.config)
+        self.integrity_checker = FileIntegrityChecker(
+            memory_manager,
+            max_workers=self.config.get("integrity", {}).get("max_workers", 4),
+            read_guard=self.file_io_circuit_breaker
+        )
+        self.last_integrity_results = {}
+        self._file_fingerprint = None
         self.code_interpreter = CodeInterpreter(timeout=self.config.get("security", {}).get("sandbox", {}).get("timeout", 10))
 
-        # Initialize RSI module with security context
-        self.rsi_module = RSIModule(
-            config_file=config_path,
-            memory_manager_instance=memory_manager,
-            sandbox_executor=self.sandbox
+        # Short-lived results of read-mostly commands (!status, !help, ...) for frequent polling;
+        # created before any thread that may build components (and invalidate it)
+        self.command_cache = CommandCache(
+            ttl=self.config.get("command_cache", {}).get("ttl", 2.0),
+            max_entries=self.config.get("command_cache", {}).get("max_entries", 128)
         )
 
-        # Initialize Ollama agent with circuit breaker
-        self.ollama = OllamaAgent(
-            model=self.config.get("llm", {}).get("model", model),
-            base_url=self.config.get("llm", {}).get("api", {}).get("base_url", "http://localhost:11434"),
-            failure_threshold=3,
-            recovery_timeout=60
+        # While the LLM is down, status questions are answered from the last diagnostic report
+        self.last_diagnostic_report: Optional[str] = None
+
+        # Load the model(s) in the background while the remaining components start;
+        # this also constructs the LLM client off the startup path
+        self.warmup_report: List[Dict] = []
+        self._warmup_thread = None
+        llm_warmup_config = self.config.get("llm", {}).get("warmup", {})
+        if llm_warmup_config.get("enabled", True):
+            self._warmup_thread = Thread(
+                target=self._warm_up_models,
+                args=(llm_warmup_config.get("models"),),
+                name="llm-warmup",
+                daemon=True
+            )
+            self._warmup_thread.start()
+
+        # Print LLM tokens in the REPL as they are generated
+        self.stream_output = self.config.get("llm", {}).get("stream", True)
+
+        # Local '!' shell commands run as async subprocesses; long ones can go to the background
+        shell_config = self.config.get("shell", {})
+        self.shell_jobs = ShellJobManager(
+            timeout=shell_config.get("timeout", 300),
+            max_output_bytes=shell_config.get("max_output_bytes", 1024 * 1024)
         )
 
+        # Optionally keep REPL free text in one chat session for conversational continuity
+        llm_sessions_config = self.config.get("llm", {}).get("sessions", {})
+        self.repl_session_id = "repl" if llm_sessions_config.get("repl", False) else None
+
         # Control flags and locks
         self.running = False
+        self._background_tasks = set()
         self.shutdown_event = Event()
         self.command_lock = Lock()
 
@@ -252,20 +442,14 @@ class PerpetualLLM:
             "error_rate": 0.0
         }
 
-        # Priority layers and weights for directive execution
-        self.priority_layers = {
-            "Critical": [],
-            "High": [],
-            "Moderate": [],
-            "Peripheral": []
-        }
-
+        # Priority weights and layered directive queue for directive execution
         self.priority_weights = {
             "Critical": 0.5,
             "High": 0.3,
             "Moderate": 0.15,
             "Peripheral": 0.05
         }
+        self.priority_layers = DirectiveQueue(self.priority_weights)
 
         # Variant performance tracking
         self.variant_performance = {
@@ -274,6 +458,195 @@ class PerpetualLLM:
             "dangerous": 0
         }
 
+        self.startup_timings["init"] = time.perf_counter() - init_start
+        self.prewarm(self.config.get("startup", {}).get("prewarm", []))
+
+    def _component(self, name: str):
+        """Return a lazily built component, constructing it on first use"""
+        component = self._components.get(name)
+        if component is not None:
+            return component
+        with self._component_locks[name]:
+            component = self._components.get(name)
+            if component is None:
+                start = time.perf_counter()
+                try:
+                    component = getattr(self, f"_build_{name}")()
+                except Exception as e:
+                    self.component_errors[name] = str(e)
+                    self.command_cache.invalidate("error")
+                    logger.error(f"Failed to initialize {name}: {e}")
+                    raise
+                self.startup_timings[name] = time.perf_counter() - start
+                self.component_errors.pop(name, None)
+                self._components[name] = component
+                logger.info(f"Initialized {name} in {self.startup_timings[name]:.3f}s")
+        return component
+
+    def is_initialized(self, name: str) -> bool:
+        """Whether a lazy component has been built (never builds it)"""
+        return name in self._components
+
+    def prewarm(self, names: List[str]) -> Optional[Thread]:
+        """Build the named components in a background thread; failures are only logged"""
+        names = [name for name in names if name in self._component_locks and not self.is_initialized(name)]
+        if not names:
+            return None
+
+        def build_all():
+            for name in names:
+                try:
+                    self._component(name)
+                except Exception:
+                    pass  # Logged by _component; retried on first real use
+
+        thread = Thread(target=build_all, name="component-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def startup_report(self) -> Dict:
+        """Startup timing breakdown in seconds, plus components not built yet"""
+        return {
+            "timings": dict(self.startup_timings),
+            "pending": [name for name in self._component_locks if not self.is_initialized(name)],
+            "errors": dict(self.component_errors)
+        }
+
+    def _build_sandbox(self) -> SandboxExecutor:
+        return SandboxExecutor(self.config)
+
+    def _build_hitl(self) -> HITLInterface:
+        return HITLInterface(self.config)
+
+    def _build_rsi_module(self) -> RSIModule:
+        # Initialize RSI module with security context; it still runs without a sandbox
+        try:
+            sandbox = self.sandbox
+        except Exception as e:
+            logger.warning(f"RSI module starting without sandbox: {e}")
+            sandbox = None
+        return RSIModule(
+            config_file=self.config_path,
+            memory_manager_instance=self.memory_manager,
+            sandbox_executor=sandbox
+        )
+
+    def _build_ollama(self) -> OllamaAgent:
+        # Initialize Ollama agent with circuit breaker and pooled async transport
+        llm_api_config = self.config.get("llm", {}).get("api", {})
+        llm_cache_config = self.config.get("llm", {}).get("cache", {})
+        llm_scheduler_config = self.config.get("llm", {}).get("scheduler", {})
+        llm_sessions_config = self.config.get("llm", {}).get("sessions", {})
+        llm_timeout_config = llm_api_config.get("adaptive_timeout", {})
+        llm_semantic_config = llm_cache_config.get("semantic", {})
+        llm_cascade_config = self.config.get("llm", {}).get("cascade", {})
+        ollama = OllamaAgent(
+            model=self.config.get("llm", {}).get("model", self.default_model),
+            base_url=llm_api_config.get("base_url", "http://localhost:11434"),
+            endpoints=llm_api_config.get("endpoints") or None,
+            adaptive_timeout=llm_timeout_config.get("enabled", True),
+            timeout_factor=llm_timeout_config.get("factor", 3.0),
+            min_timeout=llm_timeout_config.get("min_timeout", 5.0),
+            max_timeout=llm_timeout_config.get("max_timeout", 300.0),
+            hedge_requests=llm_api_config.get("hedge_requests", False),
+            embedding_model=self.config.get("llm", {}).get("embedding_model", "nomic-embed-text"),
+            semantic_cache=llm_semantic_config.get("enabled", False),
+            semantic_threshold=llm_semantic_config.get("threshold", 0.95),
+            semantic_max_entries=llm_semantic_config.get("max_entries", 1024),
+            semantic_cache_path=llm_semantic_config.get("path"),
+            failure_threshold=3,
+            recovery_timeout=60,
+            timeout=llm_api_config.get("timeout", 30),
+            connect_timeout=llm_api_config.get("connect_timeout", 5),
+            pool_size=llm_api_config.get("pool_size", 10),
+            use_async_transport=llm_api_config.get("async_transport", True),
+            memory_manager=self.memory_manager if llm_cache_config.get("persistent", True) else None,
+            cache_max_entries=llm_cache_config.get("max_entries", 256),
+            cache_ttl=llm_cache_config.get("ttl", 3600),
+            coalesce_requests=self.config.get("llm", {}).get("coalesce_requests", True),
+            max_concurrency=llm_scheduler_config.get("max_concurrency", 2),
+            aging_interval=llm_scheduler_config.get("aging_interval", 10.0),
+            max_sessions=llm_sessions_config.get("max_sessions", 32),
+            session_idle_timeout=llm_sessions_config.get("idle_timeout", 1800),
+            session_max_messages=llm_sessions_config.get("max_messages", 40),
+            keep_alive=self.config.get("llm", {}).get("keep_alive"),
+            cascade_model=llm_cascade_config.get("small_model") if llm_cascade_config.get("enabled", False) else None,
+            cascade_min_confidence=llm_cascade_config.get("min_confidence", 70),
+            cascade_max_prompt_chars=llm_cascade_config.get("max_prompt_chars", 4000)
+        )
+        ollama.add_degraded_source(self._diagnostics_answer)
+        return ollama
+
+    def _build_analyzer(self) -> ChunkedAnalyzer:
+        # Map-reduce analysis for command output too large for one prompt
+        llm_analysis_config = self.config.get("llm", {}).get("analysis", {})
+        return ChunkedAnalyzer(
+            self.ollama,
+            chunk_tokens=llm_analysis_config.get("chunk_tokens", 2000),
+            reduce_tokens=llm_analysis_config.get("reduce_tokens", 3000)
+        )
+
+    def _start_monitors(self):
+        """Start the RSI loop and HITL interface (run off the event loop at startup)"""
+        for name in ("rsi_module", "hitl"):
+            try:
+                getattr(self, name).start()
+            except Exception as e:
+                logger.error(f"Failed to start {name}: {e}")
+
+    def _warm_up_models(self, models: Optional[List[str]] = None):
+        """Warm-up thread body: load the models and keep the per-model report"""
+        try:
+            models = models or [m for m in (self.ollama.model, self.ollama.cascade_model) if m]
+            self.warmup_report = asyncio.run(self.ollama.warm_up(models))
+        except Exception as e:
+            logger.error(f"Model warm-up failed: {e}")
+
+    def wait_for_warmup(self, timeout: Optional[float] = None) -> List[Dict]:
+        """Wait for the startup warm-up to finish and return its report"""
+        if self._warmup_thread is not None:
+            self._warmup_thread.join(timeout)
+            if self._warmup_thread.is_alive():
+                logger.warning("Model warm-up still running; first request may be slow")
+        return self.warmup_report
+
+    async def _report_warmup(self):
+        """Background task: print the model warm-up report once loading finishes"""
+        if self._warmup_thread is None:
+            return
+        warmup_timeout = self.config.get("llm", {}).get("warmup", {}).get("timeout", 120)
+        deadline = time.time() + warmup_timeout
+        # Poll rather than join in a worker thread, so shutdown can cancel the wait
+        while self._warmup_thread.is_alive():
+            if time.time() > deadline:
+                logger.warning("Model warm-up still running; first request may be slow")
+                return
+            await asyncio.sleep(0.2)
+        for entry in self.warmup_report:
+            if entry["status"] == "ok":
+                print(f"\n🧠 {entry['model']} ready on {entry['endpoint']} "
+                      f"(load_duration {entry['load_duration']:.2f}s)", flush=True)
+            else:
+                print(f"\n⚠️ {entry['model']} failed to load on {entry['endpoint']}: {entry['error']}", flush=True)
+
+    def _print_startup_report(self):
+        """Print construction timings; the warm-up report follows from _report_warmup"""
+        report = self.startup_report()
+        timings = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in report["timings"].items())
+        pending = f" (on demand: {', '.join(report['pending'])})" if report["pending"] else ""
+        print(f"⏱️ Startup: {timings}{pending}")
+        for name, error in report["errors"].items():
+            print(f"⚠️ {name} unavailable: {error}")
+
+    def _diagnostics_answer(self, prompt: str) -> Optional[str]:
+        """Degraded-mode source: the cached diagnostic report for status and health questions"""
+        if self.last_diagnostic_report is None:
+            return None
+        lowered = prompt.lower()
+        if not any(word in lowered for word in ("status", "health", "diagnos", "integrity")):
+            return None
+        return f"Last self-diagnostic report:{self.last_diagnostic_report}"
+
     def _file_io_fallback(self, operation="read", file_path="unknown"):
         """Fallback for file I/O operations when circuit breaker is open"""
         logger.warning(f"Circuit breaker is open for file I/O operations on {file_path}, using fallback")
@@ -303,103 +676,91 @@ class PerpetualLLM:
 
     def _read_file_with_circuit_breaker(self, file_path):
         """Read a file with circuit breaker protection"""
+        def read():
+            with open(file_path, 'rb') as f:
+                return f.read()
+
         try:
-            return self.file_io_circuit_breaker.execute(
-                lambda: open(file_path, 'rb').read(),
-                operation="read",
-                file_path=file_path
-            )
+            return self.file_io_circuit_breaker.execute(read)
         except Exception as e:
             logger.error(f"Failed to read file {file_path}: {e}")
             return None
 
     def verify_file_integrity(self) -> bool:
-        """Verify integrity of critical files with circuit breaker protection"""
-        critical_files = [
-            "perpetual_llm.py",
-            "rsi_module.py",
-            "sandbox_executor.py",
-            "hitl_interface.py",
-            "ollama_agent.py"
-        ]
+        """Verify integrity of critical files with circuit breaker protection
 
-        all_files_ok = True
-        results = {}
-
-        for file in critical_files:
-            try:
-                if not os.path.exists(file):
-                    logger.error(f"Critical file not found: {file}")
-                    results[file] = {"status": "missing"}
-                    all_files_ok = False
-                    continue
-
-                # Use circuit breaker to read file
-                content = self._read_file_with_circuit_breaker(file)
-                if content is None:
-                    logger.error(f"Failed to read {file} (circuit breaker may be open)")
-                    results[file] = {"status": "read_error"}
-                    all_files_ok = False
-                    continue
-
-                current_hash = hashlib.sha256(content).hexdigest()
-                results[file] = {"current_hash": current_hash}
-
-                # Check if memory_manager has the required methods
-                if not hasattr(self.memory_manager, 'get_hash') or not hasattr(self.memory_manager, 'store_hash'):
-                    logger.warning(f"Memory manager missing hash methods, skipping hash verification")
-                    results[file]["status"] = "not_verified"
-                    continue
-
-                # Compare with stored hash
-                stored_hash = self.memory_manager.get_hash(file)
-                results[file]["stored_hash"] = stored_hash
-
-                if stored_hash and stored_hash != current_hash:
-                    logger.error(f"Integrity check failed for {file}")
-                    results[file]["status"] = "modified"
-                    all_files_ok = False
-                else:
-                    results[file]["status"] = "ok"
-                    # Store new hash if none exists
-                    if not stored_hash:
-                        try:
-                            self.memory_manager.store_hash(file, current_hash)
-                            logger.info(f"Stored new hash for {file}")
-                        except Exception as store_err:
-                            logger.warning(f"Failed to store hash for {file}: {store_err}")
+        Unchanged files (same size, mtime and inode) reuse their cached hash;
+        changed ones are hashed in parallel. Per-file results are kept in
+        last_integrity_results.
+        """
+        try:
+            results = self.integrity_checker.check(self.CRITICAL_FILES)
+        except Exception as e:
+            logger.error(f"Failed to verify critical files: {e}")
+            return False
 
-            except Exception as e:
-                logger.error(f"Failed to verify {file}: {e}")
-                results[file] = {"status": "error", "error": str(e)}
-                all_files_ok = False
+        self.last_integrity_results = results
+        all_files_ok = all(result["status"] in ("ok", "not_verified") for result in results.values())
 
         # Log summary
         logger.info(f"File integrity check completed: {all_files_ok}")
         return all_files_ok
 
-    async def process_input(self, user_input: str) -> Dict:
-        """Process user input and execute appropriate action"""
+    async def process_input(self, user_input: str, on_token: Optional[Callable[[str], None]] = None,
+                            session_id: Optional[str] = None) -> Dict:
+        """Process user input and execute appropriate action
+
+        If on_token is given, LLM responses are streamed and each token is
+        passed to it as soon as it arrives; the full text is still returned.
+        With a session_id, free text continues that chat session instead of
+        being sent as a standalone prompt.
+        """
         try:
-            # Track command for monitoring
-            self.monitor.command_history.append(user_input)
             start_time = time.time()
 
             result = None
+            command_failed = False
+            # Opt-in: cached prompts can also be served as stale answers while the LLM is down
+            use_cache = self.config.get("llm", {}).get("cache", {}).get("prompts", False)
             try:
                 if user_input.startswith("!"):
                     result = await self.handle_command(user_input[1:])
+                elif self.ollama.cascade_model and not session_id:
+                    # The small model's answer is checked before it is shown, so it is not streamed
+                    generation = await self.ollama.generate_cascade(user_input, use_cache=use_cache,
+                                                                    priority=RequestPriority.INTERACTIVE)
+                    if on_token is not None:
+                        on_token(generation.text)
+                    result = {"status": "success", "response": generation.text,
+                              "streamed": on_token is not None, "cascade_path": generation.cascade_path}
+                elif on_token is not None:
+                    if session_id:
+                        tokens = self.ollama.stream_chat(session_id, user_input, priority=RequestPriority.INTERACTIVE)
+                    else:
+                        tokens = self.ollama.stream_response(user_input, use_cache=use_cache,
+                                                             priority=RequestPriority.INTERACTIVE)
+                    chunks = []
+                    async for token in tokens:
+                        chunks.append(token)
+                        on_token(token)
+                    result = {"status": "success", "response": "".join(chunks), "streamed": True}
+                elif session_id:
+                    response = await self.ollama.chat(session_id, user_input, priority=RequestPriority.INTERACTIVE)
+                    result = {"status": "success", "response": response}
                 else:
-                    response = await self.ollama.generate_response(user_input)
+                    response = await self.ollama.generate_response(user_input, use_cache=use_cache,
+                                                                   priority=RequestPriority.INTERACTIVE)
                     result = {"status": "success", "response": response}
             except Exception as cmd_error:
-                self.monitor.error_count += 1
+                command_failed = True
                 logger.error(f"Command execution error: {cmd_error}")
                 result = {"status": "error", "error": str(cmd_error)}
 
             # Update metrics
             execution_time = time.time() - start_time
-            self.metrics["response_time"] = (self.metrics["response_time"] + execution_time) / 2  # Running average
+            self.monitor.record_command(user_input, execution_time, ok=not command_failed)
+            if result["status"] != "success":
+                self.command_cache.invalidate("error")
 
             if result["status"] == "success":
                 success_rate = self.metrics["directive_success_rate"]
@@ -409,10 +770,10 @@ class PerpetualLLM:
                 self.metrics["directive_success_rate"] = 0.9 * success_rate + 0.1 * 0.0  # Weighted update
 
             # Check system health periodically
-            if len(self.monitor.command_history) % 10 == 0:  # Every 10 commands
+            if self.monitor.commands_processed % 10 == 0:  # Every 10 commands
                 health = self.monitor.health_check()
                 if health["status"] == "degraded":
-                    asyncio.create_task(self.handle_degraded_state(health))
+                    self.spawn_background(self.handle_degraded_state(health))
 
             return result
 
@@ -420,28 +781,97 @@ class PerpetualLLM:
             logger.error(f"Critical error processing input: {e}")
             return {"status": "error", "error": f"Critical error: {str(e)}"}
 
-    async def handle_command(self, command: str) -> Dict:
-        """Handle system commands"""
-        parts = command.split()
-        cmd = parts[0].lower()
-
-        # Define command handlers as instance methods
-        commands = {
+    def _command_handlers(self) -> Dict[str, Callable]:
+        """Map agent command names to their handler methods"""
+        return {
             "rsi": self.handle_rsi_command,
             "system": self.handle_system_command,
             "analyze": self.handle_analysis_command,
             "status": self.get_system_status,
             "help": self.show_help,
             "consider_self": self.run_self_diagnostic,  # Add new command
-            "interpret": self.handle_code_interpretation  # Add code interpreter command
+            "interpret": self.handle_code_interpretation,  # Add code interpreter command
+            "jobs": self.list_shell_jobs,
+            "kill": self.kill_shell_job,
+            "reload": self.reload_command
         }
 
-        handler = commands.get(cmd)
+    async def handle_command(self, command: str) -> Dict:
+        """Handle system commands"""
+        parts = command.split()
+        if not parts:
+            return {"status": "error", "error": "Empty command"}
+        cmd = parts[0].lower()
+
+        handler = self._command_handlers().get(cmd)
         if handler:
-            return await handler(parts[1:] if len(parts) > 1 else [])
+            start_time = time.time()
+            args = parts[1:] if len(parts) > 1 else []
+            try:
+                return await self._run_cached(cmd, args, handler)
+            finally:
+                self.monitor.record_handler(cmd, time.time() - start_time)
 
         return {"status": "error", "error": "Unknown command"}
 
+    def _cache_policy(self, cmd: str, args: List[str]) -> Optional[str]:
+        """Name of the CACHED_COMMANDS entry covering this command, if any"""
+        if args and f"{cmd} {args[0].lower()}" in self.CACHED_COMMANDS:
+            return f"{cmd} {args[0].lower()}"
+        return cmd if cmd in self.CACHED_COMMANDS else None
+
+    async def _run_cached(self, cmd: str, args: List[str], handler: Callable) -> Dict:
+        """Run a command handler, serving read-mostly commands from command_cache.
+
+        Only successful results are cached; hits are marked with "cached": True.
+        """
+        policy = self._cache_policy(cmd, args)
+        cache_config = self.config.get("command_cache", {})
+        if policy is None or not cache_config.get("enabled", True):
+            return await handler(args)
+
+        events = self.CACHED_COMMANDS[policy]
+        if "file_change" in events:
+            self._check_file_changes()
+        result, cached = await self.command_cache.get_or_compute(
+            (cmd, tuple(args)),
+            lambda: handler(args),
+            events=events,
+            ttl=cache_config.get("ttls", {}).get(policy, cache_config.get("ttl", 2.0)),
+            store_if=lambda r: r.get("status") == "success"
+        )
+        return {**result, "cached": True} if cached else result
+
+    def _check_file_changes(self):
+        """Fire a file_change invalidation when a critical file's size, mtime or inode changed"""
+        fingerprint = self.integrity_checker.fingerprint(self.CRITICAL_FILES)
+        if self._file_fingerprint is not None and fingerprint != self._file_fingerprint:
+            self.command_cache.invalidate("file_change")
+        self._file_fingerprint = fingerprint
+
+    def reload_config(self):
+        """Re-read the config file and drop cached command results.
+
+        Components that are already built keep the settings they were built with.
+        """
+        with open(self.config_path) as f:
+            config = yaml.safe_load(f)
+        self.config = config
+        self.validator = CommandValidator(config)
+        self.stream_output = config.get("llm", {}).get("stream", True)
+        self.command_cache.ttl = config.get("command_cache", {}).get("ttl", 2.0)
+        self.command_cache.invalidate("config_reload")
+        logger.info(f"Configuration reloaded from {self.config_path}")
+
+    async def reload_command(self, args: List[str] = None) -> Dict:
+        """Reload the config file: !reload"""
+        try:
+            await asyncio.to_thread(self.reload_config)
+        except Exception as e:
+            logger.error(f"Failed to reload configuration: {e}")
+            return {"status": "error", "error": f"Failed to reload configuration: {e}"}
+        return {"status": "success", "response": f"Configuration reloaded from {self.config_path}"}
+
     async def handle_rsi_command(self, args: List[str]) -> Dict:
         """Handle RSI-related commands"""
         if not args:
@@ -501,6 +931,12 @@ class PerpetualLLM:
             health = self.monitor.health_check()
             metrics = self.metrics.copy()
             metrics.update(health)
+            metrics["response_time"] = self.monitor.mean_latency
+            metrics["latency"] = self.monitor.latency_report()
+            metrics["startup"] = self.startup_report()
+            metrics["command_cache"] = dict(self.command_cache.stats)
+            if not args or "llm" in args:
+                metrics["llm"] = self.ollama.get_metrics()
 
             # If args are provided, filter the metrics
             if args and len(args) > 0:
@@ -537,7 +973,7 @@ class PerpetualLLM:
                 return {"status": "error", "error": "Code contains potentially unsafe patterns"}
 
             # Execute the code using the interpreter
-            status, output, error, local_vars = self.code_interpreter.execute(code)
+            status, output, error, local_vars = await asyncio.to_thread(self.code_interpreter.execute, code)
 
             # Format the response
             if status == "success":
@@ -553,98 +989,295 @@ class PerpetualLLM:
             return {"status": "error", "error": str(e)}
 
     def run(self):
-        """Main execution loop"""
+        """Main execution loop: one event loop for the whole REPL session"""
+        try:
+            asyncio.run(self.run_async())
+        except KeyboardInterrupt:
+            print("\nReceived keyboard interrupt. Shutting down...")
+            self.running = False
+
+    async def run_async(self):
+        """REPL on a single persistent event loop.
+
+        Input is read without blocking the loop, so background tasks (health
+        handling, streaming, warm connections) keep running between commands.
+        """
         self.running = True
+        self._print_startup_report()
+        self.spawn_background(self._report_warmup())
         print("\n🤖 Guardian AI initialized. Type !help for commands.")
         print("Use '!' prefix for local shell commands")
 
-        # Start the RSI module
-        self.rsi_module.start()
+        # Start the RSI module and HITL interface without holding up the prompt
+        self.spawn_background(asyncio.to_thread(self._start_monitors))
 
-        # Start the HITL interface
-        self.hitl.start()
+        try:
+            while self.running:
+                try:
+                    user_input = (await async_input("\n> ")).strip()
 
-        while self.running:
-            try:
-                user_input = input("\n> ").strip()
+                    if not user_input:
+                        continue
 
-                if not user_input:
-                    continue
+                    if user_input.lower() in ["exit", "quit"]:
+                        confirm = (await async_input("⚠️ Are you sure you want to exit? (y/n): ")).strip().lower()
+                        if confirm == "y":
+                            self.running = False
+                            print("Shutting down Guardian AI...")
+                            break
+                        else:
+                            continue
+
+                    await self._handle_repl_input(user_input)
+
+                except EOFError:
+                    print("\nInput stream closed. Shutting down...")
+                    self.running = False
+                except Exception as e:
+                    logger.error(f"Unexpected error: {e}")
+                    print(f"\n⚠️ Unexpected error: {e}")
+        finally:
+            await self.shell_jobs.shutdown()
+            await self._shutdown_background_tasks()
+            await self._close_llm()
+
+    def serve(self, host: Optional[str] = None, port: Optional[int] = None,
+              unix_socket: Optional[str] = None, allow_remote: bool = False):
+        """Run as a local server instead of the REPL (blocks until interrupted)"""
+        try:
+            asyncio.run(self.serve_async(host, port, unix_socket, allow_remote))
+        except KeyboardInterrupt:
+            print("\nReceived keyboard interrupt. Shutting down...")
+            self.running = False
+
+    async def serve_async(self, host: Optional[str] = None, port: Optional[int] = None,
+                          unix_socket: Optional[str] = None, allow_remote: bool = False):
+        """Serve process_input and handle_command over HTTP on one event loop.
+
+        Arguments override the "server" config section. Concurrent clients are
+        served as separate tasks and share the agent's caches, sessions and
+        warm connections. Non-loopback hosts need allow_remote and a token
+        (server.token, or the GUARDIAN_SERVER_TOKEN environment variable).
+        """
+        server_config = self.config.get("server", {})
+        server = AgentServer(
+            self,
+            host=host or server_config.get("host", "127.0.0.1"),
+            port=port if port is not None else server_config.get("port", 8765),
+            unix_socket=unix_socket or server_config.get("unix_socket"),
+            max_body_bytes=server_config.get("max_body_bytes", 1024 * 1024),
+            allow_remote=allow_remote or server_config.get("allow_remote", False),
+            token=os.environ.get("GUARDIAN_SERVER_TOKEN") or server_config.get("token")
+        )
+        self.running = True
+        self._print_startup_report()
+        self.spawn_background(self._report_warmup())
+        self.spawn_background(asyncio.to_thread(self._start_monitors))
 
-                if user_input.lower() in ["exit", "quit"]:
-                    confirm = input("⚠️ Are you sure you want to exit? (y/n): ").strip().lower()
-                    if confirm == "y":
-                        self.running = False
-                        print("Shutting down Guardian AI...")
-                        break
-                    else:
-                        continue
+        try:
+            await server.start()
+            location = server.unix_socket or f"http://{server.host}:{server.port}"
+            print(f"\n🤖 Guardian AI serving on {location}")
+            await server.serve_forever()
+        finally:
+            self.running = False
+            await server.close()
+            await self._shutdown_background_tasks()
+            await self._close_llm()
+
+    def run_batch(self, source: str = "-", output: Optional[str] = None,
+                  concurrency: Optional[int] = None) -> BatchSummary:
+        """Replay a command script without a TTY and return the batch summary.
+
+        source is a file path or "-" for stdin; JSONL results go to output
+        (a path) or stdout. The summary line is printed to stderr.
+        """
+        return asyncio.run(self.run_batch_async(source, output, concurrency))
 
-                # Handle local commands (!) - from perpetual_agent_old.py
-                if user_input.startswith("!"):
-                    local_command = user_input[1:].strip()
-                    tokens = local_command.split()
+    async def run_batch_async(self, source: str = "-", output: Optional[str] = None,
+                              concurrency: Optional[int] = None) -> BatchSummary:
+        batch_config = self.config.get("batch", {})
+        concurrency = concurrency or batch_config.get("concurrency", 4)
+        self.running = True
 
-                    if not tokens:
-                        print("⚠️ No command provided after '!'. Please enter a valid local command.")
-                        continue
+        if source == "-":
+            lines = sys.stdin.readlines()
+        else:
+            with open(source, "r") as f:
+                lines = f.readlines()
+
+        out = open(output, "w") if output else sys.stdout
+        try:
+            summary = await BatchRunner(self, concurrency=concurrency, output=out).run(lines)
+        finally:
+            if output:
+                out.close()
+            self.running = False
+            await self._shutdown_background_tasks()
+            await self._close_llm()
+
+        print(format_summary(summary), file=sys.stderr)
+        return summary
+
+    async def _handle_repl_input(self, user_input: str):
+        """Run one REPL line: a local shell command, an agent command or free text"""
+        # Agent commands (!status, !help, ...) go through process_input below;
+        # anything else after '!' is a local shell command
+        is_agent_command = (user_input.startswith("!") and len(user_input) > 1 and
+                            user_input[1:].split()[0].lower() in self._command_handlers())
+
+        # Handle local commands (!) - from perpetual_agent_old.py
+        if user_input.startswith("!") and not is_agent_command:
+            local_command = user_input[1:].strip()
+            tokens = local_command.split()
+
+            if not tokens:
+                print("⚠️ No command provided after '!'. Please enter a valid local command.")
+                return
+
+            # A trailing '&' runs the command as a background job (see !jobs / !kill)
+            if local_command.endswith("&") and not local_command.endswith("&&"):
+                local_command = local_command[:-1].strip()
+                job = await self.shell_jobs.start(local_command, on_exit=self._report_shell_job,
+                                                  background=True)
+                print(f"\n[{job.id}] started: {local_command}")
+                return
+
+            # Special handling for analysis commands
+            if tokens[0].lower() in ["analyze", "check", "summarize"]:
+                print("\n🔍 Local Command Output:")
+                job = await self.shell_jobs.run(local_command, on_output=self._print_token)
+                output = job.output
+                if job.status != "exited" or job.returncode or job.truncated:
+                    output += f"\n⚠️ {self._describe_shell_job(job)}"
+                print("\n🤖 Analysis:")
+                # Use Ollama to analyze the output
+                await self._analyze_to_console(output)
+
+            # General command execution
+            else:
+                print("\n🖥️ Local Command Output:")
+                job = await self.shell_jobs.run(local_command, on_output=self._print_token)
+                if job.status != "exited" or job.returncode:
+                    print(f"\n⚠️ {self._describe_shell_job(job)}")
+            return
+
+        # Default: Process through the agent
+        if self.stream_output and not is_agent_command:
+            print("\n🤖 Response: ", end="", flush=True)
+            result = await self.process_input(user_input, on_token=self._print_token,
+                                              session_id=self.repl_session_id)
+            print()
+        else:
+            result = await self.process_input(user_input, session_id=self.repl_session_id)
+
+        if result.get("streamed"):
+            return
+        if result["status"] == "success":
+            # Check if the response is a dictionary or string
+            if isinstance(result["response"], dict):
+                print("\n🤖 Response:")
+                for key, value in result["response"].items():
+                    print(f"  {key}: {value}")
+            else:
+                print("\n🤖 Response:", result["response"])
+        else:
+            print("\n⚠️ Error:", result["error"])
 
-                    # Special handling for analysis commands
-                    if tokens[0].lower() in ["analyze", "check", "summarize"]:
-                        try:
-                            import subprocess
-                            output = subprocess.check_output(local_command, shell=True, universal_newlines=True)
-                        except subprocess.CalledProcessError as e:
-                            output = f"⚠️ Error executing local command: {e}"
+    @staticmethod
+    def _describe_shell_job(job: ShellJob) -> str:
+        if job.status == "failed":
+            return f"Error executing local command: {job.error}"
+        if job.status == "timeout":
+            return f"Command timed out after {job.elapsed:.0f}s and was killed"
+        if job.status == "killed":
+            return "Command was killed"
+        note = f"Command exited with status {job.returncode}"
+        if job.truncated:
+            note += " (output truncated)"
+        return note
+
+    def _report_shell_job(self, job: ShellJob):
+        """Announce a finished background job in the REPL"""
+        state = "done" if job.status == "exited" and not job.returncode else self._describe_shell_job(job)
+        print(f"\n[{job.id}] {state}: {job.command} (see !jobs {job.id})", flush=True)
+
+    async def list_shell_jobs(self, args: List[str] = None) -> Dict:
+        """List local shell jobs, or show one job's captured output with !jobs <id>"""
+        if args:
+            try:
+                job = self.shell_jobs.get(int(args[0]))
+            except ValueError:
+                job = None
+            if job is None:
+                return {"status": "error", "error": f"No such job: {args[0]}"}
+            return {"status": "success", "response": {**job.to_dict(), "output": job.output}}
+        return {"status": "success", "response": {
+            str(job.id): f"{job.status:<8} {job.elapsed:7.1f}s  {job.command}" for job in self.shell_jobs.jobs()
+        } or "No shell jobs"}
+
+    async def kill_shell_job(self, args: List[str] = None) -> Dict:
+        """Kill a running local shell job: !kill <id>"""
+        if not args:
+            return {"status": "error", "error": "Usage: !kill <job id>"}
+        try:
+            killed = await self.shell_jobs.kill(int(args[0]))
+        except ValueError:
+            killed = False
+        if not killed:
+            return {"status": "error", "error": f"No running job: {args[0]}"}
+        return {"status": "success", "response": f"Killed job {args[0]}"}
+
+    async def _close_llm(self):
+        """Release pooled LLM connections, if the client was ever built"""
+        if self.is_initialized("ollama"):
+            await self.ollama.close()
+
+    def spawn_background(self, coro) -> asyncio.Task:
+        """Start a tracked background task on the running loop"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_task_done)
+        return task
+
+    def _background_task_done(self, task: asyncio.Task):
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background task failed: {task.exception()}")
+
+    async def _shutdown_background_tasks(self, timeout: float = 5.0):
+        """Give background tasks a moment to finish, then cancel the rest"""
+        if not self._background_tasks:
+            return
+        pending = list(self._background_tasks)
+        _, still_running = await asyncio.wait(pending, timeout=timeout)
+        for task in still_running:
+            task.cancel()
+        if still_running:
+            logger.warning(f"Cancelled {len(still_running)} background task(s) at shutdown")
+            await asyncio.gather(*still_running, return_exceptions=True)
 
-                        # Use Ollama to analyze the output
-                        prompt = f"Please analyze the following output and provide insights:\n{output}"
-                        response = asyncio.run(self.ollama.generate_response(prompt))
+    @staticmethod
+    def _print_token(token: str):
+        """Print a streamed token without buffering"""
+        print(token, end="", flush=True)
 
-                        print("\n🔍 Local Command Output:")
-                        print(output)
-                        print("\n🤖 Analysis:")
-                        print(response)
+    async def _analyze_to_console(self, output: str):
+        """Analyze command output with the LLM, printing progress and the answer.
 
-                    # General command execution
-                    else:
-                        try:
-                            import subprocess
-                            output = subprocess.check_output(local_command, shell=True, universal_newlines=True)
-                            print("\n🖥️ Local Command Output:")
-                            print(output)
-                        except subprocess.CalledProcessError as e:
-                            print(f"\n⚠️ Error executing local command: {e}")
-                        except FileNotFoundError:
-                            print(f"\n⚠️ Unknown command: '{local_command}' is not recognized.")
-                        except Exception as e:
-                            print(f"\n⚠️ Unexpected error executing '{local_command}': {e}")
-
-                    continue
-
-                # Default: Process through the agent
-                result = asyncio.run(self.process_input(user_input))
-
-                if result["status"] == "success":
-                    # Check if the response is a dictionary or string
-                    if isinstance(result["response"], dict):
-                        print("\n🤖 Response:")
-                        for key, value in result["response"].items():
-                            print(f"  {key}: {value}")
-                    else:
-                        print("\n🤖 Response:", result["response"])
-                else:
-                    print("\n⚠️ Error:", result["error"])
-
-            except KeyboardInterrupt:
-                print("\nReceived keyboard interrupt. Shutting down...")
-                self.running = False
-            except EOFError:
-                print("\nInput stream closed. Shutting down...")
-                self.running = False
-            except Exception as e:
-                logger.error(f"Unexpected error: {e}")
-                print(f"\n⚠️ Unexpected error: {e}")
+        Large outputs are summarized in chunks and then combined. Identical
+        output gets the same analysis, so cached answers are reused.
+        """
+        on_token = self._print_token if self.stream_output else None
+        analysis = await self.analyzer.analyze(
+            output,
+            on_progress=lambda message: print(f"  ⏳ {message}", flush=True),
+            on_token=on_token
+        )
+        if on_token:
+            print()
+        else:
+            print(analysis)
 
     async def show_help(self, args: List[str] = None) -> Dict:
         """Show available commands and usage"""
@@ -671,6 +1304,21 @@ System Commands:
 --------------
 !system <command> : Execute a system command in the sandbox
                    Note: Commands are restricted for security
+"""
+            elif command == "status":
+                help_text = """
+Status Commands:
+---------------
+!status           : Show all system metrics
+!status <metrics> : Show only the named metrics (e.g. error_rates llm)
+!status latency   : Latency p50/p90/p99/max per category and command handler
+                    (lifetime and last 1m/5m/1h)
+!status startup   : Construction time per component and which are not built yet
+!status command_cache : Hit/miss counts of the status/help/diagnostics result cache
+
+Results of !status, !help, !analyze health and !consider_self are cached for
+command_cache.ttl seconds (default 2) and dropped early when a command fails,
+a critical file changes or the config is reloaded (!reload).
 """
             elif command == "interpret":
                 help_text = """
@@ -700,6 +1348,11 @@ Available Commands:
 !help [command]     : Show this help message or specific command help
 !status [metrics]   : Show system status or specific metrics
 !consider_self      : Run system self-diagnostics
+!jobs [id]          : List local shell jobs or show one job's output
+!kill <id>          : Kill a running local shell job
+!reload             : Re-read the config file and drop cached command results
+
+Local shell: !<command> runs it with streamed output; !<command> & runs it in the background
 """
 
         # Return the help text in the response instead of printing it
@@ -773,6 +1426,9 @@ Available Commands:
                 for key, value in diagnostic_report['rsi_status']['metrics'].items():
                     report_text += f"  - {key}: {value:.2f}\n"
 
+            # Kept for degraded-mode answers while the LLM is unavailable
+            self.last_diagnostic_report = report_text
+
             return {
                 "status": "success",
                 "response": report_text,
@@ -795,7 +1451,7 @@ Available Commands:
 
         # Stop RSI module
         try:
-            if hasattr(self, 'rsi_module'):
+            if self.is_initialized('rsi_module'):
                 self.rsi_module.stop()
                 logger.info("RSI module stopped")
         except Exception as e:
@@ -803,12 +1459,20 @@ Available Commands:
 
         # Stop HITL interface
         try:
-            if hasattr(self, 'hitl'):
+            if self.is_initialized('hitl'):
                 self.hitl.stop()
                 logger.info("HITL interface stopped")
         except Exception as e:
             logger.error(f"Error stopping HITL interface: {e}")
 
+        # Release pooled LLM connections
+        try:
+            if self.is_initialized('ollama'):
+                asyncio.run(self.ollama.close())
+                logger.info("LLM transport closed")
+        except Exception as e:
+            logger.error(f"Error closing LLM transport: {e}")
+
         # Clean up memory manager
         try:
             if hasattr(self, 'memory_manager'):
@@ -843,9 +1507,8 @@ Available Commands:
             if aggressive:
                 logger.info("Simulating aggressive variant")
                 # Prioritize Critical tasks
-                critical_directives = self.priority_layers.get("Critical", [])
-                if critical_directives:
-                    directive = critical_directives[0]  # Don't remove, just simulate
+                directive = self.priority_layers.peek("Critical")  # Don't remove, just simulate
+                if directive is not None:
                     logger.info(f"Aggressively executing: {directive}")
                     self.variant_performance["aggressive"] += 1
                     results["variants"]["aggressive"] = {"executed": True, "directive": directive}
@@ -856,9 +1519,8 @@ Available Commands:
             if passive:
                 logger.info("Simulating passive variant")
                 # Focus on Peripheral tasks
-                peripheral_directives = self.priority_layers.get("Peripheral", [])
-                if peripheral_directives:
-                    directive = peripheral_directives[0]  # Don't remove, just simulate
+                directive = self.priority_layers.peek("Peripheral")  # Don't remove, just simulate
+                if directive is not None:
                     logger.info(f"Passively executing: {directive}")
                     self.variant_performance["passive"] += 1
                     results["variants"]["passive"] = {"executed": True, "directive": directive}
@@ -869,21 +1531,9 @@ Available Commands:
             if dangerous:
                 logger.info("Simulating dangerous variant")
                 # Use weighted random selection
-                import random
-                total_weight = sum(self.priority_weights.values())
-                rand_choice = random.uniform(0, total_weight)
-                cumulative_weight = 0
-
-                selected_priority = None
-                for priority, weight in self.priority_weights.items():
-                    cumulative_weight += weight
-                    if rand_choice <= cumulative_weight:
-                        selected_priority = priority
-                        break
-
-                directives = self.priority_layers.get(selected_priority, [])
-                if directives:
-                    directive = directives[0]  # Don't remove, just simulate
+                selected_priority = self.priority_layers.sample_priority()
+                directive = self.priority_layers.peek(selected_priority)  # Don't remove, just simulate
+                if directive is not None:
                     logger.info(f"Dangerously executing from {selected_priority}: {directive}")
                     self.variant_performance["dangerous"] += 1
                     results["variants"]["dangerous"] = {"executed": True, "directive": directive, "priority": selected_priority}
@@ -906,6 +1556,7 @@ Available Commands:
                     self.priority_weights[layer] = max(
                         0.01, min(10.0, self.priority_weights[layer] + adjustment)
                     )
+            self.priority_layers.set_weights(self.priority_weights)
         logger.info(f"Adjusted weights: {self.priority_weights}")
         return self.priority_weights
 
@@ -914,9 +1565,60 @@ Available Commands:
         return {
             "llm": {
                 "model": "gemma3:12b",  # Changed from llama2 to gemma3:12b
+                "embedding_model": "nomic-embed-text",
+                "keep_alive": "30m",  # How long Ollama keeps the model loaded after a request
+                "cascade": {
+                    "enabled": False,
+                    "small_model": "gemma3:1b",  # Answers first; escalates to "model" when unsure
+                    "min_confidence": 70,
+                    "max_prompt_chars": 4000  # Longer prompts go straight to the main model
+                },
+                "warmup": {
+                    "enabled": True,
+                    "models": [],  # Empty loads the configured model (and cascade small model)
+                    "timeout": 120  # Seconds before the warm-up report gives up (startup never waits for it)
+                },
                 "api": {
                     "base_url": "http://localhost:11434",
-                    "timeout": 30
+                    "endpoints": [],  # Extra hosts to route between; empty uses base_url only
+                    "timeout": 30,
+                    "connect_timeout": 5,
+                    "pool_size": 10,
+                    "async_transport": True,
+                    "adaptive_timeout": {
+                        "enabled": True,
+                        "factor": 3.0,  # Read timeout = p99 latency x factor, scaled by prompt size
+                        "min_timeout": 5.0,
+                        "max_timeout": 300.0
+                    },
+                    "hedge_requests": False  # Duplicate slow requests to a second endpoint after p95
+                },
+                "stream": True,
+                "coalesce_requests": True,
+                "scheduler": {
+                    "max_concurrency": 2,
+                    "aging_interval": 10.0
+                },
+                "analysis": {
+                    "chunk_tokens": 2000,
+                    "reduce_tokens": 3000
+                },
+                "sessions": {
+                    "max_sessions": 32,
+                    "idle_timeout": 1800,
+                    "max_messages": 40,
+                    "repl": False
+                },
+                "cache": {
+                    "max_entries": 256,
+                    "ttl": 3600,
+                    "persistent": True,
+                    "semantic": {
+                        "enabled": False,
+                        "threshold": 0.95,  # Cosine similarity needed to reuse an answer
+                        "max_entries": 1024,
+                        "path": None  # e.g. "data/semantic_cache" to memory-map to disk
+                    }
                 },
                 "temperature": 0.7
             },
@@ -937,6 +1639,12 @@ Available Commands:
             "monitoring": {
                 "enabled": True,
                 "log_level": "INFO"
+            },
+            "command_cache": {
+                "enabled": True,
+                "ttl": 2.0,  # Seconds !status, !help, !analyze health and !consider_self results are reused
+                "ttls": {},  # Per-command overrides, e.g. {"help": 300}
+                "max_entries": 128
             }
         }
 
@@ -947,13 +1655,34 @@ if __name__ == "__main__":
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
 
+    parser = argparse.ArgumentParser(description="Guardian AI")
+    parser.add_argument("--serve", action="store_true", help="Serve requests over HTTP instead of the REPL")
+    parser.add_argument("--host", help="Server bind address (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, help="Server port (default 8765)")
+    parser.add_argument("--unix-socket", help="Serve on a Unix socket instead of TCP")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="Allow a non-loopback --host (requires GUARDIAN_SERVER_TOKEN or server.token)")
+    parser.add_argument("--batch", metavar="FILE", help="Run commands from FILE ('-' for stdin) and exit")
+    parser.add_argument("--concurrency", type=int, help="Parallel commands in batch mode (default 4)")
+    parser.add_argument("--output", help="Write batch JSONL results to this file instead of stdout")
+    args = parser.parse_args()
+
     # Initialize components
     memory_manager = MemoryManager()
     agent = PerpetualLLM("config/base_config.yaml", memory_manager, model="gemma3:12b")  # Changed model here
 
+    exit_code = 0
     try:
-        agent.run()
+        if args.batch:
+            summary = agent.run_batch(args.batch, args.output, args.concurrency)
+            exit_code = 1 if summary.failed else 0
+        elif args.serve:
+            agent.serve(args.host, args.port, args.unix_socket, args.allow_remote)
+        else:
+            agent.run()
     except Exception as e:
         logger.error(f"Fatal error: {e}")
+        exit_code = 1
     finally:
         agent.cleanup()  # Use the cleanup method we already have
+    sys.exit(exit_code)
@@ -21,22 +21,40 @@ class CircuitBreaker:
         self.fallback = fallback
 
     def execute(self, func: Callable, *args, **kwargs) -> Any:
-        if self.state == CircuitState.OPEN:
-            if time.time() - self.last_failure_time > self.recovery_timeout:
-                self.state = CircuitState.HALF_OPEN
-            else:
-                return self._handle_open_circuit()
+        if not self.allow_request():
+            return self._handle_open_circuit()
 
         try:
             result = func(*args, **kwargs)
-            if self.state == CircuitState.HALF_OPEN:
-                self.state = CircuitState.CLOSED
-                self.failure_count = 0
+            self.record_success()
             return result
         except Exception as e:
             self._handle_failure(e)
             return self._handle_open_circuit()
 
+    def allow_request(self) -> bool:
+        """Check whether a call may proceed, moving OPEN to HALF_OPEN after the recovery timeout.
+
+        Used directly by callers that cannot wrap their work in a single
+        function call (e.g. streaming or async requests).
+        """
+        if self.state == CircuitState.OPEN:
+            if time.time() - self.last_failure_time > self.recovery_timeout:
+                self.state = CircuitState.HALF_OPEN
+            else:
+                return False
+        return True
+
+    def record_success(self) -> None:
+        """Record a successful call made outside of execute()"""
+        if self.state == CircuitState.HALF_OPEN:
+            self.state = CircuitState.CLOSED
+            self.failure_count = 0
+
+    def record_failure(self, error: Exception) -> None:
+        """Record a failed call made outside of execute()"""
+        self._handle_failure(error)
+
     def _handle_failure(self, error: Exception) -> None:
         self.failure_count += 1
         self.last_failure_time = time.time()
@@ -47,4 +65,4 @@ class CircuitBreaker:
     def _handle_open_circuit(self) -> Any:
         if self.fallback:
             return self.fallback()
-        raise RuntimeError("Circuit breaker is open")
\ No newline at end of file
+        raise RuntimeError("Circuit breaker is open")
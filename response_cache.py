@@ -0,0 +1,141 @@
+import json
+import time
+import hashlib
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = "llm_cache:"
+
+def make_cache_key(model: str, prompt: str, options: Optional[Dict] = None) -> str:
+    """Build a stable cache key from (model, prompt, options)"""
+    raw = json.dumps([model, prompt, options or {}], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM responses.
+
+    An in-memory LRU sits in front of the MemoryManager sqlite store, which
+    keeps entries across restarts using the memory table's expires_at column.
+    Both tiers honour the same TTL. Expired and evicted in-memory entries are
+    kept in a bounded stale tier that get_stale() can serve while the LLM is
+    unavailable.
+    """
+
+    def __init__(self, memory_manager=None, max_entries: int = 256, ttl: int = 3600,
+                 purge_interval: int = 100):
+        self.memory_manager = memory_manager
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, response)
+        self._stale: "OrderedDict[str, tuple]" = OrderedDict()  # Same layout, past TTL or evicted
+        self._puts_since_purge = 0
+        self.stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "stale_hits": 0
+        }
+
+    def _persistent_enabled(self) -> bool:
+        return self.memory_manager is not None and hasattr(self.memory_manager, "retrieve")
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if time.time() > expires_at:
+            self._retire(key, self._entries.pop(key))
+            self.stats["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def _retire(self, key: str, entry: tuple):
+        """Move an entry out of the fresh tier into the bounded stale tier"""
+        self._stale[key] = entry
+        self._stale.move_to_end(key)
+        while len(self._stale) > self.max_entries:
+            self._stale.popitem(last=False)
+
+    def _put_memory(self, key: str, response: str, expires_at: float):
+        self._stale.pop(key, None)
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._retire(*self._entries.popitem(last=False))
+            self.stats["evictions"] += 1
+
+    async def get(self, key: str) -> Optional[str]:
+        """Look up a response, checking memory first and then the persistent tier"""
+        response = self._get_memory(key)
+        if response is not None:
+            self.stats["hits"] += 1
+            self.stats["memory_hits"] += 1
+            return response
+
+        if self._persistent_enabled():
+            try:
+                response = await asyncio.to_thread(self.memory_manager.retrieve, CACHE_KEY_PREFIX + key)
+            except Exception as e:
+                logger.warning(f"Persistent cache lookup failed: {e}")
+                response = None
+            if response is not None:
+                # Promote to the memory tier; the persistent TTL is not returned,
+                # so the remaining lifetime is bounded by a fresh TTL.
+                self._put_memory(key, response, time.time() + self.ttl)
+                self.stats["hits"] += 1
+                self.stats["persistent_hits"] += 1
+                return response
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, response: str):
+        """Store a response in both tiers"""
+        self._put_memory(key, response, time.time() + self.ttl)
+
+        if not self._persistent_enabled():
+            return
+        try:
+            await asyncio.to_thread(self.memory_manager.store, CACHE_KEY_PREFIX + key,
+                                    response, "llm_cache", self.ttl)
+        except Exception as e:
+            logger.warning(f"Persistent cache store failed: {e}")
+            return
+
+        self._puts_since_purge += 1
+        if self._puts_since_purge >= self.purge_interval and hasattr(self.memory_manager, "purge_expired"):
+            self._puts_since_purge = 0
+            purged = await asyncio.to_thread(self.memory_manager.purge_expired, "llm_cache")
+            self.stats["expirations"] += purged or 0
+
+    def get_stale(self, key: str) -> Optional[str]:
+        """Return a response from memory even if it has expired or been evicted (for degraded mode)"""
+        entry = self._entries.get(key) or self._stale.get(key)
+        if entry is None:
+            return None
+        self.stats["stale_hits"] += 1
+        return entry[1]
+
+    def clear(self):
+        """Drop the in-memory tiers"""
+        self._entries.clear()
+        self._stale.clear()
+
+    def get_stats(self) -> Dict:
+        """Return hit/miss/eviction counters"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        stats = dict(self.stats)
+        stats["entries"] = len(self._entries)
+        stats["hit_rate"] = self.stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -89,11 +89,30 @@ def run_guardian(debug=False):
             logger.error(f"Failed to start Guardian AI: {e}")
             return False
 
+def run_batch(source, output=None, concurrency=None):
+    """Replay a command script through Guardian AI in batch mode (no TTY)"""
+    logger.info(f"Running batch commands from {source}...")
+
+    cmd = ["python", "perpetual_llm.py", "--batch", source]
+    if output:
+        cmd += ["--output", output]
+    if concurrency:
+        cmd += ["--concurrency", str(concurrency)]
+    # stdin/stdout are inherited so "-" and piped JSONL output work
+    result = subprocess.run(cmd)
+    if result.returncode != 0:
+        logger.error(f"Batch run finished with failures (exit code {result.returncode})")
+        return False
+    return True
+
 def main():
     """Main function"""
     parser = argparse.ArgumentParser(description="Run Guardian AI system")
     parser.add_argument("--skip-verification", action="store_true", help="Skip verification steps")
     parser.add_argument("--debug", action="store_true", help="Run in debug mode (foreground)")
+    parser.add_argument("--batch", metavar="FILE", help="Run commands from FILE ('-' for stdin) and exit")
+    parser.add_argument("--concurrency", type=int, help="Parallel commands in batch mode")
+    parser.add_argument("--output", help="Write batch JSONL results to this file")
     args = parser.parse_args()
     
     # Add current directory to Python path
@@ -106,7 +125,10 @@ def main():
             return 1
     
     # Run Guardian AI
-    success = run_guardian(debug=args.debug)
+    if args.batch:
+        success = run_batch(args.batch, args.output, args.concurrency)
+    else:
+        success = run_guardian(debug=args.debug)
     
     return 0 if success else 1
 
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional: the semantic cache is disabled without numpy
+    np = None
+
+logger = logging.getLogger(__name__)
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache of LLM responses keyed by prompt embeddings.
+
+    Unit-normalised embeddings live in one (max_entries x dim) float32 matrix,
+    so a lookup is a single matrix-vector product. Entries are scoped (model
+    and generation options) so answers are only reused for the same kind of
+    request. The least recently used entry is replaced when the matrix is
+    full. With a path the matrix is memory-mapped to <path>.npy and entry
+    metadata is written to <path>.json on flush().
+    """
+
+    def __init__(self, max_entries: int = 1024, threshold: float = 0.95, ttl: int = 3600,
+                 path: Optional[str] = None):
+        if np is None:
+            raise ImportError("numpy is required for the semantic cache")
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.path = path
+        self._vectors = None  # Allocated on first put, once the embedding size is known
+        self._responses: List[Optional[str]] = [None] * max_entries
+        self._scope_ids = np.full(max_entries, -1, dtype=np.int64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._expires_at = np.zeros(max_entries, dtype=np.float64)
+        self._scopes: Dict[str, int] = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        if path:
+            self._load()
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._vectors.shape[1] if self._vectors is not None else None
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._scope_ids >= 0))
+
+    def _allocate(self, dim: int):
+        if self.path:
+            self._vectors = np.lib.format.open_memmap(
+                f"{self.path}.npy", mode="w+", dtype=np.float32, shape=(self.max_entries, dim))
+        else:
+            self._vectors = np.zeros((self.max_entries, dim), dtype=np.float32)
+
+    def _load(self):
+        vectors_path, meta_path = f"{self.path}.npy", f"{self.path}.json"
+        if not (os.path.exists(vectors_path) and os.path.exists(meta_path)):
+            return
+        try:
+            vectors = np.lib.format.open_memmap(vectors_path, mode="r+")
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            if vectors.shape[0] != self.max_entries:
+                logger.warning("Semantic cache size changed, starting empty")
+                return
+            self._vectors = vectors
+            self._scopes = meta["scopes"]
+            for slot, scope_id, response, expires_at in meta["entries"]:
+                self._scope_ids[slot] = scope_id
+                self._responses[slot] = response
+                self._expires_at[slot] = expires_at
+            logger.info(f"Loaded {len(self)} semantic cache entries from {vectors_path}")
+        except Exception as e:
+            logger.warning(f"Failed to load semantic cache from {self.path}: {e}")
+
+    def flush(self):
+        """Persist entry metadata and the memory-mapped matrix (no-op without a path)"""
+        if not self.path or self._vectors is None:
+            return
+        self._vectors.flush()
+        entries = [[int(slot), int(self._scope_ids[slot]), self._responses[slot], float(self._expires_at[slot])]
+                   for slot in np.flatnonzero(self._scope_ids >= 0)]
+        with open(f"{self.path}.json", "w") as f:
+            json.dump({"scopes": self._scopes, "entries": entries}, f)
+
+    @staticmethod
+    def _normalise(vectors) -> "np.ndarray":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def top_k(self, vectors: Sequence, scope: str, k: int = 1,
+              include_expired: bool = False) -> List[List[Tuple[int, float]]]:
+        """Return the k most similar live entries of scope for each query vector.
+
+        vectors may be one embedding or a batch; the result always has one
+        list of (slot, cosine similarity) pairs per query, best first.
+        include_expired also considers entries past their TTL.
+        """
+        queries = np.atleast_2d(self._normalise(vectors))
+        scope_id = self._scopes.get(scope)
+        if self._vectors is None or scope_id is None or queries.shape[1] != self.dim:
+            return [[] for _ in range(len(queries))]
+
+        live = self._scope_ids == scope_id
+        if not include_expired:
+            live &= self._expires_at > time.time()
+        scores = queries @ self._vectors.T  # (queries x max_entries)
+        scores[:, ~live] = -np.inf
+        k = min(k, int(live.sum()))
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, slots in zip(scores, best):
+            slots = slots[np.argsort(-row[slots])]
+            results.append([(int(slot), float(row[slot])) for slot in slots])
+        return results
+
+    def lookup(self, vector: Sequence, scope: str, include_expired: bool = False) -> Optional[str]:
+        """Return the cached response nearest to vector if it passes the threshold"""
+        matches = self.top_k(vector, scope, k=1, include_expired=include_expired)[0]
+        if matches and matches[0][1] >= self.threshold:
+            slot = matches[0][0]
+            self._last_used[slot] = time.time()
+            self.stats["hits"] += 1
+            return self._responses[slot]
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, vector: Sequence, scope: str, response: str):
+        vector = self._normalise(vector)
+        if self._vectors is None:
+            self._allocate(vector.shape[-1])
+        elif vector.shape[-1] != self.dim:
+            logger.warning(f"Embedding size {vector.shape[-1]} does not match semantic cache ({self.dim})")
+            return
+
+        free = np.flatnonzero((self._scope_ids < 0) | (self._expires_at <= time.time()))
+        if len(free):
+            slot = int(free[0])
+        else:
+            slot = int(np.argmin(self._last_used))
+            self.stats["evictions"] += 1
+
+        now = time.time()
+        self._vectors[slot] = vector
+        self._scope_ids[slot] = self._scopes.setdefault(scope, len(self._scopes))
+        self._responses[slot] = response
+        self._last_used[slot] = now
+        self._expires_at[slot] = now + self.ttl
+
+    def clear(self):
+        self._scope_ids[:] = -1
+        self._responses = [None] * self.max_entries
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self),
+            "threshold": self.threshold,
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0
+        }
@@ -0,0 +1,185 @@
+import os
+import time
+import codecs
+import signal
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ShellJob:
+    id: int
+    command: str
+    background: bool
+    started: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+    status: str = "running"  # running, exited, killed, timeout, failed
+    returncode: Optional[int] = None
+    output_bytes: int = 0
+    truncated: bool = False
+    error: Optional[str] = None
+    process: Optional[asyncio.subprocess.Process] = field(default=None, repr=False)
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+    _chunks: List[str] = field(default_factory=list, repr=False)
+
+    @property
+    def output(self) -> str:
+        return "".join(self._chunks)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.time()) - self.started
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "command": self.command,
+            "status": self.status,
+            "returncode": self.returncode,
+            "elapsed": round(self.elapsed, 3),
+            "output_bytes": self.output_bytes,
+            "truncated": self.truncated,
+            "background": self.background
+        }
+
+class ShellJobManager:
+    """
+    Runs local shell commands as asyncio subprocesses.
+
+    Output is streamed to an optional callback as it arrives and kept up to
+    max_output_bytes per job (the rest is drained and dropped). Commands are
+    killed after timeout seconds. Each command runs in its own process group
+    so kill() also stops anything the shell started. Finished jobs are kept
+    for `!jobs` until max_finished_jobs newer ones have completed.
+    """
+
+    def __init__(self, timeout: float = 300.0, max_output_bytes: int = 1024 * 1024,
+                 max_finished_jobs: int = 20):
+        self.timeout = timeout
+        self.max_output_bytes = max_output_bytes
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs: Dict[int, ShellJob] = {}
+        self._next_id = 1
+
+    def get(self, job_id: int) -> Optional[ShellJob]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[ShellJob]:
+        return list(self._jobs.values())
+
+    def running(self) -> List[ShellJob]:
+        return [job for job in self._jobs.values() if job.status == "running"]
+
+    async def start(self, command: str, on_output: Optional[Callable[[str], None]] = None,
+                    on_exit: Optional[Callable[[ShellJob], None]] = None,
+                    background: bool = False) -> ShellJob:
+        """Launch command and return its job; await job.task (or run()) for completion"""
+        job = ShellJob(id=self._next_id, command=command, background=background)
+        self._next_id += 1
+        self._jobs[job.id] = job
+        try:
+            job.process = await asyncio.create_subprocess_shell(
+                command,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                start_new_session=True
+            )
+        except Exception as e:
+            self._finish(job, "failed", error=str(e))
+            job.task = asyncio.get_running_loop().create_future()
+            job.task.set_result(job)
+            return job
+        job.task = asyncio.ensure_future(self._supervise(job, on_output, on_exit))
+        return job
+
+    async def run(self, command: str, on_output: Optional[Callable[[str], None]] = None) -> ShellJob:
+        """Run command in the foreground and return the finished job"""
+        job = await self.start(command, on_output=on_output)
+        return await job.task
+
+    async def _read_output(self, job: ShellJob, on_output: Optional[Callable[[str], None]]):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            data = await job.process.stdout.read(4096)
+            text = decoder.decode(data, final=not data)
+            if text:
+                if on_output is not None:
+                    on_output(text)
+                room = self.max_output_bytes - job.output_bytes
+                if room > 0:
+                    kept = text.encode("utf-8")[:room].decode("utf-8", errors="ignore")
+                    job._chunks.append(kept)
+                    job.output_bytes += len(kept.encode("utf-8"))
+                if len(text.encode("utf-8")) > room:
+                    job.truncated = True
+            if not data:
+                return
+
+    async def _read_and_wait(self, job: ShellJob, on_output) -> int:
+        await self._read_output(job, on_output)
+        return await job.process.wait()
+
+    async def _supervise(self, job: ShellJob, on_output, on_exit) -> ShellJob:
+        try:
+            # One deadline for reading and exiting: a child may close stdout and keep running
+            returncode = await asyncio.wait_for(self._read_and_wait(job, on_output), timeout=self.timeout)
+            # kill() marks the job before terminating it
+            self._finish(job, "exited" if job.status == "running" else job.status, returncode=returncode)
+        except asyncio.TimeoutError:
+            logger.warning(f"Shell job {job.id} timed out after {self.timeout}s: {job.command}")
+            await self._terminate(job)
+            self._finish(job, "timeout", returncode=job.process.returncode)
+        except asyncio.CancelledError:
+            await self._terminate(job)
+            self._finish(job, "killed", returncode=job.process.returncode)
+            raise
+        finally:
+            if on_exit is not None and job.finished is not None:
+                try:
+                    on_exit(job)
+                except Exception as e:
+                    logger.error(f"Shell job exit callback failed: {e}")
+        return job
+
+    async def _terminate(self, job: ShellJob, grace: float = 2.0):
+        process = job.process
+        if process is None or process.returncode is not None:
+            return
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                return
+            try:
+                await asyncio.wait_for(process.wait(), timeout=grace)
+                return
+            except asyncio.TimeoutError:
+                continue
+
+    def _finish(self, job: ShellJob, status: str, returncode: Optional[int] = None, error: Optional[str] = None):
+        job.status = status
+        job.returncode = returncode
+        job.error = error
+        job.finished = time.time()
+        finished = [j for j in self._jobs.values() if j.finished is not None]
+        for old in finished[:-self.max_finished_jobs]:
+            del self._jobs[old.id]
+
+    async def kill(self, job_id: int) -> bool:
+        """Stop a running job; returns False if it is unknown or already finished"""
+        job = self._jobs.get(job_id)
+        if job is None or job.status != "running" or job.task is None:
+            return False
+        job.status = "killed"
+        await self._terminate(job)
+        await job.task
+        return True
+
+    async def shutdown(self):
+        """Kill every running job (called when the agent exits)"""
+        for job in self.running():
+            await self.kill(job.id)
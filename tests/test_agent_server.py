@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import asyncio
+import tempfile
+import unittest
+import yaml
+from unittest.mock import MagicMock
+from agent_server import AgentServer
+from perpetual_llm import PerpetualLLM
+
+class FakeAgent:
+    def __init__(self):
+        self.inputs = []
+
+    async def process_input(self, user_input, on_token=None, session_id=None):
+        self.inputs.append((user_input, session_id))
+        if on_token:
+            for token in ["Hel", "lo"]:
+                on_token(token)
+                await asyncio.sleep(0)
+        return {"status": "success", "response": "Hello"}
+
+    async def handle_command(self, command):
+        return {"status": "success", "command": command}
+
+async def http(port, method, path, body=None, headers=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = json.dumps(body).encode() if body is not None else b""
+    headers = dict({"Host": "localhost"}, **(headers or {}))
+    if body is not None:
+        headers.setdefault("Content-Type", "application/json")
+    lines = [f"{method} {path} HTTP/1.1", "Connection: close", f"Content-Length: {len(data)}"]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + data)
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, payload = raw.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    header_map = dict(line.split(": ", 1) for line in head.decode().split("\r\n")[1:])
+    return status, header_map, payload
+
+def dechunk(payload):
+    out = b""
+    while True:
+        size_line, _, payload = payload.partition(b"\r\n")
+        size = int(size_line, 16)
+        if size == 0:
+            return out
+        out += payload[:size]
+        payload = payload[size + 2:]
+
+class TestAgentServer(unittest.TestCase):
+    def run_with_server(self, scenario, agent=None, **server_kwargs):
+        async def main():
+            server = AgentServer(agent or FakeAgent(), port=0, **server_kwargs)
+            await server.start()
+            try:
+                return await scenario(server.port, server.agent)
+            finally:
+                await server.close()
+        return asyncio.run(main())
+
+    def test_input_round_trip_echoes_request_id(self):
+        async def scenario(port, agent):
+            status, headers, payload = await http(port, "POST", "/v1/input",
+                                                  {"input": "hi", "session_id": "s1"},
+                                                  {"X-Request-ID": "abc"})
+            return status, headers, json.loads(payload), agent.inputs
+
+        status, headers, body, inputs = self.run_with_server(scenario)
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["X-Request-ID"], "abc")
+        self.assertEqual(body["request_id"], "abc")
+        self.assertEqual(body["result"]["response"], "Hello")
+        self.assertEqual(inputs, [("hi", "s1")])
+
+    def test_streaming_input_sends_ndjson_tokens(self):
+        async def scenario(port, agent):
+            return await http(port, "POST", "/v1/input", {"input": "hi", "stream": True})
+
+        status, headers, payload = self.run_with_server(scenario)
+        lines = [json.loads(line) for line in dechunk(payload).splitlines()]
+        self.assertEqual(status, 200)
+        self.assertEqual([line.get("token") for line in lines[:-1]], ["Hel", "lo"])
+        self.assertTrue(lines[-1]["done"])
+        self.assertEqual(lines[-1]["result"]["response"], "Hello")
+
+    def test_command_and_errors(self):
+        async def scenario(port, agent):
+            return [
+                await http(port, "POST", "/v1/command", {"command": "!status"}),
+                await http(port, "POST", "/v1/input", {}),
+                await http(port, "POST", "/v1/command", {"command": "!"}),
+                await http(port, "POST", "/v1/command", {"command": " ! "}),
+                await http(port, "GET", "/v1/input"),
+                await http(port, "GET", "/v1/nope"),
+                await http(port, "GET", "/v1/health")
+            ]
+
+        results = self.run_with_server(scenario)
+        self.assertEqual([status for status, _, _ in results], [200, 400, 400, 400, 405, 404, 200])
+        self.assertEqual(json.loads(results[0][2])["result"]["command"], "status")
+
+    def test_concurrent_clients(self):
+        async def scenario(port, agent):
+            return await asyncio.gather(*[
+                http(port, "POST", "/v1/input", {"input": f"q{i}"}) for i in range(5)])
+
+        results = self.run_with_server(scenario)
+        self.assertTrue(all(status == 200 for status, _, _ in results))
+
+    def test_interpret_does_not_block_other_clients(self):
+        def slow_execute(code):
+            time.sleep(0.5)
+            return ("success", code, "", {})
+
+        async def scenario(port, agent):
+            start = time.time()
+            slow = asyncio.ensure_future(http(port, "POST", "/v1/command", {"command": "!interpret print(1)"}))
+            await asyncio.sleep(0.05)
+            status, _, _ = await http(port, "POST", "/v1/command", {"command": "!jobs"})
+            fast_elapsed = time.time() - start
+            slow_status, _, payload = await slow
+            return status, fast_elapsed, slow_status, json.loads(payload)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            config_path = os.path.join(tmp, "config.yaml")
+            with open(config_path, "w") as f:
+                yaml.dump({"llm": {"warmup": {"enabled": False}}}, f)
+            agent = PerpetualLLM(config_path, MagicMock())
+            agent.code_interpreter = MagicMock(execute=slow_execute)
+            status, fast_elapsed, slow_status, body = self.run_with_server(scenario, agent)
+
+        self.assertEqual((status, slow_status), (200, 200))
+        self.assertLess(fast_elapsed, 0.4)
+        self.assertEqual(body["result"]["response"]["output"], "print(1)")
+
+    def test_token_required_when_set(self):
+        async def scenario(port, agent):
+            return [
+                (await http(port, "POST", "/v1/command", {"command": "status"}))[0],
+                (await http(port, "POST", "/v1/command", {"command": "status"},
+                            {"Authorization": "Bearer wrong"}))[0],
+                (await http(port, "POST", "/v1/command", {"command": "status"},
+                            {"Authorization": "Bearer s3cret"}))[0],
+                (await http(port, "GET", "/v1/health"))[0]
+            ]
+
+        self.assertEqual(self.run_with_server(scenario, token="s3cret"), [401, 401, 200, 200])
+
+    def test_browser_requests_are_rejected(self):
+        async def scenario(port, agent):
+            command = {"command": "!status"}
+            return [
+                (await http(port, "POST", "/v1/command", command, {"Content-Type": "text/plain"}))[0],
+                (await http(port, "POST", "/v1/command", command, {"Origin": "http://evil.example"}))[0],
+                (await http(port, "POST", "/v1/command", command, {"Host": "evil.example"}))[0],
+                (await http(port, "GET", "/v1/health", None, {"Host": "evil.example:8765"}))[0],
+                (await http(port, "POST", "/v1/command", command, {"Host": f"127.0.0.1:{port}"}))[0],
+                (await http(port, "POST", "/v1/command", command,
+                            {"Content-Type": "application/json; charset=utf-8"}))[0],
+                agent.commands
+            ]
+
+        agent = FakeAgent()
+        agent.commands = []
+        original = agent.handle_command
+
+        async def record(command):
+            agent.commands.append(command)
+            return await original(command)
+
+        agent.handle_command = record
+        *statuses, commands = self.run_with_server(scenario, agent)
+        self.assertEqual(statuses, [415, 403, 403, 403, 200, 200])
+        self.assertEqual(commands, ["status", "status"])
+
+    def test_non_loopback_host_needs_allow_remote_and_token(self):
+        with self.assertRaises(ValueError):
+            AgentServer(FakeAgent(), host="0.0.0.0")
+        with self.assertRaises(ValueError):
+            AgentServer(FakeAgent(), host="0.0.0.0", allow_remote=True)
+        AgentServer(FakeAgent(), host="0.0.0.0", allow_remote=True, token="s3cret")
+        AgentServer(FakeAgent(), host="localhost")
+        AgentServer(FakeAgent(), host="::1")
+
+if __name__ == '__main__':
+    unittest.main()
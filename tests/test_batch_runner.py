@@ -0,0 +1,84 @@
+import io
+import os
+import json
+import time
+import asyncio
+import tempfile
+import unittest
+import yaml
+from unittest.mock import MagicMock
+from batch_runner import BatchRunner, parse_commands
+from perpetual_llm import PerpetualLLM
+
+class FakeAgent:
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.active = 0
+        self.max_active = 0
+        self.finished = []
+
+    async def process_input(self, user_input, on_token=None, session_id=None):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(self.delays.get(user_input, 0.01))
+        self.active -= 1
+        self.finished.append(user_input)
+        if user_input == "fail":
+            return {"status": "error", "error": "boom"}
+        return {"status": "success", "response": user_input.upper()}
+
+class TestParseCommands(unittest.TestCase):
+    def test_comments_blanks_and_barriers(self):
+        groups = parse_commands(["# nightly", "a", "", "b", "---", "---", "c"])
+        self.assertEqual([[c.text for c in g] for g in groups], [["a", "b"], ["c"]])
+        self.assertEqual([c.index for g in groups for c in g], [0, 1, 2])
+        self.assertEqual(groups[1][0].line_no, 7)
+
+class TestBatchRunner(unittest.TestCase):
+    def run_batch(self, agent, lines, concurrency=4):
+        out = io.StringIO()
+        summary = asyncio.run(BatchRunner(agent, concurrency=concurrency, output=out).run(lines))
+        return summary, [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_results_are_ordered_while_running_concurrently(self):
+        agent = FakeAgent(delays={"slow": 0.1})
+        summary, records = self.run_batch(agent, ["slow", "fast1", "fast2", "fail"])
+        self.assertEqual([r["input"] for r in records], ["slow", "fast1", "fast2", "fail"])
+        self.assertEqual(agent.finished[-1], "slow")
+        self.assertEqual(summary.total, 4)
+        self.assertEqual(summary.failed, 1)
+        self.assertGreaterEqual(records[0]["latency"], 0.1)
+
+    def test_concurrency_limit(self):
+        agent = FakeAgent()
+        self.run_batch(agent, [f"c{i}" for i in range(10)], concurrency=3)
+        self.assertEqual(agent.max_active, 3)
+
+    def test_barrier_waits_for_earlier_commands(self):
+        agent = FakeAgent(delays={"slow": 0.05})
+        self.run_batch(agent, ["slow", "---", "after"])
+        self.assertEqual(agent.finished, ["slow", "after"])
+
+    def test_interpret_jobs_run_in_parallel(self):
+        def slow_execute(code):
+            time.sleep(0.3)
+            return ("success", code, "", {})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            config_path = os.path.join(tmp, "config.yaml")
+            with open(config_path, "w") as f:
+                yaml.dump({"llm": {"warmup": {"enabled": False}}}, f)
+            agent = PerpetualLLM(config_path, MagicMock())
+            agent.code_interpreter = MagicMock(execute=slow_execute)
+
+            start = time.time()
+            summary, records = self.run_batch(agent, [f"!interpret print({i})" for i in range(4)])
+            elapsed = time.time() - start
+
+        self.assertEqual(summary.failed, 0)
+        self.assertEqual([r["result"]["response"]["output"] for r in records],
+                         [f"print({i})" for i in range(4)])
+        self.assertLess(elapsed, 0.9)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import re
+import unittest
+import asyncio
+from unittest.mock import patch
+from ollama_agent import OllamaAgent
+from chunked_analysis import ChunkedAnalyzer, split_into_chunks, estimate_tokens
+
+class TestChunking(unittest.TestCase):
+    def test_chunks_respect_budget_and_keep_content(self):
+        text = "".join(f"line {i}: {'x' * 30}\n" for i in range(200))
+        chunks = split_into_chunks(text, 100)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), text)
+        for chunk in chunks:
+            self.assertLessEqual(estimate_tokens(chunk), 100)
+            self.assertTrue(chunk.endswith("\n"))
+
+    def test_long_line_is_split(self):
+        chunks = split_into_chunks("a" * 1000, 50)
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual("".join(chunks), "a" * 1000)
+
+class TestChunkedAnalyzer(unittest.TestCase):
+    def setUp(self):
+        self.agent = OllamaAgent(model="test-model", max_concurrency=2)
+        self.prompts = []
+
+    async def _fake_call(self, prompt, options=None, endpoint=None, model=None):
+        self.prompts.append(prompt)
+        await asyncio.sleep(0.01)
+        return {"response": f"summary {len(self.prompts)}"}
+
+    def test_small_output_is_a_single_call(self):
+        analyzer = ChunkedAnalyzer(self.agent, chunk_tokens=1000)
+        with patch.object(self.agent, '_make_async_api_call', self._fake_call):
+            result = asyncio.run(analyzer.analyze("short output"))
+        self.assertEqual(result, "summary 1")
+        self.assertEqual(len(self.prompts), 1)
+
+    def test_large_output_is_mapped_then_reduced(self):
+        analyzer = ChunkedAnalyzer(self.agent, chunk_tokens=50)
+        text = "".join(f"event {i} {'y' * 40}\n" for i in range(40))
+        progress = []
+
+        with patch.object(self.agent, '_make_async_api_call', self._fake_call):
+            result = asyncio.run(analyzer.analyze(text, on_progress=progress.append))
+
+        chunk_count = len(split_into_chunks(text, 50))
+        self.assertEqual(len(self.prompts), chunk_count + 1)
+        self.assertIn("Combine these part summaries", self.prompts[-1])
+        self.assertEqual(result, f"summary {chunk_count + 1}")
+        self.assertEqual(progress[-1], "combining summaries")
+        # All map calls went through the shared concurrency limit
+        self.assertEqual(self.agent.scheduler.stats["interactive"]["admitted"], chunk_count + 1)
+        self.assertEqual(self.agent.scheduler.get_stats()["active"], 0)
+
+    def test_failed_map_calls_are_retried_then_reported(self):
+        # Keep the circuit closed so the reduce call still reaches the model
+        agent = OllamaAgent(model="test-model", max_concurrency=2, failure_threshold=10)
+        analyzer = ChunkedAnalyzer(agent, chunk_tokens=50)
+        text = "".join(f"event {i} {'y' * 40}\n" for i in range(40))
+        chunk_count = len(split_into_chunks(text, 50))
+        attempts = {}
+
+        async def flaky(prompt, options=None, endpoint=None, model=None):
+            attempts[prompt] = attempts.get(prompt, 0) + 1
+            # Part 1 fails once then recovers; part 2 always fails
+            if ("part 1 of" in prompt and attempts[prompt] == 1) or "part 2 of" in prompt:
+                raise ValueError("bad response")
+            if "Combine these part summaries" in prompt:
+                self.prompts.append(prompt)
+                return {"response": "combined"}
+            return {"response": "ok summary"}
+
+        with patch.object(agent, '_make_async_api_call', flaky):
+            result = asyncio.run(analyzer.analyze(text))
+
+        reduce_prompt = self.prompts[-1]
+        self.assertNotIn(agent._api_fallback(), reduce_prompt)
+        self.assertEqual(reduce_prompt.count("ok summary"), chunk_count - 1)
+        self.assertTrue(result.startswith("combined"))
+        self.assertIn(f"[Parts 2 of {chunk_count} could not be summarized", result)
+
+    def test_failed_reduce_group_is_dropped_and_reported(self):
+        agent = OllamaAgent(model="test-model", max_concurrency=2, failure_threshold=10)
+        analyzer = ChunkedAnalyzer(agent, chunk_tokens=50, reduce_tokens=10)
+        text = "".join(f"event {i} {'y' * 40}\n" for i in range(40))
+        chunk_count = len(split_into_chunks(text, 50))
+        group_attempts = []
+
+        async def fake(prompt, options=None, endpoint=None, model=None):
+            if "Combine these part summaries" not in prompt:
+                part = re.search(r"part (\d+) of", prompt).group(1)
+                return {"response": f"summary of part {part}"}
+            if "summary of part" in prompt:
+                # The group holding parts 1 and 2 never reduces
+                if "summary of part 1\n" in prompt:
+                    group_attempts.append(prompt)
+                    raise ValueError("bad response")
+                return {"response": "combined"}
+            self.prompts.append(prompt)
+            return {"response": "final"}
+
+        with patch.object(agent, '_make_async_api_call', fake):
+            result = asyncio.run(analyzer.analyze(text))
+
+        self.assertEqual(len(group_attempts), 2)
+        final_prompt = self.prompts[-1]
+        self.assertNotIn(agent._api_fallback(), final_prompt)
+        self.assertEqual(final_prompt.count("combined"), (chunk_count + 1) // 2 - 1)
+        self.assertEqual(result, f"final\n\n[Parts 1, 2 of {chunk_count} could not be summarized "
+                                 f"and are not covered by this analysis]")
+
+    def test_failed_final_reduce_is_reported(self):
+        agent = OllamaAgent(model="test-model", max_concurrency=2, failure_threshold=10)
+        analyzer = ChunkedAnalyzer(agent, chunk_tokens=50)
+        text = "".join(f"event {i} {'y' * 40}\n" for i in range(40))
+
+        async def fake(prompt, options=None, endpoint=None, model=None):
+            if "Combine these part summaries" in prompt:
+                raise ValueError("bad response")
+            return {"response": "ok summary"}
+
+        with patch.object(agent, '_make_async_api_call', fake):
+            result = asyncio.run(analyzer.analyze(text))
+
+        self.assertTrue(result.startswith("Analysis failed"))
+        self.assertNotIn(agent._api_fallback(), result)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import os
+import asyncio
+import threading
+import tempfile
+import unittest
+import yaml
+from unittest.mock import AsyncMock, MagicMock, patch
+from command_cache import CommandCache
+from perpetual_llm import PerpetualLLM
+
+class TestCommandCache(unittest.TestCase):
+    def test_hit_expiry_and_invalidation(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return {"status": "success", "n": len(calls)}
+
+        async def scenario():
+            cache = CommandCache(ttl=0.05)
+            first = await cache.get_or_compute("status", compute, events=("error",))
+            second = await cache.get_or_compute("status", compute, events=("error",))
+            self.assertEqual(cache.invalidate("config_reload"), 0)
+            third = await cache.get_or_compute("status", compute, events=("error",))
+            self.assertEqual(cache.invalidate("error"), 1)
+            fourth = await cache.get_or_compute("status", compute, events=("error",))
+            await asyncio.sleep(0.06)
+            fifth = await cache.get_or_compute("status", compute, events=("error",))
+            return [first, second, third, fourth, fifth], cache.stats
+
+        results, stats = asyncio.run(scenario())
+        self.assertEqual([r[1] for r in results], [False, True, True, False, False])
+        self.assertEqual([r[0]["n"] for r in results], [1, 1, 1, 2, 3])
+        self.assertEqual(stats["expirations"], 1)
+
+    def test_concurrent_calls_share_one_computation(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"status": "success"}
+
+        async def scenario():
+            cache = CommandCache()
+            return await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(5)))
+
+        results = asyncio.run(scenario())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(hit for _, hit in results), [False, True, True, True, True])
+
+    def test_result_invalidated_during_computation_is_not_stored(self):
+        async def scenario():
+            cache = CommandCache()
+
+            async def compute():
+                cache.invalidate("file_change")
+                return {"status": "success"}
+
+            await cache.get_or_compute("k", compute, events=("file_change",))
+            return len(cache)
+
+        self.assertEqual(asyncio.run(scenario()), 0)
+
+    def test_rejected_results_are_not_stored(self):
+        async def scenario():
+            cache = CommandCache()
+
+            async def compute():
+                return {"status": "error"}
+
+            await cache.get_or_compute("k", compute, store_if=lambda r: r["status"] == "success")
+            return len(cache)
+
+        self.assertEqual(asyncio.run(scenario()), 0)
+
+    def test_invalidation_from_another_thread_runs_on_the_loop(self):
+        async def compute():
+            return {"status": "success"}
+
+        async def scenario():
+            cache = CommandCache()
+            await cache.get_or_compute("k", compute, events=("error",))
+            applied_in = []
+            original = cache._invalidate
+
+            def record(event):
+                applied_in.append(threading.current_thread())
+                return original(event)
+
+            cache._invalidate = record
+            worker = threading.Thread(target=cache.invalidate, args=("error",))
+            worker.start()
+            worker.join()
+            before = len(cache)
+            await asyncio.sleep(0)
+            return before, len(cache), applied_in
+
+        before, after, applied_in = asyncio.run(scenario())
+        self.assertEqual((before, after), (1, 0))
+        self.assertEqual(applied_in, [threading.main_thread()])
+
+class TestAgentCommandCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.tmp.name, "config.yaml")
+        with open(self.config_path, "w") as f:
+            yaml.dump({"llm": {"warmup": {"enabled": False}}, "command_cache": {"ttl": 60}}, f)
+        self.agent = PerpetualLLM(self.config_path, MagicMock())
+        self.agent.ollama = MagicMock()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_input(self, text):
+        return asyncio.run(self.agent.process_input(text))
+
+    def test_status_is_cached_until_an_error(self):
+        first = self.run_input("!status")
+        second = self.run_input("!status")
+        self.assertNotIn("cached", first)
+        self.assertTrue(second["cached"])
+
+        self.run_input("!no_such_command")
+        self.assertNotIn("cached", self.run_input("!status"))
+
+    def test_uncached_commands_and_actions(self):
+        self.run_input("!analyze dependencies")
+        self.assertNotIn("cached", self.run_input("!analyze dependencies"))
+        self.run_input("!analyze health")
+        self.assertTrue(self.run_input("!analyze health")["cached"])
+
+    def test_empty_command_is_an_error(self):
+        for text in ("!", "! "):
+            self.assertEqual(self.run_input(text), {"status": "error", "error": "Empty command"})
+
+    def test_free_text_uses_response_cache_only_when_enabled(self):
+        self.agent.ollama = MagicMock(cascade_model=None, generate_response=AsyncMock(return_value="answer"))
+        self.run_input("disk usage?")
+        self.agent.config["llm"]["cache"] = {"prompts": True}
+        self.run_input("disk usage?")
+        self.assertEqual([c.kwargs["use_cache"] for c in self.agent.ollama.generate_response.call_args_list],
+                         [False, True])
+
+    def test_config_reload_invalidates_help(self):
+        self.run_input("!help")
+        self.assertTrue(self.run_input("!help")["cached"])
+        self.assertEqual(self.run_input("!reload")["status"], "success")
+        self.assertNotIn("cached", self.run_input("!help"))
+
+    def test_critical_file_change_invalidates_diagnostics(self):
+        fingerprints = iter([("a",), ("a",), ("b",)])
+        with patch.object(self.agent.integrity_checker, "fingerprint", side_effect=lambda paths: next(fingerprints)), \
+                patch.object(self.agent, "verify_file_integrity", return_value=True) as verify:
+            self.agent.rsi_module = MagicMock()
+            self.run_input("!consider_self integrity")
+            self.assertTrue(self.run_input("!consider_self integrity")["cached"])
+            self.assertNotIn("cached", self.run_input("!consider_self integrity"))
+        self.assertEqual(verify.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
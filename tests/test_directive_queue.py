@@ -0,0 +1,97 @@
+import random
+import threading
+import unittest
+from collections import Counter
+from core.directive_queue import AliasTable, DirectiveQueue
+
+WEIGHTS = {"Critical": 0.5, "High": 0.3, "Moderate": 0.15, "Peripheral": 0.05}
+
+class TestAliasTable(unittest.TestCase):
+    def test_sampling_follows_weights(self):
+        rng = random.Random(1)
+        table = AliasTable(["a", "b", "c"], [6, 3, 1])
+        counts = Counter(table.sample(rng) for _ in range(20000))
+        self.assertAlmostEqual(counts["a"] / 20000, 0.6, delta=0.02)
+        self.assertAlmostEqual(counts["c"] / 20000, 0.1, delta=0.02)
+
+class TestDirectiveQueue(unittest.TestCase):
+    def test_fifo_within_layer(self):
+        queue = DirectiveQueue(WEIGHTS, seed=0)
+        for i in range(3):
+            queue.put(f"d{i}", "High")
+        self.assertEqual([queue.get() for _ in range(3)], [("High", "d0"), ("High", "d1"), ("High", "d2")])
+        self.assertIsNone(queue.get())
+
+    def test_only_non_empty_layers_are_selected(self):
+        queue = DirectiveQueue(WEIGHTS, seed=0)
+        for i in range(100):
+            queue.put(i, "Peripheral")
+        queue.put("x", "Critical")
+        priorities = [queue.get()[0] for _ in range(101)]
+        self.assertEqual(priorities.count("Critical"), 1)
+        self.assertEqual(len(queue), 0)
+
+    def test_weighted_dispatch_and_reweighting(self):
+        queue = DirectiveQueue(WEIGHTS, seed=42)
+        for priority in WEIGHTS:
+            for i in range(5000):
+                queue.put(i, priority)
+        counts = Counter(queue.get()[0] for _ in range(4000))
+        self.assertGreater(counts["Critical"], counts["High"])
+        self.assertGreater(counts["High"], counts["Peripheral"])
+
+        queue.set_weights({"Critical": 0.01, "Peripheral": 10.0})
+        counts = Counter(queue.get()[0] for _ in range(500))
+        self.assertGreater(counts["Peripheral"], 400)
+
+    def test_zero_weight_layers_are_served_in_priority_order(self):
+        queue = DirectiveQueue(WEIGHTS, seed=0)
+        queue.set_weights({"High": 0.0, "Moderate": 0.0})
+        queue.put("m", "Moderate")
+        queue.put("h", "High")
+        self.assertEqual([queue.get(), queue.get()], [("High", "h"), ("Moderate", "m")])
+
+    def test_put_front_peek_drain(self):
+        queue = DirectiveQueue(WEIGHTS)
+        queue.put("b", "Moderate")
+        queue.put("low", "Peripheral")
+        queue.put_front("a", "Moderate")
+        self.assertEqual(queue.peek("Moderate"), "a")
+        self.assertEqual(queue.sizes()["Moderate"], 2)
+        self.assertEqual(queue.drain(), [("Moderate", "a"), ("Moderate", "b"), ("Peripheral", "low")])
+        self.assertFalse(queue)
+        with self.assertRaises(ValueError):
+            queue.put("x", "Urgent")
+
+    def test_concurrent_producers_and_consumers(self):
+        queue = DirectiveQueue(WEIGHTS)
+        taken = []
+        lock = threading.Lock()
+
+        def produce(priority):
+            for i in range(2000):
+                queue.put(i, priority)
+
+        def consume():
+            while True:
+                item = queue.get()
+                if item is None:
+                    return
+                with lock:
+                    taken.append(item)
+
+        producers = [threading.Thread(target=produce, args=(p,)) for p in WEIGHTS]
+        for t in producers:
+            t.start()
+        for t in producers:
+            t.join()
+        consumers = [threading.Thread(target=consume) for _ in range(4)]
+        for t in consumers:
+            t.start()
+        for t in consumers:
+            t.join()
+        self.assertEqual(len(taken), 8000)
+        self.assertEqual(len(queue), 0)
+
+if __name__ == '__main__':
+    unittest.main()
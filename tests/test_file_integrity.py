@@ -0,0 +1,94 @@
+import os
+import time
+import hashlib
+import tempfile
+import unittest
+from unittest.mock import patch
+from file_integrity import FileIntegrityChecker
+from memory_manager import MemoryManager
+
+class FakeMemory:
+    def __init__(self):
+        self.hashes = {}
+        self.queries = 0
+
+    def get_hash(self, path):
+        self.queries += 1
+        return self.hashes.get(path)
+
+    def get_hashes(self, paths):
+        self.queries += 1
+        return {path: self.hashes.get(path) for path in paths}
+
+    def store_hash(self, path, value):
+        self.hashes[path] = value
+
+class TestFileIntegrityChecker(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.dir.name, f"f{i}.py")
+            with open(path, "w") as f:
+                f.write(f"print({i})\n" * 1000)
+            self.paths.append(path)
+        self.memory = FakeMemory()
+        self.checker = FileIntegrityChecker(self.memory, chunk_size=1024)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_first_check_stores_baseline_with_one_query(self):
+        results = self.checker.check(self.paths)
+        self.assertTrue(all(r["status"] == "ok" for r in results.values()))
+        self.assertEqual(self.memory.queries, 1)
+        with open(self.paths[0], "rb") as f:
+            self.assertEqual(self.memory.hashes[self.paths[0]], hashlib.sha256(f.read()).hexdigest())
+
+    def test_unchanged_files_are_not_rehashed(self):
+        self.checker.check(self.paths)
+        with patch.object(self.checker, "hash_file", side_effect=AssertionError("rehashed")):
+            results = self.checker.check(self.paths)
+        self.assertTrue(all(r["status"] == "ok" for r in results.values()))
+        self.assertEqual(self.checker.stats["cache_hits"], 3)
+
+    def test_modified_and_missing_files(self):
+        self.checker.check(self.paths)
+        with open(self.paths[1], "a") as f:
+            f.write("tampered\n")
+        os.remove(self.paths[2])
+
+        results = self.checker.check(self.paths)
+        self.assertEqual([results[p]["status"] for p in self.paths], ["ok", "modified", "missing"])
+        self.assertEqual(self.checker.stats["hashed"], 4)
+
+    def test_same_size_rewrite_with_restored_mtime_is_detected(self):
+        self.checker.check(self.paths)
+        st = os.stat(self.paths[0])
+        time.sleep(0.02)  # Let the ctime clock move on
+        with open(self.paths[0], "r+") as f:
+            f.write("PRINT")
+        os.utime(self.paths[0], ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertEqual(os.stat(self.paths[0]).st_size, st.st_size)
+
+        results = self.checker.check(self.paths)
+        self.assertEqual([results[p]["status"] for p in self.paths], ["modified", "ok", "ok"])
+
+    def test_unreadable_file_is_a_read_error(self):
+        with patch.object(self.checker, "hash_file", side_effect=OSError("denied")):
+            results = self.checker.check(self.paths[:1])
+        self.assertEqual(results[self.paths[0]]["status"], "read_error")
+
+class TestGetHashes(unittest.TestCase):
+    def test_single_query_lookup(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            manager = MemoryManager(os.path.join(tmp, "memory.db"))
+            manager.store_hash("a.py", "aaa")
+            manager.store_hash("b.py", "bbb")
+            self.assertEqual(manager.get_hashes(["a.py", "b.py", "c.py"]),
+                             {"a.py": "aaa", "b.py": "bbb", "c.py": None})
+            self.assertEqual(manager.get_hashes([]), {})
+            manager.conn.close()
+
+if __name__ == '__main__':
+    unittest.main()
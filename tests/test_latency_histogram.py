@@ -0,0 +1,58 @@
+import unittest
+from monitoring.latency_histogram import LatencyHistogram, LatencyRecorder, WindowedLatencyHistogram
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_empty(self):
+        histogram = LatencyHistogram()
+        self.assertIsNone(histogram.percentile(99))
+        self.assertEqual(histogram.to_dict()["count"], 0)
+
+    def test_percentiles_within_bucket_width(self):
+        histogram = LatencyHistogram()
+        for i in range(1, 101):
+            histogram.record(i / 100)
+
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.mean, 0.505)
+        self.assertAlmostEqual(histogram.percentile(50), 0.5, delta=0.05)
+        self.assertAlmostEqual(histogram.percentile(99), 0.99, delta=0.1)
+        # Never reported above the largest observed value
+        self.assertEqual(histogram.percentile(100), 1.0)
+
+    def test_values_outside_range(self):
+        histogram = LatencyHistogram(min_value=0.01, max_value=1.0)
+        histogram.record(0.0001)
+        histogram.record(50.0)
+        self.assertEqual(histogram.percentile(1), 0.01)
+        self.assertEqual(histogram.percentile(100), 50.0)
+
+        histogram.reset()
+        self.assertEqual(histogram.count, 0)
+
+class TestWindowedLatency(unittest.TestCase):
+    def test_window_forgets_old_samples(self):
+        histogram = WindowedLatencyHistogram(window=60, slices=6)
+        histogram.record(5.0, now=1000)
+        histogram.record(0.1, now=1050)
+        self.assertEqual(histogram.snapshot(now=1050).count, 2)
+        recent = histogram.snapshot(now=1075)
+        self.assertEqual(recent.count, 1)
+        self.assertEqual(recent.max, 0.1)
+
+    def test_recorder_summaries_per_key(self):
+        recorder = LatencyRecorder({"1m": 60})
+        for i in range(1, 101):
+            recorder.record("interpret", i / 100, now=1000)
+        recorder.record("status", 0.002, now=1000)
+        recorder.record("status", 9.0, now=500)
+
+        report = recorder.to_dict(now=1000)
+        self.assertEqual(list(report), ["interpret", "status"])
+        self.assertAlmostEqual(report["interpret"]["lifetime"]["p90"], 0.9, delta=0.09)
+        self.assertEqual(report["interpret"]["lifetime"]["max"], 1.0)
+        self.assertEqual(report["status"]["lifetime"]["count"], 2)
+        self.assertEqual(report["status"]["1m"]["count"], 1)
+        self.assertEqual(report["status"]["1m"]["max"], 0.002)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import time
+import asyncio
+import tempfile
+import threading
+import unittest
+import yaml
+from unittest.mock import MagicMock, patch
+import perpetual_llm
+from perpetual_llm import PerpetualLLM
+
+class TestLazyComponents(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.tmp.name, "config.yaml")
+        with open(self.config_path, "w") as f:
+            yaml.dump({"llm": {"warmup": {"enabled": False}}}, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_heavy_components_are_not_built_at_startup(self):
+        with patch.object(perpetual_llm, "SandboxExecutor") as sandbox_cls, \
+                patch.object(perpetual_llm, "HITLInterface") as hitl_cls:
+            agent = PerpetualLLM(self.config_path, MagicMock())
+            sandbox_cls.assert_not_called()
+            hitl_cls.assert_not_called()
+            report = agent.startup_report()
+            self.assertIn("init", report["timings"])
+            self.assertEqual(set(report["pending"]), {"sandbox", "hitl", "rsi_module", "ollama", "analyzer"})
+
+            self.assertIs(agent.hitl, agent.hitl)
+            hitl_cls.assert_called_once()
+            self.assertIn("hitl", agent.startup_report()["timings"])
+
+    def test_sandbox_failure_does_not_block_other_components(self):
+        with patch.object(perpetual_llm, "SandboxExecutor", side_effect=RuntimeError("docker down")):
+            agent = PerpetualLLM(self.config_path, MagicMock())
+            rsi = agent.rsi_module
+            self.assertIsNone(rsi.sandbox)
+            self.assertEqual(agent.component_errors, {"sandbox": "docker down"})
+            with self.assertRaises(RuntimeError):
+                agent.sandbox
+
+    def test_prewarm_and_cleanup(self):
+        with patch.object(perpetual_llm, "HITLInterface") as hitl_cls:
+            agent = PerpetualLLM(self.config_path, MagicMock())
+            agent.prewarm(["hitl"]).join(5)
+            self.assertTrue(agent.is_initialized("hitl"))
+
+            agent.cleanup()
+            hitl_cls.return_value.stop.assert_called_once()
+            # Cleanup must not construct components that were never used
+            self.assertFalse(agent.is_initialized("rsi_module"))
+            self.assertFalse(agent.is_initialized("ollama"))
+
+    def test_prompt_does_not_wait_for_model_warmup(self):
+        agent = PerpetualLLM(self.config_path, MagicMock())
+
+        def slow_warmup():
+            time.sleep(0.5)
+            agent.warmup_report = [{"model": "m", "endpoint": "e", "status": "ok", "load_duration": 0.5}]
+
+        agent._warmup_thread = threading.Thread(target=slow_warmup, daemon=True)
+        prompted = []
+
+        async def first_prompt(prompt=""):
+            prompted.append(time.time())
+            raise EOFError
+
+        with patch.object(perpetual_llm, "async_input", first_prompt), \
+                patch.object(agent, "_start_monitors"):
+            start = time.time()
+            agent._warmup_thread.start()
+            asyncio.run(agent.run_async())
+
+        self.assertLess(prompted[0] - start, 0.3)
+        # The warm-up report is still collected in the background
+        self.assertFalse(agent._warmup_thread.is_alive())
+
+if __name__ == '__main__':
+    unittest.main()
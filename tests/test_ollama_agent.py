@@ -0,0 +1,715 @@
+import unittest
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+from ollama_agent import (OllamaAgent, LLMScheduler, RequestPriority, OllamaEndpoint, EndpointRouter,
+                          StreamInterruptedError, TRUNCATION_MARKER)
+from resilience.circuit_breaker import CircuitState
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+def fake_stream(tokens, eval_count=None):
+    """Build a replacement for OllamaAgent._stream_api_call"""
+    async def stream(prompt, options=None, endpoint=None):
+        for token in tokens:
+            yield {"response": token, "done": False}
+        final = {"response": "", "done": True}
+        if eval_count is not None:
+            final["eval_count"] = eval_count
+        yield final
+    return stream
+
+class TestOllamaStreaming(unittest.TestCase):
+    def setUp(self):
+        self.agent = OllamaAgent(model="test-model", failure_threshold=1, recovery_timeout=60)
+
+    async def _collect(self, prompt):
+        return [token async for token in self.agent.stream_response(prompt)]
+
+    def test_tokens_arrive_in_order(self):
+        with patch.object(self.agent, '_stream_api_call', fake_stream(["Hel", "lo", "!"], eval_count=3)):
+            tokens = asyncio.run(self._collect("hi"))
+
+        self.assertEqual(tokens, ["Hel", "lo", "!"])
+        stats = self.agent.generation_stats[-1]
+        self.assertTrue(stats.streamed)
+        self.assertEqual(stats.token_count, 3)
+        self.assertIsNotNone(stats.time_to_first_token)
+        self.assertLessEqual(stats.time_to_first_token, stats.duration)
+
+    def test_stream_error_opens_circuit(self):
+        async def failing(prompt, options=None, endpoint=None):
+            raise RuntimeError("boom")
+            yield  # pragma: no cover
+
+        with patch.object(self.agent, '_stream_api_call', failing):
+            tokens = asyncio.run(self._collect("hi"))
+        self.assertEqual(tokens, [self.agent._api_fallback()])
+        self.assertEqual(self.agent.circuit_breaker.state, CircuitState.OPEN)
+
+        # While open, the fallback text is streamed without calling the API
+        with patch.object(self.agent, '_stream_api_call') as mock_stream:
+            tokens = asyncio.run(self._collect("hi"))
+        mock_stream.assert_not_called()
+        self.assertEqual(tokens, [self.agent._api_fallback()])
+
+    def test_stream_failing_midway_is_truncated_not_padded_with_fallback(self):
+        async def breaks(prompt, options=None, endpoint=None):
+            yield {"response": "Hello ", "done": False}
+            yield {"response": "wor", "done": False}
+            raise ConnectionError("connection reset")
+
+        async def collect():
+            tokens = []
+            with self.assertRaises(StreamInterruptedError):
+                async for token in self.agent.stream_response("hi"):
+                    tokens.append(token)
+            return tokens
+
+        with patch.object(self.agent, '_stream_api_call', breaks):
+            tokens = asyncio.run(collect())
+        self.assertEqual(tokens, ["Hello ", "wor", TRUNCATION_MARKER])
+        self.assertNotIn(self.agent._api_fallback(), "".join(tokens))
+
+class TestOllamaTransport(unittest.TestCase):
+    def setUp(self):
+        self.agent = OllamaAgent(model="test-model", max_concurrency=5)
+
+    def test_concurrent_requests_do_not_block_loop(self):
+        async def slow_post(url, payload, timeout=None):
+            await asyncio.sleep(0.2)
+            return {"response": payload["prompt"].upper(), "eval_count": 1}
+
+        async def run_many():
+            return await asyncio.gather(*(self.agent.generate_response(f"p{i}") for i in range(5)))
+
+        with patch.object(self.agent.transport, 'post_json', slow_post):
+            start = time.time()
+            responses = asyncio.run(run_many())
+            elapsed = time.time() - start
+
+        self.assertEqual(responses, [f"P{i}" for i in range(5)])
+        self.assertLess(elapsed, 0.6)
+
+    @unittest.skipIf(aiohttp is None, "aiohttp not installed")
+    def test_session_is_closed_with_its_loop(self):
+        transport = self.agent.transport
+
+        async def use_session():
+            session = transport._get_session()
+            await asyncio.sleep(0)
+            return session
+
+        first = asyncio.run(use_session())
+        second = asyncio.run(use_session())
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+        self.assertTrue(second.closed)
+        self.assertEqual(transport._sessions, {})
+
+    @unittest.skipIf(aiohttp is None, "aiohttp not installed")
+    def test_each_running_loop_keeps_its_own_session(self):
+        transport = self.agent.transport
+        ready, release = threading.Event(), threading.Event()
+        sessions = {}
+
+        async def hold_session():
+            sessions["thread"] = transport._get_session()
+            ready.set()
+            await asyncio.to_thread(release.wait)
+
+        worker = threading.Thread(target=asyncio.run, args=(hold_session(),))
+        worker.start()
+        ready.wait()
+
+        async def main():
+            sessions["main"] = transport._get_session()
+            # The other loop's session is still open and in use
+            self.assertFalse(sessions["thread"].closed)
+            release.set()
+            await asyncio.to_thread(worker.join)
+            await transport.close()
+
+        asyncio.run(main())
+        self.assertTrue(sessions["thread"].closed)
+        self.assertTrue(sessions["main"].closed)
+
+    def test_blocking_fallback_runs_in_thread(self):
+        agent = OllamaAgent(model="test-model", use_async_transport=False, max_concurrency=3)
+        self.assertFalse(agent.transport.use_async)
+
+        def blocking_post(url, payload, timeout=None):
+            time.sleep(0.2)
+            return {"response": "ok"}
+
+        async def run_many():
+            return await asyncio.gather(*(agent.generate_response(f"p{i}") for i in range(3)))
+
+        with patch.object(agent.transport, 'post_json_blocking', blocking_post):
+            start = time.time()
+            responses = asyncio.run(run_many())
+            elapsed = time.time() - start
+
+        self.assertEqual(responses, ["ok"] * 3)
+        self.assertLess(elapsed, 0.5)
+
+class TestRequestCoalescing(unittest.TestCase):
+    def setUp(self):
+        self.agent = OllamaAgent(model="test-model")
+        self.calls = []
+
+    async def _slow_call(self, prompt, options=None, endpoint=None, model=None):
+        self.calls.append(prompt)
+        await asyncio.sleep(0.1)
+        return {"response": f"answer to {prompt}"}
+
+    def test_identical_requests_share_one_call(self):
+        async def scenario():
+            return await asyncio.gather(
+                self.agent.generate_response("same"),
+                self.agent.generate_response("same"),
+                self.agent.generate_response("other"),
+                self.agent.generate_response("same"),
+            )
+
+        with patch.object(self.agent, '_make_async_api_call', self._slow_call):
+            results = asyncio.run(scenario())
+
+        self.assertEqual(results, ["answer to same", "answer to same", "answer to other", "answer to same"])
+        self.assertEqual(sorted(self.calls), ["other", "same"])
+        self.assertEqual(self.agent.coalescing_stats["coalesced_requests"], 2)
+        self.assertEqual(self.agent._inflight, {})
+
+    def test_late_stream_subscriber_replays_tokens(self):
+        async def slow_stream(prompt, options=None, endpoint=None):
+            self.calls.append(prompt)
+            for token in ["a", "b", "c"]:
+                await asyncio.sleep(0.05)
+                yield {"response": token, "done": False}
+            yield {"response": "", "done": True}
+
+        async def consume(delay):
+            await asyncio.sleep(delay)
+            return [t async for t in self.agent.stream_response("same")]
+
+        async def whole_text(delay):
+            await asyncio.sleep(delay)
+            return await self.agent.generate_response("same")
+
+        async def scenario():
+            return await asyncio.gather(consume(0), consume(0.07), whole_text(0.02))
+
+        with patch.object(self.agent, '_stream_api_call', slow_stream):
+            first, late, whole = asyncio.run(scenario())
+
+        self.assertEqual(first, ["a", "b", "c"])
+        self.assertEqual(late, ["a", "b", "c"])
+        self.assertEqual(whole, "abc")
+        self.assertEqual(len(self.calls), 1)
+
+    def test_abandoned_flight_is_cancelled(self):
+        cancelled = []
+
+        async def endless_stream(prompt, options=None, endpoint=None):
+            try:
+                while True:
+                    await asyncio.sleep(0.01)
+                    yield {"response": "x", "done": False}
+            except asyncio.CancelledError:
+                cancelled.append(prompt)
+                raise
+
+        async def scenario():
+            async for _ in self.agent.stream_response("loop"):
+                break
+            await asyncio.sleep(0.05)
+
+        with patch.object(self.agent, '_stream_api_call', endless_stream):
+            asyncio.run(scenario())
+        self.assertEqual(cancelled, ["loop"])
+
+class TestLLMScheduler(unittest.TestCase):
+    def test_interactive_admitted_before_queued_background(self):
+        scheduler = LLMScheduler(max_concurrency=1, aging_interval=60)
+        order = []
+
+        async def job(name, priority, delay):
+            await asyncio.sleep(delay)
+            async with scheduler.slot(scheduler.ticket(priority)):
+                order.append(name)
+                await asyncio.sleep(0.05)
+
+        async def scenario():
+            await asyncio.gather(
+                job("running", RequestPriority.BATCH, 0),
+                job("batch", RequestPriority.BATCH, 0.01),
+                job("background", RequestPriority.BACKGROUND, 0.01),
+                job("interactive", RequestPriority.INTERACTIVE, 0.02),
+            )
+
+        asyncio.run(scenario())
+        self.assertEqual(order, ["running", "interactive", "background", "batch"])
+        stats = scheduler.get_stats()
+        self.assertEqual(stats["active"], 0)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(stats["classes"]["batch"]["admitted"], 2)
+        self.assertGreater(stats["classes"]["batch"]["max_wait"], 0)
+
+    def test_aging_prevents_starvation(self):
+        scheduler = LLMScheduler(max_concurrency=1, aging_interval=0.01)
+        old = scheduler.ticket(RequestPriority.BATCH)
+        old.enqueued_at -= 1.0
+        fresh = scheduler.ticket(RequestPriority.INTERACTIVE)
+        now = time.time()
+        self.assertLess(scheduler._effective_priority(old, now), scheduler._effective_priority(fresh, now))
+
+    def test_cancelled_waiter_releases_queue(self):
+        scheduler = LLMScheduler(max_concurrency=1)
+
+        async def scenario():
+            await scheduler.acquire(scheduler.ticket(RequestPriority.BATCH))
+            waiter = asyncio.ensure_future(scheduler.acquire(scheduler.ticket(RequestPriority.BATCH)))
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            scheduler.release()
+
+        asyncio.run(scenario())
+        self.assertEqual(scheduler.get_stats()["active"], 0)
+        self.assertEqual(scheduler.get_stats()["queue_depth"], 0)
+
+class TestChatSessions(unittest.TestCase):
+    def setUp(self):
+        self.agent = OllamaAgent(model="test-model", session_max_messages=4)
+        self.sent = []
+
+    async def _fake_chat(self, messages, options=None, endpoint=None):
+        self.sent.append([m["content"] for m in messages])
+        reply = f"reply {len(self.sent)}"
+        yield {"message": {"role": "assistant", "content": reply}, "done": False}
+        yield {"message": {"role": "assistant", "content": ""}, "done": True,
+               "prompt_eval_count": 7, "eval_count": 1}
+
+    def test_history_is_kept_and_trimmed(self):
+        session_id = self.agent.create_session(system_prompt="be brief")
+
+        async def scenario():
+            return [await self.agent.chat(session_id, f"q{i}") for i in range(3)]
+
+        with patch.object(self.agent, '_chat_stream_api_call', self._fake_chat):
+            replies = asyncio.run(scenario())
+
+        self.assertEqual(replies, ["reply 1", "reply 2", "reply 3"])
+        self.assertEqual(self.sent[1], ["be brief", "q0", "reply 1", "q1"])
+        # Past the limit of 4, history is cut back to the system prompt and the last turn
+        self.assertEqual(self.sent[2], ["be brief", "q1", "reply 2", "q2"])
+        session = self.agent.sessions.get(session_id)
+        self.assertEqual([m["content"] for m in session.messages], ["be brief", "q2", "reply 3"])
+        self.assertEqual(session.last_prompt_eval_count, 7)
+
+    def test_trim_with_tiny_limit_keeps_the_last_turn(self):
+        agent = OllamaAgent(model="test-model", session_max_messages=2)
+        session_id = agent.create_session(system_prompt="be brief")
+
+        async def scenario():
+            for i in range(3):
+                await agent.chat(session_id, f"q{i}")
+
+        with patch.object(agent, '_chat_stream_api_call', self._fake_chat):
+            asyncio.run(scenario())
+
+        self.assertEqual(self.sent[1:], [["be brief", "q0", "reply 1", "q1"],
+                                         ["be brief", "q1", "reply 2", "q2"]])
+        self.assertEqual(agent.sessions.stats["trimmed"], 3)
+
+    def test_failed_turn_is_not_recorded(self):
+        async def failing(messages, options=None, endpoint=None):
+            raise RuntimeError("down")
+            yield  # pragma: no cover
+
+        with patch.object(self.agent, '_chat_stream_api_call', failing):
+            reply = asyncio.run(self.agent.chat("s1", "hello"))
+        self.assertEqual(reply, self.agent._api_fallback())
+        self.assertEqual(self.agent.sessions.get("s1").messages, [])
+
+    def test_idle_and_size_eviction(self):
+        agent = OllamaAgent(model="test-model", max_sessions=2, session_idle_timeout=60)
+        for name in ["a", "b", "c"]:
+            agent.create_session(name)
+        self.assertIsNone(agent.sessions.get("a"))
+
+        agent.sessions.get("b").last_used -= 120
+        self.assertIsNone(agent.sessions.get("b"))
+        self.assertIsNotNone(agent.sessions.get("c"))
+        stats = agent.sessions.get_stats()
+        self.assertEqual((stats["evicted_size"], stats["evicted_idle"], stats["active"]), (1, 1, 1))
+
+    def test_size_eviction_skips_session_mid_turn(self):
+        agent = OllamaAgent(model="test-model", max_sessions=1)
+        second_turn = []
+
+        async def slow_chat(messages, options=None, endpoint=None):
+            second_turn.append([m["content"] for m in messages])
+            await asyncio.sleep(0.05)
+            yield {"message": {"role": "assistant", "content": "answer"}, "done": True}
+
+        async def scenario():
+            turn = asyncio.ensure_future(agent.chat("busy", "first"))
+            await asyncio.sleep(0.01)
+            # A new session overflows the store while "busy" holds its lock
+            agent.create_session("other")
+            self.assertIsNotNone(agent.sessions._sessions.get("busy"))
+            await turn
+            await agent.chat("busy", "second")
+
+        with patch.object(agent, '_chat_stream_api_call', slow_chat):
+            asyncio.run(scenario())
+        self.assertEqual(second_turn[-1], ["first", "answer", "second"])
+
+    def test_reply_failing_midway_is_truncated(self):
+        async def breaks(messages, options=None, endpoint=None):
+            yield {"message": {"role": "assistant", "content": "Hello wor"}, "done": False}
+            raise ConnectionError("connection reset")
+
+        async def collect():
+            tokens = []
+            with self.assertRaises(StreamInterruptedError):
+                async for token in self.agent.stream_chat("s1", "hello"):
+                    tokens.append(token)
+            return tokens
+
+        with patch.object(self.agent, '_chat_stream_api_call', breaks):
+            tokens = asyncio.run(collect())
+        self.assertEqual(tokens, ["Hello wor", TRUNCATION_MARKER])
+        self.assertEqual(self.agent.sessions.get("s1").messages, [])
+
+class TestEndpointRouting(unittest.TestCase):
+    def setUp(self):
+        self.agent = OllamaAgent(model="test-model", failure_threshold=1, recovery_timeout=60,
+                                 endpoints=["http://a:11434", "http://b:11434/"])
+
+    def test_router_prefers_least_loaded_fastest(self):
+        fast, slow = OllamaEndpoint("http://fast"), OllamaEndpoint("http://slow")
+        fast.record_success(0.1)
+        slow.record_success(1.0)
+        router = EndpointRouter([slow, fast])
+        self.assertEqual(router.candidates()[0], fast)
+
+        # Enough queued work on the fast host makes the slow one cheaper
+        fast.outstanding = 20
+        self.assertEqual(router.candidates()[0], slow)
+
+    def test_failover_to_healthy_endpoint(self):
+        calls = []
+
+        async def call(prompt, options=None, endpoint=None, model=None):
+            calls.append(endpoint.base_url)
+            if endpoint.base_url == "http://a:11434":
+                raise ConnectionError("down")
+            return {"response": "from b", "eval_count": 1}
+
+        with patch.object(self.agent, '_make_async_api_call', call):
+            first = asyncio.run(self.agent.generate_response("hi"))
+            second = asyncio.run(self.agent.generate_response("again"))
+
+        self.assertEqual((first, second), ("from b", "from b"))
+        # The failed host's circuit opened, so the second request skips it
+        self.assertEqual(calls, ["http://a:11434", "http://b:11434", "http://b:11434"])
+        endpoints = self.agent.get_metrics()["endpoints"]
+        self.assertEqual([e["state"] for e in endpoints], ["OPEN", "CLOSED"])
+
+    def test_stream_fails_over_before_first_token(self):
+        async def stream(prompt, options=None, endpoint=None):
+            if endpoint.base_url == "http://a:11434":
+                raise ConnectionError("down")
+            yield {"response": "ok", "done": True}
+
+        async def collect():
+            return [token async for token in self.agent.stream_response("hi")]
+
+        with patch.object(self.agent, '_stream_api_call', stream):
+            self.assertEqual(asyncio.run(collect()), ["ok"])
+
+    def test_all_endpoints_down_returns_fallback(self):
+        async def call(prompt, options=None, endpoint=None, model=None):
+            raise ConnectionError("down")
+
+        with patch.object(self.agent, '_make_async_api_call', call):
+            reply = asyncio.run(self.agent.generate_response("hi"))
+        self.assertEqual(reply, self.agent._api_fallback())
+        self.assertFalse(self.agent.router.has_available())
+
+class TestAdaptiveTimeouts(unittest.TestCase):
+    def test_timeout_follows_latency_histogram(self):
+        agent = OllamaAgent(model="test-model", timeout=30, timeout_factor=3.0, min_timeout=0.5)
+        self.assertEqual(agent.timeouts.timeout_for("test-model", 100), 30)
+
+        for _ in range(20):
+            agent.timeouts.record("test-model", 1.0, prompt_size=100)
+        self.assertAlmostEqual(agent.timeouts.timeout_for("test-model", 100), 3.0, delta=0.3)
+        # A prompt twice the usual size gets twice the time
+        self.assertAlmostEqual(agent.timeouts.timeout_for("test-model", 200), 6.0, delta=0.6)
+
+    def test_hedged_request_cancels_loser(self):
+        agent = OllamaAgent(model="test-model", hedge_requests=True,
+                            endpoints=["http://slow:11434", "http://fast:11434"])
+        for _ in range(20):
+            agent.timeouts.record("test-model", 0.05)
+
+        async def call(prompt, options=None, endpoint=None, model=None):
+            if endpoint.base_url == "http://slow:11434":
+                await asyncio.sleep(5)
+            return {"response": endpoint.base_url, "eval_count": 1}
+
+        started = time.time()
+        with patch.object(agent, '_make_async_api_call', call):
+            reply = asyncio.run(agent.generate_response("hi"))
+
+        self.assertEqual(reply, "http://fast:11434")
+        self.assertLess(time.time() - started, 1)
+        self.assertEqual(agent.hedging_stats, {"hedged": 1, "hedge_wins": 1, "hedge_skipped": 0})
+        self.assertEqual([e.outstanding for e in agent.router.endpoints], [0, 0])
+
+    def test_hedge_respects_per_endpoint_concurrency(self):
+        agent = OllamaAgent(model="test-model", hedge_requests=True, max_concurrency=1,
+                            endpoints=["http://a:11434", "http://b:11434"])
+        for _ in range(20):
+            agent.timeouts.record("test-model", 0.05)
+        running = {"http://a:11434": 0, "http://b:11434": 0}
+        peak = dict(running)
+
+        async def call(prompt, options=None, endpoint=None, model=None):
+            running[endpoint.base_url] += 1
+            peak[endpoint.base_url] = max(peak[endpoint.base_url], running[endpoint.base_url])
+            try:
+                await asyncio.sleep(0.3)
+            finally:
+                running[endpoint.base_url] -= 1
+            return {"response": endpoint.base_url, "eval_count": 1}
+
+        async def scenario():
+            first = asyncio.ensure_future(agent.generate_response("q1"))
+            await asyncio.sleep(0.01)  # Let q1 reach its endpoint so q2 is routed to the other one
+            return [await agent.generate_response("q2"), await first]
+
+        with patch.object(agent, '_make_async_api_call', call):
+            replies = asyncio.run(scenario())
+
+        self.assertEqual(sorted(replies), ["http://a:11434", "http://b:11434"])
+        self.assertEqual(peak, {"http://a:11434": 1, "http://b:11434": 1})
+        self.assertEqual(agent.hedging_stats, {"hedged": 0, "hedge_wins": 0, "hedge_skipped": 2})
+
+class TestWarmUp(unittest.TestCase):
+    def test_warm_up_loads_models_with_keep_alive(self):
+        agent = OllamaAgent(model="test-model", keep_alive="30m",
+                            endpoints=["http://a:11434", "http://b:11434"])
+        payloads = []
+
+        def fake_post(url, payload, timeout=None):
+            payloads.append((url, payload))
+            if url.startswith("http://b"):
+                raise ConnectionError("down")
+            return {"done": True, "load_duration": 2_500_000_000}
+
+        with patch.object(agent.transport, 'post_json_blocking', fake_post):
+            report = asyncio.run(agent.warm_up())
+
+        self.assertEqual(len(payloads), 2)
+        self.assertTrue(all(p["keep_alive"] == "30m" and p["prompt"] == "" for _, p in payloads))
+        by_endpoint = {entry["endpoint"]: entry for entry in report}
+        self.assertEqual(by_endpoint["http://a:11434"]["load_duration"], 2.5)
+        self.assertEqual(by_endpoint["http://b:11434"]["status"], "error")
+        self.assertEqual(agent._generate_payload("hi", stream=True)["keep_alive"], "30m")
+
+class TestGenerateMany(unittest.TestCase):
+    def test_results_in_order_with_partial_failure(self):
+        agent = OllamaAgent(model="test-model", max_concurrency=4)
+        active = peak = 0
+
+        async def call(prompt, options=None, endpoint=None, model=None):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.05 if prompt == "p0" else 0.01)
+            active -= 1
+            if prompt == "bad":
+                raise ValueError("model error")
+            return {"response": prompt.upper(), "eval_count": 10}
+
+        prompts = ["p0", "p1", "bad", "p3", "p4"]
+        with patch.object(agent, '_make_async_api_call', call):
+            batch = asyncio.run(agent.generate_many(prompts, concurrency=2))
+
+        self.assertEqual([r.text for r in batch.results if r.ok], ["P0", "P1", "P3", "P4"])
+        self.assertFalse(batch.results[2].ok)
+        self.assertIn("model error", batch.results[2].error)
+        self.assertEqual((batch.succeeded, batch.failed, batch.token_count), (4, 1, 40))
+        self.assertGreater(batch.tokens_per_sec, 0)
+        self.assertLessEqual(peak, 2)
+
+    def test_as_completed_order(self):
+        agent = OllamaAgent(model="test-model", max_concurrency=4)
+
+        async def call(prompt, options=None, endpoint=None, model=None):
+            await asyncio.sleep(0.05 if prompt == "slow" else 0.0)
+            return {"response": prompt}
+
+        async def collect():
+            return [index async for index, _ in agent.generate_many_as_completed(["slow", "fast"])]
+
+        with patch.object(agent, '_make_async_api_call', call):
+            self.assertEqual(asyncio.run(collect()), [1, 0])
+
+class TestServerTimings(unittest.TestCase):
+    def test_timings_aggregated_per_model(self):
+        agent = OllamaAgent(model="test-model")
+
+        async def call(prompt, options=None, endpoint=None, model=None):
+            return {"response": "ok", "done": True,
+                    "prompt_eval_count": 20, "prompt_eval_duration": 100_000_000,
+                    "eval_count": 50, "eval_duration": 1_000_000_000,
+                    "load_duration": 200_000_000, "total_duration": 1_300_000_000}
+
+        with patch.object(agent, '_make_async_api_call', call):
+            asyncio.run(agent.generate_response("a"))
+            asyncio.run(agent.generate_response("b"))
+
+        last = agent.generation_stats[-1]
+        self.assertEqual((last.eval_count, last.eval_duration, last.load_duration), (50, 1.0, 0.2))
+        timings = agent.get_metrics()["server_timings"]["test-model"]
+        self.assertEqual(timings["timed_requests"], 2)
+        self.assertAlmostEqual(timings["eval_tokens_per_sec"], 50.0)
+        self.assertAlmostEqual(timings["prompt_tokens_per_sec"], 200.0)
+        self.assertAlmostEqual(timings["avg_server_duration"], 1.3)
+        self.assertIsNotNone(timings["avg_queue_wait"])
+
+    def test_stream_records_final_chunk_timings(self):
+        agent = OllamaAgent(model="test-model")
+
+        async def stream(prompt, options=None, endpoint=None):
+            yield {"response": "hi", "done": False}
+            yield {"response": "", "done": True, "eval_count": 1, "eval_duration": 500_000_000,
+                   "total_duration": 600_000_000}
+
+        async def collect():
+            return [token async for token in agent.stream_response("x")]
+
+        with patch.object(agent, '_stream_api_call', stream):
+            asyncio.run(collect())
+        self.assertEqual(agent.generation_stats[-1].total_duration, 0.6)
+
+class TestCascade(unittest.TestCase):
+    def setUp(self):
+        self.agent = OllamaAgent(model="big", cascade_model="small", cascade_min_confidence=70)
+        self.models = []
+
+    def _answers(self, small_reply):
+        async def call(prompt, options=None, endpoint=None, model=None):
+            self.models.append(model)
+            if model == "small":
+                return {"response": small_reply}
+            return {"response": "big answer"}
+        return call
+
+    def test_confident_small_answer_is_used(self):
+        with patch.object(self.agent, '_make_async_api_call', self._answers("Paris.\nConfidence: 95")):
+            result = asyncio.run(self.agent.generate_cascade("capital of France?"))
+        self.assertEqual((result.text, result.cascade_path, result.model), ("Paris.", "small", "small"))
+        self.assertEqual(self.models, ["small"])
+
+    def test_low_confidence_escalates(self):
+        with patch.object(self.agent, '_make_async_api_call', self._answers("Maybe 42\nConfidence: 30")):
+            result = asyncio.run(self.agent.generate_cascade("hard question"))
+        self.assertEqual((result.text, result.cascade_path), ("big answer", "escalated"))
+        self.assertEqual(self.models, ["small", "big"])
+        record = self.agent.cascade_history[-1]
+        self.assertEqual(record["confidence"], 30)
+        self.assertLessEqual(record["latency_saved"], 0)
+
+    def test_hedging_and_long_prompts(self):
+        with patch.object(self.agent, '_make_async_api_call', self._answers("I'm not sure about that.")):
+            self.assertEqual(asyncio.run(self.agent.generate_cascade("q")).cascade_path, "escalated")
+            long_result = asyncio.run(self.agent.generate_cascade("x" * 5000))
+        self.assertEqual(long_result.cascade_path, "direct")
+        stats = self.agent.get_metrics()["cascade"]
+        self.assertEqual((stats["small"], stats["escalated"], stats["direct"]), (0, 1, 1))
+
+class TestDegradedMode(unittest.TestCase):
+    def setUp(self):
+        self.agent = OllamaAgent(model="test-model", failure_threshold=1, recovery_timeout=60, cache_ttl=-1)
+
+    def test_stale_cache_answer_while_circuit_open(self):
+        async def ok(prompt, options=None, endpoint=None, model=None):
+            return {"response": "cached answer"}
+
+        async def down(prompt, options=None, endpoint=None, model=None):
+            raise ConnectionError("down")
+
+        with patch.object(self.agent, '_make_async_api_call', ok):
+            asyncio.run(self.agent.generate("disk usage?", use_cache=True))
+        with patch.object(self.agent, '_make_async_api_call', down):
+            failed = asyncio.run(self.agent.generate("disk usage?"))
+            # Circuit is now open; the entry has expired (ttl=-1) but is still served as stale
+            degraded = asyncio.run(self.agent.generate("disk usage?"))
+
+        for result in (failed, degraded):
+            self.assertTrue(result.stale)
+            self.assertFalse(result.ok)
+            self.assertTrue(result.text.endswith("cached answer"))
+        self.assertEqual(self.agent.get_metrics()["degraded"]["stale_served"], 2)
+
+    def test_stale_answer_not_used_after_stream_started(self):
+        async def ok(prompt, options=None, endpoint=None, model=None):
+            return {"response": "cached answer"}
+
+        async def breaks(prompt, options=None, endpoint=None):
+            yield {"response": "live ", "done": False}
+            raise ConnectionError("connection reset")
+
+        async def collect():
+            tokens = []
+            with self.assertRaises(StreamInterruptedError):
+                async for token in self.agent.stream_response("disk usage?"):
+                    tokens.append(token)
+            return tokens
+
+        with patch.object(self.agent, '_make_async_api_call', ok):
+            asyncio.run(self.agent.generate("disk usage?", use_cache=True))
+        with patch.object(self.agent, '_stream_api_call', breaks):
+            tokens = asyncio.run(collect())
+
+        self.assertEqual(tokens, ["live ", TRUNCATION_MARKER])
+        self.assertEqual(self.agent.get_metrics()["degraded"]["stale_served"], 0)
+
+    def test_degraded_semantic_lookup_uses_a_short_embed_timeout(self):
+        agent = OllamaAgent(model="test-model", timeout=30, semantic_cache=True)
+        if agent.semantic_cache is None:
+            self.skipTest("numpy not installed")
+        timeouts = []
+
+        async def post_json(url, payload, timeout=None):
+            timeouts.append(timeout)
+            raise ConnectionError("down")
+
+        with patch.object(agent.transport, 'post_json', post_json):
+            answer = asyncio.run(agent._degraded_answer("disk usage?"))
+        self.assertIsNone(answer)
+        self.assertEqual(timeouts, [agent.degraded_embed_timeout])
+        self.assertLessEqual(agent.degraded_embed_timeout, 2.0)
+
+    def test_degraded_sources_then_fallback(self):
+        self.agent.circuit_breaker.record_failure(RuntimeError("down"))
+        self.agent.add_degraded_source(lambda prompt: "last diagnostics" if "status" in prompt else None)
+
+        status = asyncio.run(self.agent.generate("system status"))
+        other = asyncio.run(self.agent.generate("write a poem"))
+        self.assertEqual(status.text, "[stale: the language model is unavailable, this is an earlier answer]\n"
+                                      "last diagnostics")
+        self.assertEqual((other.text, other.stale), (self.agent._api_fallback(), False))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+from perpetual_llm import async_input
+
+class TestAsyncInput(unittest.TestCase):
+    def test_loop_keeps_running_while_waiting_for_input(self):
+        ticks = []
+
+        async def ticker():
+            for _ in range(3):
+                ticks.append(1)
+                await asyncio.sleep(0.01)
+
+        def slow_input(prompt):
+            import time
+            time.sleep(0.1)
+            return "hello"
+
+        async def scenario():
+            task = asyncio.create_task(ticker())
+            line = await async_input("> ")
+            await task
+            return line
+
+        with patch('builtins.input', slow_input):
+            self.assertEqual(asyncio.run(scenario()), "hello")
+        self.assertEqual(len(ticks), 3)
+
+    def test_eof_is_raised_in_the_loop(self):
+        def closed(prompt):
+            raise EOFError
+
+        with patch('builtins.input', closed):
+            with self.assertRaises(EOFError):
+                asyncio.run(async_input())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import asyncio
+import tempfile
+import shutil
+import os
+from unittest.mock import patch
+from memory_manager import MemoryManager
+from response_cache import ResponseCache, make_cache_key
+from ollama_agent import OllamaAgent
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.memory_manager = MemoryManager(os.path.join(self.temp_dir, "cache.db"))
+
+    def tearDown(self):
+        self.memory_manager.cleanup()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_key_depends_on_model_prompt_and_options(self):
+        key = make_cache_key("m", "p", {"temperature": 0})
+        self.assertEqual(key, make_cache_key("m", "p", {"temperature": 0}))
+        self.assertNotEqual(key, make_cache_key("m2", "p", {"temperature": 0}))
+        self.assertNotEqual(key, make_cache_key("m", "p", {"temperature": 1}))
+        self.assertEqual(make_cache_key("m", "p"), make_cache_key("m", "p", {}))
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+
+        async def scenario():
+            await cache.put("a", "A")
+            await cache.put("b", "B")
+            await cache.get("a")  # a becomes most recently used
+            await cache.put("c", "C")
+            return await cache.get("a"), await cache.get("b"), await cache.get("c")
+
+        self.assertEqual(asyncio.run(scenario()), ("A", None, "C"))
+        stats = cache.get_stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["hits"], 3)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_persistent_tier_survives_memory_clear(self):
+        cache = ResponseCache(memory_manager=self.memory_manager, ttl=60)
+
+        async def scenario():
+            await cache.put("k", "persisted")
+            cache.clear()
+            return await cache.get("k")
+
+        self.assertEqual(asyncio.run(scenario()), "persisted")
+        self.assertEqual(cache.get_stats()["persistent_hits"], 1)
+
+    def test_expired_entries_are_misses(self):
+        cache = ResponseCache(memory_manager=self.memory_manager, ttl=-1)
+
+        async def scenario():
+            await cache.put("k", "stale")
+            return await cache.get("k")
+
+        self.assertIsNone(asyncio.run(scenario()))
+        self.assertEqual(self.memory_manager.purge_expired("llm_cache"), 0)
+
+    def test_agent_cache_is_opt_in(self):
+        agent = OllamaAgent(model="test-model")
+        calls = []
+
+        async def fake_call(prompt, options=None, endpoint=None, model=None):
+            calls.append(prompt)
+            return {"response": f"answer {len(calls)}"}
+
+        async def scenario():
+            first = await agent.generate_response("same", use_cache=True)
+            second = await agent.generate_response("same", use_cache=True)
+            uncached = await agent.generate_response("same")
+            return first, second, uncached
+
+        with patch.object(agent, '_make_async_api_call', fake_call):
+            first, second, uncached = asyncio.run(scenario())
+
+        self.assertEqual(first, "answer 1")
+        self.assertEqual(second, "answer 1")
+        self.assertEqual(uncached, "answer 2")
+        self.assertEqual(len(calls), 2)
+
+if __name__ == '__main__':
+    unittest.main()
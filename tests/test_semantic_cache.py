@@ -0,0 +1,68 @@
+import os
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+from semantic_cache import SemanticCache
+from ollama_agent import OllamaAgent
+
+class TestSemanticCache(unittest.TestCase):
+    def test_lookup_by_similarity(self):
+        cache = SemanticCache(max_entries=4, threshold=0.9)
+        cache.put([1.0, 0.0, 0.0], "scope", "x-axis")
+        cache.put([0.0, 1.0, 0.0], "scope", "y-axis")
+
+        self.assertEqual(cache.lookup([0.95, 0.05, 0.0], "scope"), "x-axis")
+        self.assertIsNone(cache.lookup([0.7, 0.7, 0.0], "scope"))
+        # Entries are only reused within their scope
+        self.assertIsNone(cache.lookup([1.0, 0.0, 0.0], "other"))
+
+        batch = cache.top_k([[1.0, 0.1, 0.0], [0.1, 1.0, 0.0]], "scope", k=2)
+        self.assertEqual([matches[0][0] for matches in batch], [0, 1])
+        self.assertEqual(len(batch[0]), 2)
+
+    def test_lru_eviction(self):
+        cache = SemanticCache(max_entries=2, threshold=0.99)
+        cache.put([1.0, 0.0], "s", "a")
+        cache.put([0.0, 1.0], "s", "b")
+        self.assertEqual(cache.lookup([1.0, 0.0], "s"), "a")
+        cache.put([-1.0, 0.0], "s", "c")
+
+        self.assertEqual(cache.lookup([1.0, 0.0], "s"), "a")
+        self.assertIsNone(cache.lookup([0.0, 1.0], "s"))
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+
+    def test_memory_mapped_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "semantic")
+            cache = SemanticCache(max_entries=8, path=path)
+            cache.put([0.0, 1.0, 0.0], "s", "saved")
+            cache.flush()
+
+            reloaded = SemanticCache(max_entries=8, path=path)
+            self.assertEqual(reloaded.lookup([0.0, 1.0, 0.01], "s"), "saved")
+            del cache, reloaded
+
+    def test_agent_answers_near_duplicate_prompt(self):
+        agent = OllamaAgent(model="test-model", semantic_cache=True, semantic_threshold=0.9)
+        calls = []
+
+        async def fake_call(prompt, options=None, endpoint=None, model=None):
+            calls.append(prompt)
+            return {"response": "disk is fine"}
+
+        async def fake_embed(text, model=None):
+            # Prompts differing only in the PID embed almost identically
+            return [1.0, 0.0] if "pid" in text else [0.0, 1.0]
+
+        with patch.object(agent, '_make_async_api_call', fake_call), \
+                patch.object(agent, 'embed', fake_embed):
+            first = asyncio.run(agent.generate_response("check disk pid 1234", use_cache=True))
+            second = asyncio.run(agent.generate_response("check disk pid 5678", use_cache=True))
+
+        self.assertEqual((first, second), ("disk is fine", "disk is fine"))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(agent.get_metrics()["semantic_cache"]["hits"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import time
+import asyncio
+import unittest
+from shell_jobs import ShellJobManager
+
+class TestShellJobManager(unittest.TestCase):
+    def test_streams_output_and_exit_status(self):
+        chunks = []
+
+        async def scenario():
+            manager = ShellJobManager()
+            return await manager.run("echo one; echo two; exit 3", on_output=chunks.append)
+
+        job = asyncio.run(scenario())
+        self.assertEqual(job.status, "exited")
+        self.assertEqual(job.returncode, 3)
+        self.assertEqual(job.output, "one\ntwo\n")
+        self.assertEqual("".join(chunks), "one\ntwo\n")
+
+    def test_output_cap(self):
+        async def scenario():
+            manager = ShellJobManager(max_output_bytes=100)
+            return await manager.run("head -c 5000 /dev/zero | tr '\\0' x")
+
+        job = asyncio.run(scenario())
+        self.assertEqual(job.status, "exited")
+        self.assertEqual(len(job.output), 100)
+        self.assertTrue(job.truncated)
+
+    def test_timeout_kills_process_group(self):
+        async def scenario():
+            manager = ShellJobManager(timeout=0.3)
+            start = time.time()
+            job = await manager.run("sleep 10; echo late")
+            return job, time.time() - start
+
+        job, elapsed = asyncio.run(scenario())
+        self.assertEqual(job.status, "timeout")
+        self.assertLess(elapsed, 5)
+        self.assertNotIn("late", job.output)
+
+    def test_timeout_applies_after_stdout_is_closed(self):
+        async def scenario():
+            manager = ShellJobManager(timeout=0.3)
+            start = time.time()
+            job = await manager.run("echo started; exec >/dev/null 2>&1; sleep 10")
+            return job, time.time() - start
+
+        job, elapsed = asyncio.run(scenario())
+        self.assertEqual(job.status, "timeout")
+        self.assertEqual(job.output, "started\n")
+        self.assertLess(elapsed, 5)
+
+    def test_background_job_does_not_block_and_can_be_killed(self):
+        finished = []
+
+        async def scenario():
+            manager = ShellJobManager()
+            job = await manager.start("sleep 10", on_exit=finished.append, background=True)
+            ticks = 0
+            for _ in range(5):
+                await asyncio.sleep(0.01)
+                ticks += 1
+            self.assertEqual([j.status for j in manager.running()], ["running"])
+            self.assertTrue(await manager.kill(job.id))
+            self.assertFalse(await manager.kill(job.id))
+            return job, ticks
+
+        job, ticks = asyncio.run(scenario())
+        self.assertEqual(ticks, 5)
+        self.assertEqual(job.status, "killed")
+        self.assertEqual(finished, [job])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import patch
+from monitoring.sliding_window import SlidingWindowCounter
+from perpetual_llm import SystemMonitor
+
+class TestSlidingWindowCounter(unittest.TestCase):
+    def test_old_events_age_out(self):
+        counter = SlidingWindowCounter(window=60)
+        counter.add(error=True, now=1000)
+        counter.add(error=False, now=1030)
+        self.assertEqual(counter.totals(now=1030), {"events": 2, "errors": 1})
+        self.assertEqual(counter.error_rate(now=1030), 0.5)
+        # The error slides out of the window first
+        self.assertEqual(counter.totals(now=1065), {"events": 1, "errors": 0})
+        self.assertEqual(counter.error_rate(now=2000), 0.0)
+
+    def test_bucket_reuse_resets_counts(self):
+        counter = SlidingWindowCounter(window=10, buckets=10)
+        counter.add(error=True, now=5)
+        counter.add(now=15)  # Same ring slot, newer time slice
+        self.assertEqual(counter.totals(now=15), {"events": 1, "errors": 0})
+
+class TestSystemMonitor(unittest.TestCase):
+    def test_history_is_bounded_metadata(self):
+        monitor = SystemMonitor(history_size=5)
+        for i in range(20):
+            monitor.record_command(f"!status secret-{i}", latency=0.01, ok=True)
+        self.assertEqual(len(monitor.command_history), 5)
+        self.assertEqual(monitor.commands_processed, 20)
+        record = monitor.command_history[-1]
+        self.assertEqual((record.kind, record.name), ("command", "status"))
+        self.assertFalse(any("secret" in str(value) for value in vars(record).values()))
+
+    def test_recent_errors_degrade_then_recover(self):
+        monitor = SystemMonitor(error_threshold=0.1)
+        with patch("perpetual_llm.time.time", return_value=10000.0):
+            for _ in range(3):
+                monitor.record_command("hello", latency=0.1, ok=False)
+            health = monitor.health_check()
+        self.assertEqual(health["status"], "degraded")
+        self.assertEqual(health["error_rates"]["1m"], 1.0)
+
+        # Ten minutes later only successes fall inside the health window
+        with patch("perpetual_llm.time.time", return_value=10600.0):
+            monitor.record_command("hello", latency=0.1, ok=True)
+            health = monitor.health_check()
+        self.assertEqual(health["status"], "healthy")
+        self.assertEqual(health["error_rates"]["1h"], 0.75)
+        self.assertEqual(health["lifetime_error_rate"], 0.75)
+
+    def test_latency_report_by_category_and_handler(self):
+        monitor = SystemMonitor()
+        monitor.record_command("!interpret print(1)", latency=0.4, ok=True)
+        monitor.record_command("what is up", latency=2.0, ok=True)
+        monitor.record_handler("interpret", 0.39)
+
+        report = monitor.latency_report()
+        self.assertEqual(set(report["categories"]), {"command", "prompt"})
+        self.assertEqual(report["categories"]["prompt"]["5m"]["max"], 2.0)
+        self.assertEqual(report["handlers"]["interpret"]["lifetime"]["count"], 1)
+        self.assertAlmostEqual(monitor.mean_latency, 1.2)
+
+if __name__ == '__main__':
+    unittest.main()